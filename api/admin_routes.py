@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify, send_file
-from models import db, User, Student, Teacher, Class, Subject, AttendanceSession, Attendance, Timetable
+from models import db, normalize_name, User, Student, Teacher, Class, Subject, AttendanceSession, Attendance, Timetable
 from auth import token_required, role_required
+from auth_cache import auth_cache
+import session_counters
+from password_hashing import login_pool
 from datetime import datetime, date, timedelta
 from sqlalchemy import func, or_
 import io
@@ -50,9 +53,12 @@ def get_users(current_user):
         query = query.filter_by(is_active=is_active)
     
     if search_query:
+        # Match the start of any word of the normalized name; the leading-word case can use its index
+        term = normalize_name(search_query)
         query = query.filter(
             or_(
-                User.name.ilike(f'%{search_query}%'),
+                User.name_normalized.like(f'{term}%'),
+                User.name_normalized.like(f'% {term}%'),
                 User.email.ilike(f'%{search_query}%')
             )
         )
@@ -151,12 +157,16 @@ def create_user(current_user):
             db.session.add(teacher)
         
         db.session.commit()
-        return jsonify({'message': 'User created successfully', 'user_id': user.id})
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to create user'}), 500
 
+    # Runs after the commit so a failed recount cannot roll back or fail the saved user
+    if user.role == 'student':
+        session_counters.roster_changed()
+    return jsonify({'message': 'User created successfully', 'user_id': user.id})
+
 @admin_bp.route('/users/<int:user_id>', methods=['PATCH'])
 @token_required
 @role_required(['admin'])
@@ -175,13 +185,27 @@ def update_user(current_user, user_id):
         if 'email' in data:
             user.email = data['email']
         
+        # Moving a student to another class; roster_changed() below refreshes every cache keyed on it
+        if user.role == 'student' and user.student:
+            for field in ('standard', 'division', 'roll_no'):
+                if field in data:
+                    setattr(user.student, field, str(data[field]).strip())
+        
         db.session.commit()
-        return jsonify({'message': 'User updated successfully'})
+        # Deactivation must also kill tokens already issued; other edits just refresh the cache
+        if not user.is_active:
+            auth_cache.revoke(user.id)
+        else:
+            auth_cache.invalidate(user.id)
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to update user'}), 500
 
+    if user.role == 'student':
+        session_counters.roster_changed()
+    return jsonify({'message': 'User updated successfully'})
+
 @admin_bp.route('/users/<int:user_id>', methods=['DELETE'])
 @token_required
 @role_required(['admin'])
@@ -196,12 +220,23 @@ def delete_user(current_user, user_id):
         # Soft delete by deactivating
         user.is_active = False
         db.session.commit()
-        return jsonify({'message': 'User deleted successfully'})
+        auth_cache.revoke(user.id)
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to delete user'}), 500
 
+    if user.role == 'student':
+        session_counters.roster_changed()
+    return jsonify({'message': 'User deleted successfully'})
+
+@admin_bp.route('/login_metrics', methods=['GET'])
+@token_required
+@role_required(['admin'])
+def get_login_metrics(current_user):
+    """Password hash timings and login pool counters for this worker"""
+    return jsonify(login_pool.stats())
+
 @admin_bp.route('/classes', methods=['GET'])
 @token_required
 @role_required(['admin'])
@@ -2,16 +2,91 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ai_recommendations import analyzer
 from models import User, Student, Teacher
-from auth import role_required
-import numpy as np
+from auth import role_required, token_required
 import os
 from models import db, Student
+from face_index import face_index
+from face_enrollment import enrollment_queue
+from recognition_cache import recognition_cache, frame_hash
+from attendance_writer import attendance_writer
+from face_worker import face_pool, detect_and_encode, detection_options, FacePoolBusy, FaceTaskTimeout
 from flask import current_app
 
 ai_bp = Blueprint('ai', __name__)
 
-ENCODINGS_DIR = os.path.join(current_app.root_path, 'face_encodings')
-os.makedirs(ENCODINGS_DIR, exist_ok=True)
+
+def _decode_b64_image(img_b64):
+    import base64
+    return base64.b64decode(img_b64.split(',')[1] if ',' in img_b64 else img_b64)
+
+
+def _read_limited(stream, max_bytes):
+    data = stream.read(max_bytes + 1)
+    return data if len(data) <= max_bytes else None
+
+
+def _request_images(max_images, allow_paths=False):
+    """Collect raw image bytes from the request.
+
+    Accepts multipart uploads (fields 'images' or 'image'), a raw image/* or
+    application/octet-stream body, or the legacy JSON body with base64 data URLs.
+    Returns (images, fields, None) or (None, None, error response). With
+    allow_paths, a JSON 'image' that is not a data URL is passed through as a
+    file path.
+    """
+    max_bytes = current_app.config.get('FACE_UPLOAD_MAX_BYTES', 8 * 1024 * 1024)
+    too_large = (jsonify({'error': f'Image exceeds {max_bytes} bytes'}), 413)
+    # Reject oversized bodies before reading any of them
+    limit = max_bytes * max_images
+    if request.is_json:
+        limit = limit * 4 // 3 + 4096
+    if request.content_length and request.content_length > limit + 64 * 1024:
+        return None, None, too_large
+    if request.mimetype == 'multipart/form-data':
+        files = request.files.getlist('images') or request.files.getlist('image')
+        images = []
+        for upload in files[:max_images]:
+            data = _read_limited(upload.stream, max_bytes)
+            if data is None:
+                return None, None, too_large
+            images.append(data)
+        return images, request.form, None
+    if request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+        data = _read_limited(request.stream, max_bytes)
+        if data is None:
+            return None, None, too_large
+        return [data], request.args, None
+    data = request.get_json(silent=True) or {}
+    images = data.get('images') or ([data['image']] if data.get('image') else [])
+    decoded = []
+    for img in images[:max_images]:
+        if allow_paths and not img.startswith('data:image'):
+            decoded.append(img)
+        else:
+            decoded.append(_decode_b64_image(img))
+    return decoded, data, None
+
+
+def _session_open(session, now):
+    """Whether a session is running at now (IST); stored times are IST wall-clock times"""
+    now = now.replace(tzinfo=None)
+    start = session.start_time.replace(tzinfo=None)
+    end = session.end_time.replace(tzinfo=None) if session.end_time else None
+    return session.date == now.date() and start <= now and (end is None or now <= end)
+
+
+def _run_face_task(images, all_faces=False):
+    """Detect/encode in the face pool; returns (result, None) or (None, error response).
+
+    result is {'faces': [[(box, encoding)] per image], 'timings': {stage: ms}}.
+    """
+    try:
+        return face_pool.run(detect_and_encode, images, all_faces, detection_options(current_app.config)), None
+    except FacePoolBusy as e:
+        resp = jsonify({'error': 'Face recognition is busy, please retry shortly'})
+        return None, (resp, 503, {'Retry-After': str(e.retry_after)})
+    except FaceTaskTimeout:
+        return None, (jsonify({'error': 'Face recognition timed out'}), 504)
 
 @ai_bp.route('/recommendations', methods=['GET'])
 @jwt_required()
@@ -112,102 +187,257 @@ def get_student_analysis(student_id):
 
 @ai_bp.route('/register_face', methods=['POST'])
 def register_face():
-    import face_recognition
-    import base64, json
+    import json
     import uuid
-    data = request.get_json()
-    student_id = data.get('student_id')
-    images = data.get('images', [])  # List of base64 images
-    if not student_id or not images:
+    import io
+    from PIL import Image
+    from models import FaceEnrollmentJob
+    # Limit to 5 images (multipart, raw body or base64 JSON)
+    image_bytes, fields, error = _request_images(5)
+    if error:
+        return error
+    student_id = fields.get('student_id')
+    if not student_id or not image_bytes:
         return jsonify({'error': 'Missing student_id or images'}), 400
-    # Limit to 5 images
-    images = images[:5]
-    encodings = []
+    if not Student.query.get(student_id):
+        return jsonify({'error': 'Student not found'}), 404
     image_paths = []
     # Save images to static/face_images/{student_id}/
     save_dir = os.path.join(current_app.root_path, 'static', 'face_images', str(student_id))
     os.makedirs(save_dir, exist_ok=True)
-    for idx, img_b64 in enumerate(images):
-        img_bytes = base64.b64decode(img_b64.split(',')[1] if ',' in img_b64 else img_b64)
-        import io
-        from PIL import Image
-        img = Image.open(io.BytesIO(img_bytes))
-        img_np = np.array(img)
-        # Save image to disk
+    for idx, img_bytes in enumerate(image_bytes):
+        # Save image to disk; JPEG uploads are written as-is without a decode/re-encode
         filename = f"face_{uuid.uuid4().hex[:8]}_{idx+1}.jpg"
         file_path = os.path.join(save_dir, filename)
-        img.save(file_path, format="JPEG")
+        if img_bytes[:2] == b'\xff\xd8':
+            with open(file_path, 'wb') as f:
+                f.write(img_bytes)
+        else:
+            Image.open(io.BytesIO(img_bytes)).convert('RGB').save(file_path, format="JPEG")
         # Store relative path for DB
         rel_path = os.path.relpath(file_path, current_app.root_path)
         image_paths.append(rel_path)
-        faces = face_recognition.face_encodings(img_np)
-        if faces:
-            encodings.append(faces[0])
-    if not encodings:
-        return jsonify({'error': 'No faces found'}), 400
-    avg_encoding = np.mean(encodings, axis=0)
-    npy_path = os.path.join(ENCODINGS_DIR, f'{student_id}.npy')
-    np.save(npy_path, avg_encoding)
-    student = Student.query.get(student_id)
-    student.face_encoding = npy_path
-    student.face_images = json.dumps(image_paths)
+    # Detection and encoding happen in the background; the client polls the job
+    job = FaceEnrollmentJob(
+        id=uuid.uuid4().hex,
+        student_id=int(student_id),
+        status='queued',
+        image_paths=json.dumps(image_paths),
+        total_images=len(image_paths),
+        processed_images=0
+    )
+    db.session.add(job)
     db.session.commit()
-    return jsonify({'success': True, 'image_paths': image_paths})
+    enrollment_queue.submit(current_app._get_current_object(), job.id)
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f'/api/ai/register_face/{job.id}',
+        'image_paths': image_paths
+    }), 202
+
+@ai_bp.route('/register_face/<job_id>', methods=['GET'])
+def get_face_enrollment_job(job_id):
+    import json
+    from models import FaceEnrollmentJob
+    job = FaceEnrollmentJob.query.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({
+        'job_id': job.id,
+        'student_id': job.student_id,
+        'status': job.status,
+        'total_images': job.total_images,
+        'processed_images': job.processed_images,
+        'errors': json.loads(job.errors) if job.errors else [],
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    })
 
 @ai_bp.route('/recognize_face', methods=['POST'])
 def recognize_face():
-    import face_recognition
-    import base64
     from datetime import datetime
     import pytz
-    data = request.get_json()
-    image = data.get('image')  # base64 image or file path
-    if not image:
+    from models import AttendanceSession, Timetable, Class
+    # Raw bytes from multipart/binary/base64, or a file path (loaded inside the pool worker)
+    images, data, error = _request_images(1, allow_paths=True)
+    if error:
+        return error
+    if not images:
         return jsonify({'error': 'Missing image'}), 400
-    # Decode base64 image
-    if image.startswith('data:image'):
-        img_bytes = base64.b64decode(image.split(',')[1])
-        import io
-        from PIL import Image
-        img = Image.open(io.BytesIO(img_bytes))
-        img_np = np.array(img)
-    else:
-        img_np = face_recognition.load_image_file(image)
-    faces = face_recognition.face_encodings(img_np)
-    if not faces:
-        return jsonify({'error': 'No face found'}), 400
-    encoding = faces[0]
-    # Compare with all student encodings
-    students = Student.query.filter(Student.face_encoding.isnot(None)).all()
-    for student in students:
-        known_encoding = np.load(student.face_encoding)
-        match = face_recognition.compare_faces([known_encoding], encoding, tolerance=0.5)[0]
-        if match:
-            # Auto-detect current session for this student
-            from models import Attendance, AttendanceSession, Timetable, Class
-            tz = pytz.timezone('Asia/Kolkata')
-            now = datetime.now(tz)
-            today = now.date()
-            # Find all sessions for today for student's class/division
-            sessions = AttendanceSession.query.join(Timetable).join(Class).filter(
-                AttendanceSession.date == today,
-                Class.standard == student.standard,
-                Class.division == student.division,
-                AttendanceSession.is_active == True
-            ).all()
-            # Find session where now is between start and end
-            current_session = None
-            for s in sessions:
-                if s.start_time <= now and (s.end_time is None or now <= s.end_time):
-                    current_session = s
+    tz = pytz.timezone('Asia/Kolkata')
+    now = datetime.now(tz)
+    today = now.date()
+    # Kiosk mode: when bound to a session or room, only compare against that class's roster
+    session_id = data.get('session_id')
+    room = data.get('room')
+    bound_session = None
+    if session_id or room:
+        query = AttendanceSession.query.join(Timetable).filter(
+            AttendanceSession.is_active == True
+        )
+        if session_id:
+            # A session left open from an earlier day or hour no longer takes marks
+            bound_session = query.filter(AttendanceSession.id == session_id).first()
+            if bound_session and not _session_open(bound_session, now):
+                bound_session = None
+        else:
+            for s in query.filter(AttendanceSession.date == today, Timetable.room_number == room).all():
+                if _session_open(s, now):
+                    bound_session = s
                     break
-            if not current_session:
-                return jsonify({'match': True, 'student_id': student.id, 'name': student.user.name, 'attendance': 'no_active_session'}), 200
-            existing = Attendance.query.filter_by(student_id=student.id, session_id=current_session.id).first()
-            if existing:
-                return jsonify({'match': True, 'student_id': student.id, 'name': student.user.name, 'attendance': 'already_marked'})
-            attendance = Attendance(student_id=student.id, session_id=current_session.id, status='present', marked_by='face')
-            db.session.add(attendance)
-            db.session.commit()
-            return jsonify({'match': True, 'student_id': student.id, 'name': student.user.name, 'attendance': 'marked', 'marked_at': attendance.marked_at.isoformat()})
-    return jsonify({'match': False})
+        if not bound_session:
+            return jsonify({'error': 'No active session for this kiosk'}), 404
+    scope = bound_session.id if bound_session else None
+    # Resent frames (retries, double taps) reuse a recent match before any dlib work
+    digest = frame_hash(images[0]) if isinstance(images[0], bytes) else None
+    timings = {}
+    best = recognition_cache.lookup_frame(scope, digest)
+    cache_tier = 'frame' if best else None
+    if not best:
+        result, error = _run_face_task(images)
+        if error:
+            return error
+        faces = result['faces'][0]
+        timings = result['timings']
+        if not faces:
+            return jsonify({'error': 'No face found', 'timings': timings}), 400
+        encoding = faces[0][1]
+        best = recognition_cache.lookup_embedding(scope, encoding)
+        cache_tier = 'embedding' if best else None
+        if not best:
+            if bound_session:
+                cls = bound_session.timetable.class_ref
+                best = face_index.match(encoding, tolerance=0.5, standard=cls.standard, division=cls.division)
+            else:
+                # Compare against every enrolled encoding in one vectorized pass
+                best = face_index.match(encoding, tolerance=0.5)
+            if best:
+                recognition_cache.store(scope, digest, encoding, best)
+    if not best:
+        resp = {'match': False, 'timings': timings}
+        if bound_session:
+            resp['session_id'] = bound_session.id
+        return jsonify(resp)
+    student = Student.query.get(best[0])
+    if not student:
+        return jsonify({'match': False, 'timings': timings})
+    resp = {
+        'match': True,
+        'student_id': student.id,
+        'matched_image': best[2],
+        'name': student.user.name,
+        'timings': timings,
+        'cache': cache_tier
+    }
+    current_session = bound_session
+    if not current_session:
+        # Auto-detect current session for this student
+        # Find all sessions for today for student's class/division
+        sessions = AttendanceSession.query.join(Timetable).join(Class).filter(
+            AttendanceSession.date == today,
+            Class.standard == student.standard,
+            Class.division == student.division,
+            AttendanceSession.is_active == True
+        ).all()
+        # Find session where now is between start and end
+        for s in sessions:
+            if _session_open(s, now):
+                current_session = s
+                break
+        if not current_session:
+            resp['attendance'] = 'no_active_session'
+            return jsonify(resp), 200
+    resp['session_id'] = current_session.id
+    # The session registry answers repeats without a query and forgets a closed or deleted session
+    attendance = attendance_writer.enqueue(student.id, current_session.id, status='present', marked_by='face')
+    if not attendance:
+        resp['attendance'] = 'already_marked'
+        return jsonify(resp)
+    resp['attendance'] = 'marked'
+    resp['marked_at'] = attendance['marked_at'].isoformat()
+    return jsonify(resp)
+
+
+@ai_bp.route('/recognition_cache/stats', methods=['GET'])
+@token_required
+@role_required(['admin', 'teacher'])
+def get_recognition_cache_stats(current_user):
+    """Hit/miss counters of this worker's recognition cache"""
+    return jsonify(recognition_cache.stats())
+
+@ai_bp.route('/recognize_faces', methods=['POST'])
+@token_required
+@role_required(['teacher'])
+def recognize_faces_batch(current_user):
+    """Mark a whole class from one classroom photo (or a few frames) in a single request"""
+    from models import AttendanceSession, Timetable
+    frames, data, error = _request_images(10)
+    if error:
+        return error
+    session_id = data.get('session_id')
+    if not session_id or not frames:
+        return jsonify({'error': 'Missing session_id or images'}), 400
+    session = AttendanceSession.query.join(Timetable).filter(
+        AttendanceSession.id == session_id,
+        Timetable.teacher_id == current_user.teacher.id
+    ).first()
+    if not session:
+        return jsonify({'error': 'Session not found or access denied'}), 404
+    # Detect and encode every face in every frame in one pool task
+    result, error = _run_face_task(frames, all_faces=True)
+    if error:
+        return error
+    faces = []
+    encodings = []
+    for frame_idx, frame_faces in enumerate(result['faces']):
+        for location, face_encoding in frame_faces:
+            faces.append({'frame': frame_idx, 'box': list(location)})
+            encodings.append(face_encoding)
+    if not encodings:
+        return jsonify({'error': 'No faces found', 'timings': result['timings']}), 400
+    # Match all faces against the class roster in one vectorized step
+    cls = session.timetable.class_ref
+    matches = face_index.match_many(encodings, tolerance=0.5, standard=cls.standard, division=cls.division)
+    best_by_student = {}
+    unmatched = []
+    for face, match in zip(faces, matches):
+        if not match:
+            unmatched.append(face)
+            continue
+        student_id, distance, image_index = match
+        if student_id not in best_by_student or distance < best_by_student[student_id][1]:
+            best_by_student[student_id] = (face, distance, image_index)
+    names = {
+        student.id: student.user.name
+        for student in Student.query.filter(Student.id.in_(list(best_by_student))).all()
+    } if best_by_student else {}
+    new_rows = []
+    results = []
+    for student_id, (face, distance, image_index) in best_by_student.items():
+        confidence = round(1.0 - distance, 4)
+        row = attendance_writer.enqueue(student_id, session.id, status='present', marked_by='face', confidence_score=confidence)
+        if row:
+            status = 'marked'
+            new_rows.append(row)
+        else:
+            status = 'already_marked'
+        results.append({
+            'student_id': student_id,
+            'name': names.get(student_id),
+            'frame': face['frame'],
+            'box': face['box'],
+            'distance': round(distance, 4),
+            'confidence': confidence,
+            'matched_image': image_index,
+            'attendance': status
+        })
+    return jsonify({
+        'session_id': session.id,
+        'faces_detected': len(faces),
+        'marked': len(new_rows),
+        'results': results,
+        'unmatched': unmatched,
+        'timings': result['timings']
+    })
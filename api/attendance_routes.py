@@ -1,14 +1,19 @@
-from flask import Blueprint, request, jsonify, current_app
-from models import db, AttendanceSession, Attendance, Student, Timetable, Class, User, Subject, Teacher
+from flask import Blueprint, request, jsonify, current_app, url_for
+from models import db, AttendanceSession, Attendance, Student, Timetable, Class, User
 from auth import token_required, role_required
+from session_registry import session_registry
+from attendance_writer import attendance_writer
+from qr_render import qr_images
+from manual_codes import normalize as normalize_manual_code
+from session_listing import sessions_for_day, student_marks
+import session_counters
+import qr_tokens
 from datetime import datetime, date, timedelta
-import qrcode
-import io
-import base64
 import secrets
 import string
 import jwt
 import pytz
+import time
 
 attendance_bp = Blueprint('attendance', __name__, url_prefix='/api/attendance')
 
@@ -24,17 +29,13 @@ def get_all_today_sessions_for_student(current_user):
         return jsonify({'error': 'Only students can access this endpoint'}), 403
     student = current_user.student
     today = date.today()
-    sessions = db.session.query(AttendanceSession).join(Timetable).join(Class).filter(
-        AttendanceSession.date == today,
-        Class.standard == student.standard,
-        Class.division == student.division
-    ).all()
+    sessions = sessions_for_day(today, standard=student.standard, division=student.division)
     session_data = []
     for session in sessions:
         session_info = {
             'id': session.id,
-            'subject': session.timetable.subject.name if session.timetable and session.timetable.subject else "",
-            'teacher': session.timetable.teacher.user.name if session.timetable and session.timetable.teacher and session.timetable.teacher.user else "",
+            'subject': session.timetable.subject.name,
+            'teacher': session.timetable.teacher.user.name,
             'start_time': session.start_time.isoformat() if session.start_time else None,
             'end_time': session.end_time.isoformat() if session.end_time else None,
             'is_active': session.is_active,
@@ -47,18 +48,15 @@ def get_all_today_sessions_for_student(current_user):
 @attendance_bp.route('/debug/sessions/today', methods=['GET'])
 def debug_sessions_today():
     today = datetime.now(pytz.timezone('Asia/Kolkata')).date()
-    sessions = AttendanceSession.query.filter_by(date=today).all()
+    sessions = sessions_for_day(today)
     result = []
     for s in sessions:
-        tt = Timetable.query.get(s.timetable_id)
-        subj = Subject.query.get(tt.subject_id) if tt else None
-        cls = Class.query.get(tt.class_id) if tt else None
-        teacher = Teacher.query.get(tt.teacher_id) if tt else None
+        tt = s.timetable
         result.append({
             'id': s.id,
-            'class': f"{cls.standard}-{cls.division}" if cls else None,
-            'subject': subj.name if subj else None,
-            'teacher': teacher.user.name if teacher else None,
+            'class': f"{tt.class_ref.standard}-{tt.class_ref.division}",
+            'subject': tt.subject.name,
+            'teacher': tt.teacher.user.name,
             'start_time': s.start_time.isoformat() if s.start_time else None,
             'end_time': s.end_time.isoformat() if s.end_time else None,
             'is_active': s.is_active,
@@ -86,6 +84,7 @@ def generate_qr_code(current_user):
     )
     db.session.add(session)
     db.session.flush()  # get session.id
+    session_counters.init_roster(session)
 
     # Generate a jti for this QR and store it on the session
     jti = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(24))
@@ -100,83 +99,122 @@ def generate_qr_code(current_user):
     }
     token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
 
-    # Generate QR image that encodes the JWT
-    qr_data = token
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color='black', back_color='white')
-    buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    qr_code_base64 = base64.b64encode(buffer.getvalue()).decode()
-
-    # Store QR image (as data URL) and commit
-    session.qr_code = f"data:image/png;base64,{qr_code_base64}"
     db.session.commit()
+    session_registry.publish(session)
+    # Pre-render the image served by qr_image below
+    qr_images.get(token)
 
     return jsonify({
         'session_id': session.id,
-        'qr_code': session.qr_code,
+        'qr_url': url_for('attendance.qr_image', token=token),
         'jwt': token,
         'expires_in': 30 * 60
     })
 
 
+@attendance_bp.route('/qr/<token>', methods=['GET'])
+def qr_image(token):
+    """QR image for an issued attendance token (?format=png|svg).
+
+    Needs no login: the image shows nothing the token in the URL does not. Only
+    tokens signed by us are rendered, and the response may be cached until the
+    token expires.
+    """
+    fmt = request.args.get('format', 'png')
+    if fmt not in qr_images.FORMATS:
+        return jsonify({'error': 'Unsupported format'}), 400
+    rotating = qr_tokens.parse(token)
+    if rotating:
+        entry = session_registry.by_session(rotating[0])
+        if not entry or not entry['secret'] or not qr_tokens.verify(entry['secret'], token):
+            return jsonify({'error': 'Invalid or expired QR token'}), 404
+        max_age = qr_tokens.seconds_left(rotating[1])
+    else:
+        try:
+            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return jsonify({'error': 'QR code expired'}), 410
+        except jwt.InvalidTokenError:
+            return jsonify({'error': 'Invalid QR token'}), 404
+        max_age = max(int(payload['exp'] - time.time()), 0)
+
+    body, mimetype, etag = qr_images.get(token, fmt)
+    resp = current_app.response_class(body, mimetype=mimetype)
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.max_age = max_age
+    return resp.make_conditional(request)
+
+
 @attendance_bp.route('/mark-qr', methods=['POST'])
 @token_required
 @role_required(['student'])
 def mark_attendance_qr(current_user):
     data = request.get_json()
     token = data.get('token') or data.get('jwt') or data.get('qr_token')
-    manual_code = data.get('manual_code')
+    manual_code = normalize_manual_code(data.get('manual_code'))
 
     if not token and not manual_code:
         return jsonify({'error': 'QR token or manual code required'}), 400
 
-    session = None
+    session_id = None
     subject = None
+    today = datetime.now(pytz.timezone('Asia/Kolkata')).date()
 
     if manual_code:
-        # Try to find session by manual code
-        session = AttendanceSession.query.filter_by(
-            manual_code=manual_code,
-            is_active=True,
-            date=datetime.now(pytz.timezone('Asia/Kolkata')).date()
-        ).first()
-        if not session:
+        # Try the in-memory registry first, then the database (unique index on manual_code)
+        entry = session_registry.by_code(manual_code)
+        if not entry:
+            session = AttendanceSession.query.filter_by(
+                manual_code=manual_code,
+                is_active=True,
+                date=today
+            ).first()
+            if session:
+                entry = session_registry.remember(session)
+        if not entry or entry['date'] != today:
             return jsonify({'error': 'Invalid or expired manual code'}), 400
+        session_id = entry['session_id']
+    elif qr_tokens.parse(token):
+        # Rotating QR frame: pure HMAC check against the session's derived secret
+        entry = session_registry.by_session(qr_tokens.parse(token)[0])
+        if not entry or not entry['secret'] or not qr_tokens.verify(entry['secret'], token):
+            return jsonify({'error': 'Invalid or expired QR code'}), 400
+        session_id = entry['session_id']
+        subject = entry['subject']
     else:
         # Handle QR token
         try:
             payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-            session_id = payload.get('session_id')
+            payload_session_id = payload.get('session_id')
             jti = payload.get('jti')
             subject = payload.get('subject')
 
-            if not session_id or not jti:
+            if not payload_session_id or not jti:
                 return jsonify({'error': 'Invalid QR payload'}), 400
 
             # Find session and verify stored jti matches
-            session = AttendanceSession.query.filter_by(id=session_id, qr_token=jti, is_active=True).first()
-            if not session:
+            entry = session_registry.by_jti(jti)
+            if not entry:
+                session = AttendanceSession.query.filter_by(id=payload_session_id, qr_token=jti, is_active=True).first()
+                if session:
+                    entry = session_registry.remember(session)
+            if not entry or entry['session_id'] != payload_session_id:
                 return jsonify({'error': 'Invalid or inactive QR session'}), 400
+            session_id = entry['session_id']
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'QR code expired'}), 400
         except Exception:
             return jsonify({'error': 'Invalid QR token'}), 400
 
-    # Check if student already marked
+    # Queue the mark; the in-memory marked set answers repeats and the flusher keeps
+    # the unique constraint's semantics
     student = current_user.student
-    existing = Attendance.query.filter_by(student_id=student.id, session_id=session.id).first()
-    if existing:
+    attendance = attendance_writer.enqueue(student.id, session_id, status='present', marked_by='qr', subject=subject)
+    if not attendance:
         return jsonify({'error': 'Attendance already marked'}), 400
 
-    # Mark attendance (record subject if present in token)
-    attendance = Attendance(student_id=student.id, session_id=session.id, status='present', marked_by='qr', subject=subject)
-    db.session.add(attendance)
-    db.session.commit()
-
-    resp = {'message': 'Attendance marked successfully', 'status': 'present', 'marked_at': attendance.marked_at.isoformat()}
+    resp = {'message': 'Attendance marked successfully', 'status': 'present', 'marked_at': attendance['marked_at'].isoformat()}
     if subject:
         resp['subject'] = subject
     return jsonify(resp)
@@ -191,24 +229,15 @@ def get_today_sessions(current_user):
         student = current_user.student
         # Debug output: print student info
         print(f"[DEBUG] Student ID: {student.id}, Standard: {student.standard}, Division: {student.division}")
-        sessions = db.session.query(AttendanceSession).join(Timetable).join(Class).filter(
-            AttendanceSession.date == today,
-            Class.standard == student.standard,
-            Class.division == student.division
-        ).all()
+        sessions = sessions_for_day(today, standard=student.standard, division=student.division)
+        marks = student_marks(student.id, [s.id for s in sessions])
         # Debug output: print all sessions found for student
         print(f"[DEBUG] Found {len(sessions)} sessions for student {student.id} on {today}")
         for s in sessions:
-            try:
-                print(f"[DEBUG] Session ID: {s.id}, Timetable ID: {s.timetable_id}, Class: {s.timetable.class_.standard}-{s.timetable.class_.division}, Subject: {s.timetable.subject.name if s.timetable.subject else 'N/A'}")
-            except Exception as e:
-                print(f"[DEBUG] Error printing session info: {e}")
+            print(f"[DEBUG] Session ID: {s.id}, Timetable ID: {s.timetable_id}, Class: {s.timetable.class_ref.standard}-{s.timetable.class_ref.division}, Subject: {s.timetable.subject.name}")
     else:
         # Teachers see all sessions they're teaching
-        sessions = db.session.query(AttendanceSession).join(Timetable).filter(
-            AttendanceSession.date == today,
-            Timetable.teacher_id == current_user.teacher.id if current_user.role == 'teacher' else True
-        ).all()
+        sessions = sessions_for_day(today, teacher_id=current_user.teacher.id if current_user.role == 'teacher' else None)
     
     session_data = []
     for session in sessions:
@@ -222,10 +251,7 @@ def get_today_sessions(current_user):
             'attendance_method': session.attendance_method
         }
         if current_user.role == 'student':
-            attendance = Attendance.query.filter_by(
-                student_id=current_user.student.id,
-                session_id=session.id
-            ).first()
+            attendance = marks.get(session.id)
             session_info['attendance_status'] = attendance.status if attendance else 'absent'
             session_info['marked_at'] = attendance.marked_at.isoformat() if attendance else None
         session_data.append(session_info)
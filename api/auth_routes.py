@@ -1,11 +1,41 @@
 from flask import Blueprint, request, jsonify, session, current_app
-from models import db, User, Student, Teacher
-from auth import generate_token
+from models import db, User, Student, Teacher, normalize_name
+from auth import generate_token, start_login_session
+from auth_cache import auth_cache, token_issued_at
+import session_counters
+from password_hashing import login_pool, LoginPoolBusy
+from sqlalchemy.orm import contains_eager
 import jwt
 from datetime import datetime, timedelta
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+@auth_bp.errorhandler(LoginPoolBusy)
+def login_pool_busy(e):
+    resp = jsonify({'error': 'Too many logins in progress, please retry shortly'})
+    resp.status_code = 503
+    resp.headers['Retry-After'] = str(e.retry_after)
+    return resp
+
+
+def _verify_password(user, password):
+    """Check the password through the bounded login pool, saving a rehash if parameters changed"""
+    old_hash = user.password_hash
+    ok = login_pool.verify(user, password)
+    if ok and user.password_hash != old_hash:
+        db.session.commit()
+    return ok
+
+
+def _name_matches(user, name):
+    """True if the typed name is the student's name or a run of whole words in it (e.g. first name only)"""
+    typed = normalize_name(name)
+    if not typed:
+        return False
+    stored = user.name_normalized or normalize_name(user.name)
+    return f' {typed} ' in f' {stored} '
+
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
@@ -22,21 +52,18 @@ def login():
         password = data.get('password')
         if not all([name, roll_no, division, standard, password]):
             return jsonify({'error': 'All student credentials required'}), 400
-        student = Student.query.join(User).filter(
-            User.name.ilike(f'%{name}%'),
-            Student.roll_no == roll_no,
-            Student.division == division,
-            Student.standard == standard,
+        # (roll_no, division, standard) is unique, so this is a single index probe;
+        # the name is then matched on whole words instead of a substring scan
+        student = Student.query.join(User).options(contains_eager(Student.user)).filter(
+            Student.roll_no == str(roll_no).strip(),
+            Student.division == str(division).strip(),
+            Student.standard == str(standard).strip(),
             User.is_active == True
         ).first()
-        if not student or not student.user.check_password(password):
+        if not student or not _name_matches(student.user, name) or not _verify_password(student.user, password):
             return jsonify({'error': 'Invalid student credentials'}), 401
-        token = generate_token(student.user.id)
-        session.clear()  # Clear any existing session
-        session['jwt_token'] = token
-        session['user_id'] = student.user.id
-        session['role'] = 'student'
-        session['name'] = student.user.name
+        token = generate_token(student.user.id, student.user)
+        start_login_session(student.user, token)
         return jsonify({
             'token': token,
             'user': {
@@ -59,18 +86,14 @@ def login():
             return jsonify({'error': 'Email and password required'}), 400
         
         user = User.query.filter_by(email=email, is_active=True).first()
-        if not user or not user.check_password(password):
+        if not user or not _verify_password(user, password):
             return jsonify({'error': 'Invalid credentials'}), 401
         
         if user.role != data.get('login_type'):
             return jsonify({'error': 'Invalid role'}), 401
         
-        token = generate_token(user.id)
-        session.clear()  # Clear any existing session
-        session['jwt_token'] = token
-        session['user_id'] = user.id
-        session['role'] = user.role
-        session['name'] = user.name
+        token = generate_token(user.id, user)
+        start_login_session(user, token)
         
         user_data = {
             'id': user.id,
@@ -108,11 +131,20 @@ def verify_token():
     if not token:
         return jsonify({'error': 'No token provided'}), 401
     
+    # Dashboards verify on every page load; repeats of a recent success skip decoding and the user lookup
+    cached = auth_cache.verified(token)
+    if cached is not None:
+        return jsonify(cached)
+    
     try:
         data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-        user = User.query.get(data['user_id'])
+        if auth_cache.is_revoked(data['user_id'], token_issued_at(data)):
+            return jsonify({'valid': False}), 401
+        user = auth_cache.get_user(data['user_id'])
         if user and user.is_active:
-            return jsonify({'valid': True, 'user_id': user.id, 'role': user.role})
+            result = {'valid': True, 'user_id': user.id, 'role': user.role}
+            auth_cache.remember_verified(token, user.id, result, data['exp'])
+            return jsonify(result)
         else:
             return jsonify({'valid': False}), 401
     except jwt.ExpiredSignatureError:
@@ -148,6 +180,7 @@ def register_student():
         if isinstance(e, IntegrityError):
             return jsonify({'error': 'Student with this Roll No, Division, and Standard already exists'}), 409
         return jsonify({'error': 'Registration failed', 'details': str(e)}), 500
+    session_counters.roster_changed()
     return jsonify({'message': 'Student registered successfully'}), 201
 @auth_bp.route('/register/teacher', methods=['POST'])
 def register_teacher():
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from models import db, Student, Attendance, AttendanceSession, Task, Notification
 from models import Timetable, Class, Subject, User, Teacher
 from auth import token_required, role_required
+from session_listing import sessions_for_day, student_marks
 from datetime import datetime, date, timedelta
 from sqlalchemy import func
 import pytz
@@ -15,20 +16,9 @@ def get_dashboard_data(current_user):
     student = current_user.student
     today = datetime.now(pytz.timezone('Asia/Kolkata')).date()
     
-    # Get today's attendance sessions
-    sessions = db.session.query(AttendanceSession).join(Timetable).join(Class).filter(
-        AttendanceSession.date == today,
-        Class.standard == student.standard,
-        Class.division == student.division
-    ).all()
-    
-    # Get attendance records for today
-    attendance_records = {
-        record.session_id: record for record in 
-        Attendance.query.filter_by(student_id=student.id).join(AttendanceSession).filter(
-            AttendanceSession.date == today
-        ).all()
-    }
+    # Get today's attendance sessions and this student's marks for them
+    sessions = sessions_for_day(today, standard=student.standard, division=student.division)
+    attendance_records = student_marks(student.id, [s.id for s in sessions])
     
     # Format session data
     session_data = []
@@ -1,14 +1,23 @@
-import qrcode
 import io
-import base64
 import secrets
 import jwt
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, url_for, Response, stream_with_context, send_file
 from datetime import datetime, date, timedelta
+import csv
+import hashlib
+import json
+import time
 import pytz
-from models import db, Teacher, AttendanceSession, Attendance, Student, Timetable, Class, Subject, User
+from models import db, AttendanceSession, Attendance, Student, Timetable, Class, Subject, User
 from auth import token_required, role_required
-from sqlalchemy import func, and_
+from session_registry import session_registry
+from manual_codes import assign_manual_code
+from session_listing import sessions_for_day
+from roster_cache import roster_cache
+from attendance_events import attendance_events, as_event, is_cursor
+import session_counters
+import qr_tokens
+from sqlalchemy import func
 
 teacher_bp = Blueprint('teacher', __name__, url_prefix='/api/teacher')
 
@@ -27,20 +36,8 @@ def delete_session(current_user, session_id):
     # Delete session
     db.session.delete(session)
     db.session.commit()
+    session_registry.revoke(session_id)
     return jsonify({'message': f'Session {session_id} deleted successfully'})
-import qrcode
-import io
-import base64
-import secrets
-import jwt
-from flask import Blueprint, request, jsonify, current_app
-from datetime import datetime, date, timedelta
-import pytz
-from models import db, Teacher, AttendanceSession, Attendance, Student, Timetable, Class, Subject, User
-from auth import token_required, role_required
-from sqlalchemy import func, and_
-
-teacher_bp = Blueprint('teacher', __name__, url_prefix='/api/teacher')
 
 # Create session from dashboard UI
 @teacher_bp.route('/create_session', methods=['POST'])
@@ -102,12 +99,16 @@ def create_session(current_user):
     ).all()
     if prev_sessions:
         print(f"[DEBUG] Deleting {len(prev_sessions)} previous sessions for this class/division/subject for today.")
+    prev_session_ids = [s.id for s in prev_sessions]
     for s in prev_sessions:
         db.session.delete(s)
     db.session.commit()
+    for prev_session_id in prev_session_ids:
+        session_registry.revoke(prev_session_id)
 
     # Create new session and set active
     session = AttendanceSession(timetable_id=tt.id, date=today, start_time=start, end_time=end, is_active=True)
+    session_counters.init_roster(session, cls)
     db.session.add(session)
     db.session.commit()
     print(f"[DEBUG] Created session: id={session.id}, class={class_standard}-{class_division}, academic_year={academic_year}, start={start}, end={end}, is_active={session.is_active}")
@@ -122,21 +123,6 @@ def create_session(current_user):
         'start_time': start.isoformat(),
         'end_time': end.isoformat()
     })
-def generate_qr_code(data: str) -> str:
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_M,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    img_bytes = buf.getvalue()
-    base64_img = base64.b64encode(img_bytes).decode('utf-8')
-    return f"data:image/png;base64,{base64_img}"
 # QR code generation endpoint for attendance session
 @teacher_bp.route('/session/<int:session_id>/generate_qr', methods=['POST'])
 @token_required
@@ -150,51 +136,161 @@ def generate_session_qr(current_user, session_id):
     if not session:
         return jsonify({'error': 'Session not found or access denied'}), 404
 
-
-
-
     data = request.get_json() or {}
     subject = data.get('subject')
 
-    # Generate a short 6-character code
-    short_code = secrets.token_urlsafe(4)[:6].upper()
-    
-    # Add random nonce for QR uniqueness
-    nonce = secrets.token_hex(4)
-    
-    # create JWT payload with jti and optional subject
-    jti = secrets.token_urlsafe(16)
-    payload = {
-        'session_id': session_id,
-        'jti': jti,
-        'code': short_code,
-        'nonce': nonce,
-        'iat': datetime.utcnow(),
-        'exp': datetime.utcnow() + timedelta(seconds=300),
-    }
-    if subject:
-        payload['subject'] = subject
-
-    token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
-
-    # store jti, code, and qr_code (data URL) on session
-    img_data = generate_qr_code(token)
-    session.qr_token = jti
-    session.manual_code = short_code
-    session.qr_code = img_data
+    # A new jti re-keys the rotating QR: frames issued before this call stop validating
+    session.qr_token = secrets.token_urlsafe(16)
+    session.qr_subject = subject
+    # Short code for manual entry, unique among open sessions
+    short_code = assign_manual_code(session)
+    session.qr_code = None
     session.is_active = True
     session.attendance_method = 'qr'
     db.session.commit()
-    
-    # Return both the short code and full JWT
-    resp = {
-        'qr_code': img_data,
+    # Rotating the token invalidates the previous jti/code in every worker's registry
+    entry = session_registry.publish(session)
+
+    # Return the current frame, where to fetch the next ones, and the short code
+    resp = _qr_frame(entry)
+    resp.update({
         'jwt': short_code,  # Use short code for manual entry
-        'expires_in': 300,
-        '_debug_token': token if current_app.config.get('TESTING') else None
-    }
+        'frame_url': url_for('teacher.get_session_qr_frame', session_id=session_id),
+        'stream_url': url_for('teacher.stream_session_qr', session_id=session_id),
+        'step_seconds': qr_tokens.step_seconds(),
+        '_debug_token': resp['qr_token'] if current_app.config.get('TESTING') else None
+    })
     return jsonify(resp)
 
+
+@teacher_bp.route('/session/<int:session_id>/close', methods=['POST'])
+@token_required
+@role_required(['teacher'])
+def close_session(current_user, session_id):
+    """Stop accepting scans for a session and recycle its manual code"""
+    session = AttendanceSession.query.join(Timetable).filter(
+        AttendanceSession.id == session_id,
+        Timetable.teacher_id == current_user.teacher.id
+    ).first()
+    if not session:
+        return jsonify({'error': 'Session not found or access denied'}), 404
+    session.is_active = False
+    session.manual_code = None
+    db.session.commit()
+    session_registry.revoke(session_id)
+    return jsonify({'message': f'Session {session_id} closed', 'session_id': session_id})
+
+
+def _qr_frame(entry):
+    """Current rotating QR frame for a registry entry; pure computation, no DB access"""
+    step = qr_tokens.current_step()
+    token = qr_tokens.token_for(entry['secret'], entry['session_id'], step)
+    return {
+        'session_id': entry['session_id'],
+        'qr_token': token,
+        'qr_url': url_for('attendance.qr_image', token=token),
+        'step': step,
+        'expires_in': qr_tokens.seconds_left(step)
+    }
+
+
+def _owned_qr_entry(current_user, session_id):
+    entry = session_registry.by_session(session_id)
+    if not entry or not entry['secret'] or entry['teacher_id'] != current_user.teacher.id:
+        return None
+    return entry
+
+
+@teacher_bp.route('/session/<int:session_id>/qr_frame', methods=['GET'])
+@token_required
+@role_required(['teacher'])
+def get_session_qr_frame(current_user, session_id):
+    """Current QR frame of a session whose QR was issued with generate_qr"""
+    entry = _owned_qr_entry(current_user, session_id)
+    if not entry:
+        return jsonify({'error': 'No active QR for this session'}), 404
+    return jsonify(_qr_frame(entry))
+
+
+@teacher_bp.route('/session/<int:session_id>/qr_stream', methods=['GET'])
+@token_required(allow_cookie=True)
+@role_required(['teacher'])
+def stream_session_qr(current_user, session_id):
+    """Server-sent events: one 'frame' event per QR step until the session's QR is revoked or re-issued.
+
+    Each response ends after QR_STREAM_MAX_SECONDS so it never holds a worker
+    for long; EventSource reconnects and is sent the current frame first.
+    """
+    entry = _owned_qr_entry(current_user, session_id)
+    if not entry:
+        return jsonify({'error': 'No active QR for this session'}), 404
+    max_seconds = current_app.config.get('QR_STREAM_MAX_SECONDS', 25)
+
+    def frames():
+        deadline = time.monotonic() + max_seconds
+        secret = entry['secret']
+        yield 'retry: 500\n\n'
+        while True:
+            current = session_registry.by_session(session_id)
+            if not current or current['secret'] != secret:
+                yield 'event: closed\ndata: {}\n\n'
+                return
+            frame = _qr_frame(current)
+            yield f"event: frame\ndata: {json.dumps(frame)}\n\n"
+            remaining = deadline - time.monotonic()
+            if remaining <= frame['expires_in'] + 0.25:
+                # Hold the connection to the cap rather than reconnecting straight away for the same frame
+                time.sleep(max(remaining, 0))
+                return
+            time.sleep(frame['expires_in'] + 0.25)
+
+    resp = Response(stream_with_context(frames()), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
+def _poll_etag(user_id):
+    """ETag for a user's attendance poll: changes when any mark is committed, any roster changes
+    or any session is closed or deleted (the registry epoch), all without a query"""
+    raw = f"{attendance_events.cursor()}|{roster_cache.version()}|{session_registry.version()}|{user_id}|{request.full_path}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _with_etag(resp, etag):
+    resp.set_etag(etag)
+    # Always revalidate; a matching If-None-Match is answered with an empty 304
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+
+def _not_modified(etag):
+    return _with_etag(current_app.response_class(status=304), etag)
+
+
+def _changed_since(value, session_ids=None):
+    """'since' cursor -> ((session_id, student_id) pairs changed after it, next cursor).
+
+    The cursor is an attendance_events cursor, so it follows commit order: a
+    write-behind row stored long after its marked_at (flush retries, a replayed
+    journal) is still reported. Without a cursor the pairs are None (full
+    listing); a malformed cursor gives (False, None).
+    """
+    if not value:
+        return None, attendance_events.cursor()
+    if not is_cursor(value):
+        return False, None
+    events, next_since = attendance_events.read(value, session_ids)
+    return {(event['session_id'], event['student_id']) for event in events}, next_since
+
+
+def _only_pairs(query, pairs):
+    """Narrow an Attendance query to the given (session_id, student_id) pairs (the caller re-checks each row)"""
+    return query.filter(
+        Attendance.session_id.in_({session_id for session_id, _ in pairs}),
+        Attendance.student_id.in_({student_id for _, student_id in pairs})
+    )
+
+
 @teacher_bp.route('/sessions/today', methods=['GET'])
 @token_required
 @role_required(['teacher'])
@@ -205,51 +301,39 @@ def get_today_sessions(current_user):
     print("[DEBUG] /api/teacher/sessions/today called by:", current_user.email, "(user_id:", current_user.id, ")")
     print("[DEBUG] Teacher.id:", teacher.id if teacher else None)
 
-    # Get teacher's sessions for today
-    sessions = db.session.query(AttendanceSession).join(Timetable).filter(
-        Timetable.teacher_id == teacher.id,
-        AttendanceSession.date == today
-    ).all()
+    # Get teacher's sessions for today: one joined query; counts come from the session rows
+    sessions = sessions_for_day(today, teacher_id=teacher.id)
 
     print(f"[DEBUG] Found {len(sessions)} sessions for today.")
     for s in sessions:
         print(f"[DEBUG] Session: id={s.id}, timetable_id={s.timetable_id}, date={s.date}, start={s.start_time}, end={s.end_time}")
 
+    # Defensive: ensure start_time and end_time are present and formatted
+    def format_dt(dt):
+        if dt is None:
+            return "--:--"
+        try:
+            return dt.isoformat()
+        except Exception:
+            return str(dt)
+
     session_data = []
     for session in sessions:
-        # Count attendance for this session
-        attendance_count = Attendance.query.filter_by(
-            session_id=session.id,
-            status='present'
-        ).count()
-
-        # Get total students in class
-        total_students = Student.query.join(User).filter(
-            Student.standard == session.timetable.class_ref.standard,
-            Student.division == session.timetable.class_ref.division,
-            User.is_active == True
-        ).count()
-
-        # Defensive: ensure start_time and end_time are present and formatted
-        def format_dt(dt):
-            if dt is None:
-                return "--:--"
-            try:
-                return dt.isoformat()
-            except Exception:
-                return str(dt)
-
+        timetable = session.timetable
+        class_ref = timetable.class_ref
         session_info = {
             'id': session.id,
             'timetable_id': session.timetable_id,
-            'subject': session.timetable.subject.name if session.timetable and session.timetable.subject else "",
-            'class_name': f"{session.timetable.class_ref.standard}-{session.timetable.class_ref.division}" if session.timetable and session.timetable.class_ref else "",
-            'room_number': session.timetable.room_number if session.timetable else "",
+            'subject': timetable.subject.name,
+            'class_name': f"{class_ref.standard}-{class_ref.division}",
+            'room_number': timetable.room_number,
             'start_time': format_dt(session.start_time),
             'end_time': format_dt(session.end_time),
             'is_active': session.is_active,
-            'attendance_count': attendance_count,
-            'total_students': total_students
+            'attendance_count': session.present_count,
+            'late_count': session.late_count,
+            'absent_count': session.absent_count,
+            'total_students': session.roster_count
         }
         session_data.append(session_info)
     
@@ -259,11 +343,26 @@ def get_today_sessions(current_user):
 @token_required
 @role_required(['teacher'])
 def get_live_attendance(current_user):
+    """Today's marks in the teacher's sessions, newest first.
+
+    ?since=<cursor> returns only rows marked or changed after that cursor (the
+    'since' of an earlier response); either way the response carries the next
+    one. An If-None-Match matching the current ETag gets a 304 without a query.
+    """
+    etag = _poll_etag(current_user.id)
+    if etag in request.if_none_match:
+        return _not_modified(etag)
+    # Taken before the query, so a stream or delta poll from it misses nothing committed meanwhile
+    changed, next_since = _changed_since(request.args.get('since'))
+    if changed is False:
+        return jsonify({'error': 'Invalid since cursor'}), 400
     teacher = current_user.teacher
     today = datetime.now(pytz.timezone('Asia/Kolkata')).date()
     
     # Get attendance records for teacher's classes today
-    attendance_records = db.session.query(
+    query = db.session.query(
+        Attendance.session_id,
+        Attendance.student_id,
         Attendance.status,
         Attendance.marked_at,
         User.name.label('student_name'),
@@ -274,11 +373,19 @@ def get_live_attendance(current_user):
     ).select_from(Attendance).join(Student).join(User).join(AttendanceSession).join(Timetable).join(Subject).filter(
         Timetable.teacher_id == teacher.id,
         AttendanceSession.date == today
-    ).order_by(Attendance.marked_at.desc()).all()
+    )
+    if changed is not None:
+        query = _only_pairs(query, changed)
+    attendance_records = [
+        record for record in query.order_by(Attendance.marked_at.desc()).all()
+        if changed is None or (record.session_id, record.student_id) in changed
+    ]
     
     attendance_data = []
     for record in attendance_records:
         attendance_data.append({
+            'session_id': record.session_id,
+            'student_id': record.student_id,
             'student_name': record.student_name,
             'roll_no': record.roll_no,
             'class_name': f"{record.standard}-{record.division}",
@@ -287,12 +394,109 @@ def get_live_attendance(current_user):
             'marked_at': record.marked_at.isoformat() if record.marked_at else None
         })
     
-    return jsonify({'attendance': attendance_data})
+    resp = jsonify({'attendance': attendance_data, 'cursor': next_since, 'since': next_since, 'partial': changed is not None})
+    return _with_etag(resp, etag)
+
+
+@teacher_bp.route('/attendance/stream', methods=['GET'])
+@token_required(allow_cookie=True)
+@role_required(['teacher'])
+def stream_live_attendance(current_user):
+    """Server-sent events: the attendance rows that change in the teacher's sessions today.
+
+    Each 'attendance' event carries a list of records shaped like /attendance/live
+    (plus session_id and student_id); its id is the feed cursor, so a reconnecting
+    EventSource resumes via Last-Event-ID. Pass ?cursor= from /attendance/live to
+    start where that snapshot ended, and ?session_id= to follow a single session.
+    The response ends after ATTENDANCE_STREAM_MAX_SECONDS with a 'closed' event
+    and the browser reconnects from there, so no stream holds a worker for long.
+    """
+    teacher_id = current_user.teacher.id
+    today = datetime.now(pytz.timezone('Asia/Kolkata')).date()
+    only_session = request.args.get('session_id', type=int)
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor') or attendance_events.cursor()
+    poll = current_app.config.get('ATTENDANCE_STREAM_POLL', 0.5)
+    max_seconds = current_app.config.get('ATTENDANCE_STREAM_MAX_SECONDS', 25)
+
+    def load_sessions():
+        sessions = {}
+        for s in sessions_for_day(today, teacher_id=teacher_id):
+            if only_session is None or s.id == only_session:
+                class_ref = s.timetable.class_ref
+                sessions[s.id] = (class_ref.standard, class_ref.division, s.timetable.subject.name)
+        # End the read transaction; this request stays open for a long time
+        db.session.rollback()
+        return sessions
+
+    sessions = load_sessions()
+    if only_session is not None and only_session not in sessions:
+        return jsonify({'error': 'Session not found or access denied'}), 404
+
+    def changes():
+        nonlocal cursor, sessions
+        foreign = set()  # session ids seen in the feed that belong to other teachers
+        started = last_sent = time.monotonic()
+        yield 'retry: 1000\n\n'
+        while time.monotonic() - started < max_seconds:
+            events, cursor = attendance_events.read(cursor)
+            records = []
+            rosters = {}
+            for event in events:
+                info = sessions.get(event['session_id'])
+                if info is None:
+                    if only_session is not None or event['session_id'] in foreign:
+                        continue
+                    # Possibly a session created after the stream opened
+                    sessions = load_sessions()
+                    info = sessions.get(event['session_id'])
+                    if info is None:
+                        foreign.add(event['session_id'])
+                        continue
+                standard, division, subject = info
+                if (standard, division) not in rosters:
+                    rosters[(standard, division)] = {st['id']: st for st in roster_cache.get(standard, division)}
+                student = rosters[(standard, division)].get(event['student_id'])
+                if not student:
+                    continue
+                records.append({
+                    'session_id': event['session_id'],
+                    'student_id': event['student_id'],
+                    'student_name': student['name'],
+                    'roll_no': student['roll_no'],
+                    'class_name': f"{standard}-{division}",
+                    'subject': subject,
+                    'status': event['status'],
+                    'marked_at': event['marked_at']
+                })
+            if rosters:
+                db.session.rollback()
+            if records:
+                yield f"id: {cursor}\nevent: attendance\ndata: {json.dumps(records)}\n\n"
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= 15:
+                # Comment line keeps proxies from closing an idle stream
+                yield ': keepalive\n\n'
+                last_sent = time.monotonic()
+            time.sleep(poll)
+        yield f"id: {cursor}\nevent: closed\ndata: {{}}\n\n"
+
+    resp = Response(stream_with_context(changes()), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
 
 @teacher_bp.route('/session/<int:session_id>/students', methods=['GET'])
 @token_required
 @role_required(['teacher'])
 def get_session_students(current_user, session_id):
+    # Unchanged since the client's copy: 304 before touching the database
+    etag = _poll_etag(current_user.id)
+    if etag in request.if_none_match:
+        return _not_modified(etag)
+    changed, next_since = _changed_since(request.args.get('since'), {session_id})
+    if changed is False:
+        return jsonify({'error': 'Invalid since cursor'}), 400
+    
     # Verify teacher owns this session
     session = AttendanceSession.query.join(Timetable).filter(
         AttendanceSession.id == session_id,
@@ -308,54 +512,36 @@ def get_session_students(current_user, session_id):
     academic_year = session.timetable.class_ref.academic_year
     
     try:
-        # Get students in the class with all necessary details
-        students_query = db.session.query(
-            Student.id,
-            Student.roll_no,
-            Student.standard,
-            Student.division,
-            User.name,
-            User.is_active,
-            User.email,
-            Attendance.status,
-            Attendance.marked_at,
-            Attendance.marked_by
-        ).select_from(Student).join(
-            User, User.id == Student.user_id
-        ).outerjoin(
-            Attendance,
-            and_(
-                Attendance.student_id == Student.id,
-                Attendance.session_id == session_id
-            )
-        ).filter(
-            Student.standard == class_standard,
-            Student.division == class_division,
-            User.is_active == True
-        ).order_by(Student.roll_no)
-        
-        students = students_query.all()
+        # Roster from the shared cache; only this session's marks are read per poll
+        roster = roster_cache.get(class_standard, class_division)
+        marks_query = Attendance.query.filter_by(session_id=session_id)
+        if changed is not None:
+            marks_query = _only_pairs(marks_query, changed)
+        marks = {a.student_id: a for a in marks_query.all()}
         
         student_data = []
-        for record in students:
+        for student in roster:
+            mark = marks.get(student['id'])
+            if changed is not None and (session_id, student['id']) not in changed:
+                continue
             student_info = {
-                'id': record.id,
-                'name': record.name,
-                'roll_no': record.roll_no,
-                'standard': record.standard,
-                'division': record.division,
-                'current_status': record.status or 'absent',
-                'marked_at': record.marked_at.isoformat() if record.marked_at else None,
-                'marked_by': record.marked_by,
-                'display_name': f"{record.name} ({record.roll_no})"
+                'id': student['id'],
+                'name': student['name'],
+                'roll_no': student['roll_no'],
+                'standard': class_standard,
+                'division': class_division,
+                'current_status': mark.status if mark else 'absent',
+                'marked_at': mark.marked_at.isoformat() if mark and mark.marked_at else None,
+                'marked_by': mark.marked_by if mark else None,
+                'display_name': f"{student['name']} ({student['roll_no']})"
             }
             student_data.append(student_info)
         
-        # Get additional class statistics
+        # Class statistics from the session's materialized counters
         attendance_stats = {
-            'present': len([s for s in student_data if s['current_status'] == 'present']),
-            'late': len([s for s in student_data if s['current_status'] == 'late']),
-            'absent': len([s for s in student_data if s['current_status'] == 'absent'])
+            'present': session.present_count,
+            'late': session.late_count,
+            'absent': session.absent_count
         }
         
         # Add metadata about the class
@@ -365,14 +551,16 @@ def get_session_students(current_user, session_id):
                 'standard': class_standard,
                 'division': class_division,
                 'academic_year': academic_year,
-                'total_students': len(student_data),
+                'total_students': session.roster_count,
                 'subject': session.timetable.subject.name if session.timetable.subject else None,
                 'stats': attendance_stats,
                 'last_updated': datetime.now().isoformat()
             }
         }
         
-        return jsonify(response_data)
+        response_data['since'] = next_since
+        response_data['partial'] = changed is not None
+        return _with_etag(jsonify(response_data), etag)
         
     except Exception as e:
         db.session.rollback()
@@ -401,12 +589,15 @@ def save_manual_attendance(current_user):
     
     try:
         # Update or create attendance records
+        changed = []
+        counter_changes = []
         for record in attendance_data:
             student_id = record.get('student_id')
             status = record.get('status')
             
             if not student_id or not status:
                 continue
+            student_id = int(student_id)
             
             # Check if attendance already exists
             existing = Attendance.query.filter_by(
@@ -414,20 +605,27 @@ def save_manual_attendance(current_user):
                 session_id=session_id
             ).first()
             
+            counter_changes.append((session.id, student_id, existing.status if existing else None, status))
             if existing:
                 existing.status = status
                 existing.marked_at = datetime.utcnow()
                 existing.marked_by = 'teacher'
             else:
-                new_attendance = Attendance(
+                existing = Attendance(
                     student_id=student_id,
                     session_id=session_id,
                     status=status,
+                    marked_at=datetime.utcnow(),
                     marked_by='teacher'
                 )
-                db.session.add(new_attendance)
+                db.session.add(existing)
+            changed.append(as_event(existing))
         
+        session_counters.record(counter_changes)
         db.session.commit()
+        # Later QR/face scans from these students must not be acknowledged
+        session_registry.mark(session.id, [event['student_id'] for event in changed])
+        attendance_events.publish(changed)
         return jsonify({'message': 'Attendance saved successfully'})
         
     except Exception as e:
@@ -453,15 +651,8 @@ def get_attendance_template(current_user):
     if not session:
         return jsonify({'error': 'Session not found or access denied'}), 404
         
-    # Get students in the class with their names from User table
-    students = db.session.query(Student, User).join(User).filter(
-        Student.standard == session.timetable.class_ref.standard,
-        Student.division == session.timetable.class_ref.division,
-        User.is_active == True
-    ).order_by(Student.roll_no).all()
-
-    # Create a mapping of roll numbers to student names for validation
-    student_names = {str(student.roll_no): user.name for student, user in students}
+    # Get students in the class with their names
+    students = roster_cache.get(session.timetable.class_ref.standard, session.timetable.class_ref.division)
     
     if file_type == 'xlsx':
         import pandas as pd
@@ -469,8 +660,8 @@ def get_attendance_template(current_user):
         
         # Create DataFrame with student data
         data = {
-            'Roll No': [student.roll_no for student, _ in students],
-            'Name': [user.name for _, user in students],
+            'Roll No': [student['roll_no'] for student in students],
+            'Name': [student['name'] for student in students],
             'Status': [''] * len(students)  # Empty status column for filling
         }
         df = pd.DataFrame(data)
@@ -502,8 +693,8 @@ def get_attendance_template(current_user):
         output = io.StringIO()
         writer = csv.writer(output)
         writer.writerow(['Roll No', 'Name', 'Status'])
-        for student, user in students:
-            writer.writerow([student.roll_no, user.name, ''])
+        for student in students:
+            writer.writerow([student['roll_no'], student['name'], ''])
             
         return Response(
             output.getvalue(),
@@ -535,14 +726,13 @@ def bulk_attendance_upload(current_user):
         
     try:
         # Get all students in the class with their names for validation
-        student_info = {str(s.roll_no): {'id': s.id, 'name': u.name} for s, u in db.session.query(Student, User).join(User).filter(
-            Student.standard == session.timetable.class_ref.standard,
-            Student.division == session.timetable.class_ref.division,
-            User.is_active == True
-        ).all()}
+        roster = roster_cache.get(session.timetable.class_ref.standard, session.timetable.class_ref.division)
+        student_info = {str(s['roll_no']): {'id': s['id'], 'name': s['name']} for s in roster}
         
         success_count = 0
         error_records = []
+        changed = []
+        counter_changes = []
         
         # Process file based on type
         filename = file.filename.lower()
@@ -592,22 +782,28 @@ def bulk_attendance_upload(current_user):
                 session_id=session_id
             ).first()
             
+            counter_changes.append((session.id, student_id, existing.status if existing else None, status))
             if existing:
                 existing.status = status
                 existing.marked_at = datetime.utcnow()
                 existing.marked_by = 'teacher_bulk'
             else:
-                attendance = Attendance(
+                existing = Attendance(
                     student_id=student_id,
                     session_id=session_id,
                     status=status,
+                    marked_at=datetime.utcnow(),
                     marked_by='teacher_bulk'
                 )
-                db.session.add(attendance)
+                db.session.add(existing)
+            changed.append(as_event(existing))
                 
             success_count += 1
             
+        session_counters.record(counter_changes)
         db.session.commit()
+        session_registry.mark(session.id, [event['student_id'] for event in changed])
+        attendance_events.publish(changed)
         
         return jsonify({
             'message': f'Successfully processed {success_count} records',
@@ -63,16 +63,62 @@ app.config.update(
     SESSION_COOKIE_HTTPONLY=True,
     SESSION_COOKIE_SAMESITE='Lax',
     PERMANENT_SESSION_LIFETIME=timedelta(days=1),
-    SESSION_TYPE='filesystem'
+    SESSION_TYPE='filesystem',
+    SESSION_REFRESH_EACH_REQUEST=False,
+    # Re-sign the login cookie and its JWT once less than this many seconds remain
+    SESSION_REFRESH_WINDOW=int(os.environ.get('SESSION_REFRESH_WINDOW', 6 * 3600)),
+    # Face detection/encoding process pool (per gunicorn worker)
+    FACE_POOL_WORKERS=int(os.environ.get('FACE_POOL_WORKERS', 2)),
+    FACE_POOL_QUEUE_LIMIT=int(os.environ.get('FACE_POOL_QUEUE_LIMIT', 8)),
+    FACE_TASK_TIMEOUT=float(os.environ.get('FACE_TASK_TIMEOUT', 20)),
+    FACE_POOL_RETRY_AFTER=int(os.environ.get('FACE_POOL_RETRY_AFTER', 2)),
+    FACE_ENROLLMENT_WORKERS=int(os.environ.get('FACE_ENROLLMENT_WORKERS', 2)),
+    # Queued or running enrollment jobs older than this were orphaned by a worker restart
+    FACE_ENROLLMENT_STALE_SECONDS=int(os.environ.get('FACE_ENROLLMENT_STALE_SECONDS', 600)),
+    # Face detection pipeline: locate on a downscaled copy (0 = full size), hog or cnn
+    FACE_DETECTION_WIDTH=int(os.environ.get('FACE_DETECTION_WIDTH', 640)),
+    FACE_DETECTION_MODEL=os.environ.get('FACE_DETECTION_MODEL', 'hog'),
+    FACE_UPSAMPLE=int(os.environ.get('FACE_UPSAMPLE', 1)),
+    FACE_NUM_JITTERS=int(os.environ.get('FACE_NUM_JITTERS', 1)),
+    FACE_UPLOAD_MAX_BYTES=int(os.environ.get('FACE_UPLOAD_MAX_BYTES', 8 * 1024 * 1024)),
+    # Recognition cache for repeated kiosk frames
+    FACE_CACHE_TTL=float(os.environ.get('FACE_CACHE_TTL', 10)),
+    FACE_CACHE_EMBEDDING_DISTANCE=float(os.environ.get('FACE_CACHE_EMBEDDING_DISTANCE', 0.15)),
+    # Write-behind attendance inserts: flush every N ms or once M rows are queued
+    ATTENDANCE_FLUSH_MS=int(os.environ.get('ATTENDANCE_FLUSH_MS', 50)),
+    ATTENDANCE_FLUSH_ROWS=int(os.environ.get('ATTENDANCE_FLUSH_ROWS', 200)),
+    # A batch that still fails after this many backed-off attempts is stored row by row; rejects go to attendance_dead.jsonl
+    ATTENDANCE_FLUSH_RETRIES=int(os.environ.get('ATTENDANCE_FLUSH_RETRIES', 5)),
+    # Rotating QR frames: new token every QR_TOKEN_STEP seconds, +/- QR_TOKEN_WINDOW steps accepted
+    QR_TOKEN_STEP=int(os.environ.get('QR_TOKEN_STEP', 30)),
+    QR_TOKEN_WINDOW=int(os.environ.get('QR_TOKEN_WINDOW', 1)),
+    # Each QR stream response ends after this long (the browser reconnects) so it never pins a worker
+    QR_STREAM_MAX_SECONDS=float(os.environ.get('QR_STREAM_MAX_SECONDS', 25)),
+    # Live attendance SSE: how often each stream checks the event feed, and when it ends so the client reconnects
+    ATTENDANCE_STREAM_POLL=float(os.environ.get('ATTENDANCE_STREAM_POLL', 0.5)),
+    ATTENDANCE_STREAM_MAX_SECONDS=float(os.environ.get('ATTENDANCE_STREAM_MAX_SECONDS', 25)),
+    # Trust role/profile claims in login tokens and serve current_user from a TTL cache
+    AUTH_STATELESS=os.environ.get('AUTH_STATELESS', 'true').lower() in ('1', 'true', 'yes'),
+    AUTH_USER_CACHE_TTL=float(os.environ.get('AUTH_USER_CACHE_TTL', 60)),
+    AUTH_VERIFY_CACHE_TTL=float(os.environ.get('AUTH_VERIFY_CACHE_TTL', 30)),
+    # Class rosters are cached per worker and dropped on any student change; TTL is a backstop
+    ROSTER_CACHE_TTL=float(os.environ.get('ROSTER_CACHE_TTL', 600)),
+    # Password hashing (werkzeug method string; older hashes are upgraded at login) and the login pool
+    PASSWORD_HASH_METHOD=os.environ.get('PASSWORD_HASH_METHOD', 'scrypt'),
+    LOGIN_POOL_WORKERS=int(os.environ.get('LOGIN_POOL_WORKERS', 2)),
+    LOGIN_POOL_QUEUE_LIMIT=int(os.environ.get('LOGIN_POOL_QUEUE_LIMIT', 32)),
+    LOGIN_TIMEOUT=float(os.environ.get('LOGIN_TIMEOUT', 10)),
+    LOGIN_RETRY_AFTER=int(os.environ.get('LOGIN_RETRY_AFTER', 1))
 )
 
 # Enable CORS with support for credentials
 CORS(app, supports_credentials=True)
 
-# Make sessions permanent by default
+# Login sessions are permanent from the start; only rewrite the cookie when one nears expiry
 @app.before_request
-def make_session_permanent():
-    session.permanent = True
+def refresh_session_near_expiry():
+    from auth import refresh_login_session
+    refresh_login_session()
     
 # Handle OPTIONS requests for CORS preflight
 @app.after_request
@@ -111,6 +157,14 @@ _try_register('api.teacher_routes', 'teacher_bp')
 _try_register('api.admin_routes', 'admin_bp')
 _try_register('api.ai_routes', 'ai_bp', url_prefix='/api/ai')
 
+# Enrollment jobs only run on the worker that accepted them; pick up the ones a dead worker left behind
+try:
+    from face_enrollment import enrollment_queue
+    with app.app_context():
+        enrollment_queue.recover(app)
+except Exception as e:
+    print(f"Could not recover face enrollment jobs: {e}")
+
 @app.route('/')
 def index():
     return render_template('index.html')
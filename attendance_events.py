@@ -0,0 +1,117 @@
+import glob
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+import pytz
+from flask import current_app
+
+
+def _today():
+    return datetime.now(pytz.timezone('Asia/Kolkata')).date()
+
+
+def as_event(row):
+    """Event payload for an Attendance object or a writer row dict; take it before the commit expires the object"""
+    get = row.get if isinstance(row, dict) else lambda key: getattr(row, key)
+    marked_at = get('marked_at')
+    return {
+        'session_id': get('session_id'),
+        'student_id': get('student_id'),
+        'status': get('status'),
+        'marked_by': get('marked_by'),
+        'marked_at': marked_at.isoformat() if isinstance(marked_at, datetime) else marked_at
+    }
+
+
+def is_cursor(value):
+    """Whether value has the 'YYYYMMDD:offset' form of a feed cursor"""
+    return bool(re.fullmatch(r'\d{8}:\d+', value or ''))
+
+
+class AttendanceEventLog:
+    """Cross-worker feed of committed attendance changes, for live dashboards.
+
+    Every marking path (the write-behind queue for QR and face marks, manual
+    and bulk saves) appends one JSON line per changed row to a per-day file in
+    the instance folder after its transaction commits. Stream readers in any
+    worker follow the file from a cursor of the form 'YYYYMMDD:offset', so a
+    teacher's dashboard only receives the rows that changed and can resume
+    after a reconnect (the cursor is the SSE event id). Files older than
+    yesterday are removed when a new day's file is started.
+    """
+
+    FILE_PREFIX = 'attendance_events'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def _path(self, day):
+        return os.path.join(current_app.instance_path, f'{self.FILE_PREFIX}.{day:%Y%m%d}.jsonl')
+
+    def _prune(self, day):
+        keep = {os.path.basename(self._path(d)) for d in (day, day - timedelta(days=1))}
+        for path in glob.glob(os.path.join(current_app.instance_path, f'{self.FILE_PREFIX}.*.jsonl')):
+            if os.path.basename(path) not in keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def publish(self, rows):
+        """Record committed rows (as_event dicts or writer rows) for every stream reader"""
+        lines = [json.dumps(as_event(row)) + '\n' for row in rows]
+        if not lines:
+            return
+        day = _today()
+        path = self._path(day)
+        with self._lock:
+            new_file = not os.path.exists(path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # One O_APPEND write per batch, so workers never interleave inside a line
+            with open(path, 'a') as f:
+                f.write(''.join(lines))
+        if new_file:
+            self._prune(day)
+
+    def cursor(self):
+        """Cursor at the current end of today's feed"""
+        day = _today()
+        try:
+            size = os.path.getsize(self._path(day))
+        except FileNotFoundError:
+            size = 0
+        return f'{day:%Y%m%d}:{size}'
+
+    def read(self, cursor, session_ids=None):
+        """Events after cursor (optionally only for session_ids) and the cursor to continue from"""
+        day = _today()
+        offset = 0
+        try:
+            cursor_day, cursor_offset = cursor.split(':')
+            if cursor_day == f'{day:%Y%m%d}':
+                offset = int(cursor_offset)
+        except (AttributeError, ValueError):
+            pass
+        try:
+            with open(self._path(day), 'rb') as f:
+                f.seek(offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return [], f'{day:%Y%m%d}:0'
+        # Leave a partially written last line for the next read
+        complete = chunk[:chunk.rfind(b'\n') + 1]
+        events = []
+        for line in complete.decode().splitlines():
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if session_ids is None or event['session_id'] in session_ids:
+                events.append(event)
+        return events, f'{day:%Y%m%d}:{offset + len(complete)}'
+
+
+# Shared event log for this worker process
+attendance_events = AttendanceEventLog()
@@ -0,0 +1,310 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from models import db, Attendance
+from session_registry import session_registry
+from attendance_events import attendance_events
+import session_counters
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AttendanceWriteQueue:
+    """Write-behind queue for attendance marks during scan bursts.
+
+    A mark is claimed against the session registry's in-memory set of marked
+    students (seeded from the database the first time a session is seen), then
+    appended and fsynced to a per-process journal in the instance folder before
+    it is acknowledged. A flusher thread bulk-inserts the pending rows in one
+    transaction every flush_interval seconds, or sooner once batch_size rows are
+    waiting, so a burst of scans costs a handful of SQLite write locks instead of
+    one per student.
+
+    Rows that already exist (another worker or a teacher got there first) are
+    filtered out before the insert, keeping the (student_id, session_id) unique
+    constraint's semantics. A batch that keeps failing is retried with backoff
+    up to max_retries times, then stored one row at a time; rows that still
+    fail go to a dead-letter file in the instance folder instead of blocking
+    the queue. Journals left behind by a dead worker are replayed on start, and
+    the queue is drained at interpreter exit.
+    """
+
+    JOURNAL_PREFIX = 'attendance_queue'
+    DEAD_LETTER_FILE = 'attendance_dead.jsonl'
+
+    def __init__(self, flush_interval=0.05, batch_size=200, max_retries=5):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self._app = None
+        self._pid = None
+        self._thread = None
+        self._journal = None
+        self._journal_path = None
+        self._pending = []
+        self._in_flight = []
+        self._failures = 0
+        self._stopping = False
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+
+    def configure(self, flush_interval_ms=50, batch_size=200, max_retries=5):
+        self.flush_interval = max(float(flush_interval_ms), 1.0) / 1000.0
+        self.batch_size = max(int(batch_size), 1)
+        self.max_retries = max(int(max_retries), 1)
+
+    def _ensure_started(self):
+        # Started lazily so a queue created before a gunicorn fork gets its own thread and journal
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            app = current_app._get_current_object()
+            self.configure(
+                app.config.get('ATTENDANCE_FLUSH_MS', 50),
+                app.config.get('ATTENDANCE_FLUSH_ROWS', 200),
+                app.config.get('ATTENDANCE_FLUSH_RETRIES', 5)
+            )
+            self._app = app
+            self._pid = os.getpid()
+            self._pending = []
+            self._in_flight = []
+            self._failures = 0
+            self._stopping = False
+            os.makedirs(app.instance_path, exist_ok=True)
+            self._journal_path = os.path.join(app.instance_path, f'{self.JOURNAL_PREFIX}.{self._pid}.jsonl')
+            self._journal = open(self._journal_path, 'a')
+            self._replay_orphans()
+            self._thread = threading.Thread(target=self._run, name='attendance-writer', daemon=True)
+            self._thread.start()
+        atexit.register(self.drain)
+
+    def _replay_orphans(self):
+        """Adopt the journals of workers that died before flushing (caller holds the lock)"""
+        pattern = os.path.join(self._app.instance_path, f'{self.JOURNAL_PREFIX}.*.jsonl')
+        for path in glob.glob(pattern):
+            try:
+                pid = int(os.path.basename(path).split('.')[1])
+            except (IndexError, ValueError):
+                continue
+            if pid == self._pid or _pid_alive(pid):
+                continue
+            with open(path) as f:
+                lines = [line for line in f if line.strip()]
+            rows = []
+            for line in lines:
+                try:
+                    rows.append(self._decode(line))
+                except ValueError:
+                    # A torn last line from a crash mid-write was never acknowledged
+                    continue
+            if rows:
+                self._append(rows)
+                self._pending.extend(rows)
+                self._app.logger.warning('Replaying %d queued attendance marks from %s', len(rows), path)
+            os.remove(path)
+
+    def _encode(self, row):
+        return json.dumps(dict(row, marked_at=row['marked_at'].isoformat())) + '\n'
+
+    def _decode(self, line):
+        row = json.loads(line)
+        row['marked_at'] = datetime.fromisoformat(row['marked_at'])
+        return row
+
+    def _append(self, rows):
+        self._journal.write(''.join(self._encode(row) for row in rows))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _rewrite_journal(self):
+        """Shrink the journal to the rows still pending (caller holds the lock)"""
+        self._journal.close()
+        tmp_path = f'{self._journal_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(''.join(self._encode(row) for row in self._pending))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._journal_path)
+        self._journal = open(self._journal_path, 'a')
+
+    def _load_marked(self, session_id):
+        stored = [row.student_id for row in db.session.query(Attendance.student_id).filter_by(session_id=session_id)]
+        # Rows acknowledged by this worker but not committed yet count as marked too
+        with self._cond:
+            queued = [row['student_id'] for row in self._in_flight + self._pending if row['session_id'] == session_id]
+        return stored + queued
+
+    def enqueue(self, student_id, session_id, status='present', marked_by='system', subject=None, confidence_score=None):
+        """Queue one attendance mark; returns the row as acknowledged, or None if already marked"""
+        self._ensure_started()
+        if not session_registry.claim(session_id, student_id, lambda: self._load_marked(session_id)):
+            return None
+        row = {
+            'student_id': student_id,
+            'session_id': session_id,
+            'status': status,
+            'marked_by': marked_by,
+            'subject': subject,
+            'confidence_score': confidence_score,
+            'marked_at': datetime.utcnow()
+        }
+        with self._cond:
+            try:
+                self._append([row])
+            except Exception:
+                # Not journaled, so not acknowledged: let the student scan again
+                session_registry.release(session_id, student_id)
+                raise
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        return row
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Back off while the database keeps refusing the pending batch
+                delay = min(self.flush_interval * 2 ** self._failures, max(self.flush_interval, 5.0))
+                deadline = time.monotonic() + delay
+                while not self._stopping and len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                stopping = self._stopping
+            try:
+                self.flush()
+            except Exception as e:
+                self._app.logger.warning('Attendance flush failed (attempt %d of %d), will retry: %s',
+                                         self._failures, self.max_retries, e)
+            if stopping:
+                return
+
+    def _insert(self, rows):
+        """Insert rows that are not stored yet in one transaction; returns how many were new"""
+        for _ in range(3):
+            existing = set(db.session.query(Attendance.student_id, Attendance.session_id).filter(
+                Attendance.session_id.in_({row['session_id'] for row in rows}),
+                Attendance.student_id.in_({row['student_id'] for row in rows})
+            ).all())
+            new_rows = []
+            for row in rows:
+                key = (row['student_id'], row['session_id'])
+                if key in existing:
+                    continue
+                existing.add(key)
+                new_rows.append(row)
+            if len(new_rows) < len(rows):
+                # A teacher or another worker stored these pairs first; their row stands
+                current_app.logger.warning('Skipped %d queued attendance marks already stored', len(rows) - len(new_rows))
+            if not new_rows:
+                return 0
+            try:
+                db.session.bulk_insert_mappings(Attendance, new_rows)
+                session_counters.record((row['session_id'], row['student_id'], None, row['status']) for row in new_rows)
+                db.session.commit()
+                attendance_events.publish(new_rows)
+                return len(new_rows)
+            except IntegrityError:
+                # Another writer inserted one of these pairs in between; filter again
+                db.session.rollback()
+        raise RuntimeError('attendance batch kept conflicting with concurrent writers')
+
+    def _insert_each(self, rows):
+        """Store rows one transaction each; returns (inserted, rows that failed with their errors)"""
+        inserted, failed = 0, []
+        for row in rows:
+            try:
+                inserted += self._insert([row])
+            except Exception as e:
+                db.session.rollback()
+                failed.append((row, e))
+        return inserted, failed
+
+    def _dead_letter(self, failed):
+        """Move rows that cannot be stored out of the queue, into a file an operator can replay"""
+        path = os.path.join(self._app.instance_path, self.DEAD_LETTER_FILE)
+        with open(path, 'a') as f:
+            f.write(''.join(json.dumps(dict(row, marked_at=row['marked_at'].isoformat(), error=str(e))) + '\n'
+                            for row, e in failed))
+            f.flush()
+            os.fsync(f.fileno())
+        for row, e in failed:
+            session_registry.release(row['session_id'], row['student_id'])
+            self._app.logger.error('Attendance mark for student %s in session %s moved to %s: %s',
+                                   row['student_id'], row['session_id'], path, e)
+
+    def flush(self):
+        """Write every pending row now; returns the number of rows inserted"""
+        with self._flush_lock:
+            with self._cond:
+                batch = self._in_flight = self._pending
+                self._pending = []
+            if not batch:
+                return 0
+            try:
+                with self._app.app_context():
+                    inserted = self._insert(batch)
+            except Exception:
+                self._failures += 1
+                if self._failures < self.max_retries:
+                    # Put the batch back in front; it is still in the journal
+                    with self._cond:
+                        self._pending = batch + self._pending
+                        self._in_flight = []
+                    raise
+                # Permanent failure somewhere in the batch: store what can be stored
+                with self._app.app_context():
+                    inserted, failed = self._insert_each(batch)
+                if failed:
+                    self._dead_letter(failed)
+            self._failures = 0
+            with self._cond:
+                self._in_flight = []
+                self._rewrite_journal()
+            return inserted
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def drain(self):
+        """Stop the flusher and write whatever is still queued"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        thread.join()
+        if self._pending:
+            try:
+                self.flush()
+            except Exception as e:
+                # The journal survives and is replayed by the next worker to start
+                self._app.logger.error('Could not drain attendance queue: %s', e)
+        with self._cond:
+            self._journal.close()
+            if not self._pending:
+                os.remove(self._journal_path)
+            self._thread = None
+
+
+# Shared write queue for this worker process
+attendance_writer = AttendanceWriteQueue()
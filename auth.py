@@ -2,9 +2,20 @@ from functools import wraps
 from flask import request, jsonify, session, current_app
 import jwt
 from datetime import datetime, timedelta
+import time
 from models import User
+from auth_cache import auth_cache, token_issued_at
+
+def token_required(f=None, allow_cookie=False):
+    """Pass the authenticated user to the view; the token comes from the Authorization header.
+
+    @token_required(allow_cookie=True) also accepts the login cookie's token on
+    GET requests, for event streams opened by EventSource, which cannot send
+    headers. Keep it off for anything that changes state.
+    """
+    if f is None:
+        return lambda f: token_required(f, allow_cookie=allow_cookie)
 
-def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
@@ -20,13 +31,21 @@ def token_required(f):
         # Check for token in session (fallback)
         if not token and 'token' in session:
             token = session['token']
+        if not token and allow_cookie and request.method == 'GET':
+            token = session.get('jwt_token')
             
         if not token:
             return jsonify({'message': 'Token is missing'}), 401
             
         try:
             data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = User.query.get(data['user_id'])
+            if 'role' in data and current_app.config.get('AUTH_STATELESS', True):
+                # Claims-bearing token: revocation list plus cached user, no per-request query
+                if not data.get('active') or auth_cache.is_revoked(data['user_id'], token_issued_at(data)):
+                    return jsonify({'message': 'Invalid token'}), 401
+                current_user = auth_cache.get_user(data['user_id'])
+            else:
+                current_user = User.query.get(data['user_id'])
             if not current_user or not current_user.is_active:
                 return jsonify({'message': 'Invalid token'}), 401
         except jwt.ExpiredSignatureError:
@@ -47,9 +66,59 @@ def role_required(roles):
         return decorated
     return decorator
 
-def generate_token(user_id):
+def generate_token(user_id, user=None):
+    """Sign a 24h login token; passing the User embeds role, is_active and profile ids as claims"""
+    now = datetime.utcnow()
     payload = {
         'user_id': user_id,
-        'exp': datetime.utcnow() + timedelta(hours=24)
+        'iat': now,
+        # iat is whole seconds; revocation checks need to order a re-login within the same second
+        'iat_ms': int(time.time() * 1000),
+        'exp': now + timedelta(hours=24)
     }
+    if user is not None:
+        payload['role'] = user.role
+        payload['active'] = bool(user.is_active)
+        if user.student:
+            payload['student_id'] = user.student.id
+        if user.teacher:
+            payload['teacher_id'] = user.teacher.id
     return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
+
+def start_login_session(user, token):
+    """Replace the cookie session with a permanent one for a fresh login"""
+    session.clear()  # Clear any existing session
+    session.permanent = True
+    session['jwt_token'] = token
+    session['user_id'] = user.id
+    session['role'] = user.role
+    session['name'] = user.name
+    session['refreshed_at'] = int(time.time())
+
+def refresh_login_session():
+    """Re-sign the session cookie (and its JWT) only once it is within SESSION_REFRESH_WINDOW of expiring.
+
+    With SESSION_REFRESH_EACH_REQUEST off, an untouched session sends no
+    Set-Cookie at all, so ordinary page navigation costs neither a cookie
+    rewrite nor a new token.
+    """
+    refreshed_at = session.get('refreshed_at')
+    if refreshed_at is None or 'user_id' not in session:
+        return
+    lifetime = current_app.permanent_session_lifetime.total_seconds()
+    window = current_app.config.get('SESSION_REFRESH_WINDOW', 6 * 3600)
+    if time.time() < refreshed_at + lifetime - window:
+        return
+    try:
+        data = jwt.decode(session.get('jwt_token', ''), current_app.config['SECRET_KEY'], algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        session.clear()
+        return
+    if auth_cache.is_revoked(data['user_id'], token_issued_at(data)):
+        session.clear()
+        return
+    user = auth_cache.get_user(data['user_id'])
+    if not user or not user.is_active:
+        session.clear()
+        return
+    start_login_session(user, generate_token(user.id, user))
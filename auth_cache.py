@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from flask import current_app
+from sqlalchemy.orm import Session, joinedload
+from models import db, User
+
+
+def token_issued_at(claims):
+    """When a token was signed, in epoch seconds: the millisecond iat_ms claim, else the whole-second iat"""
+    if 'iat_ms' in claims:
+        return claims['iat_ms'] / 1000.0
+    return claims.get('iat')
+
+
+class AuthCache:
+    """Per-worker TTL cache of authenticated users, plus a token revocation list.
+
+    token_required resolves a token that carries role/profile claims from here:
+    the cached User (with its student or teacher profile already loaded) is
+    merged into the request's session without emitting SQL, so handlers still
+    get a normal, lazy-loading, writable current_user.
+
+    Revocations and invalidations are appended to a small log in the instance
+    folder. Every worker stats it once per lookup and reads only the new lines,
+    so deactivating a user takes effect everywhere on the next request without
+    a database read. A revocation rejects tokens issued up to that moment; a
+    fresh login afterwards is accepted again.
+
+    /api/auth/verify answers repeat checks of the same token from a second,
+    shorter-lived map of verified tokens, cleared by the same log.
+    """
+
+    LOG_FILE = 'auth_revocations.log'
+
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._users = {}  # user_id -> (expires_at, detached User)
+        self._revoked = {}  # user_id -> revoked_at (epoch seconds)
+        self._verified = {}  # token -> (expires_at, user_id, verify response)
+        self._log_inode = None
+        self._log_offset = 0
+        self._lock = threading.Lock()
+
+    def _log_path(self):
+        return os.path.join(current_app.instance_path, self.LOG_FILE)
+
+    def _sync(self):
+        path = self._log_path()
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino == self._log_inode and stat.st_size == self._log_offset:
+            return
+        with self._lock:
+            if stat.st_ino != self._log_inode or stat.st_size < self._log_offset:
+                if self._log_inode is not None:
+                    # The log was replaced; start over from its first line
+                    self._revoked = {}
+                    self._users = {}
+                    self._verified = {}
+                self._log_inode = stat.st_ino
+                self._log_offset = 0
+            with open(path, 'rb') as f:
+                f.seek(self._log_offset)
+                chunk = f.read()
+            # Leave a partially written last line for the next sync
+            complete = chunk[:chunk.rfind(b'\n') + 1]
+            self._log_offset += len(complete)
+            for line in complete.decode().splitlines():
+                parts = line.split()
+                if len(parts) < 2:
+                    continue
+                user_id = int(parts[1])
+                self._users.pop(user_id, None)
+                self._verified = {k: v for k, v in self._verified.items() if v[1] != user_id}
+                if parts[0] == 'revoke' and len(parts) == 3:
+                    self._revoked[user_id] = max(float(parts[2]), self._revoked.get(user_id, 0))
+
+    def _append(self, line):
+        path = self._log_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A single short O_APPEND write is atomic, so workers never interleave lines
+        with open(path, 'a') as f:
+            f.write(line + '\n')
+        self._sync()
+
+    def revoke(self, user_id):
+        """Reject every token issued to user_id so far (deactivation, role change)"""
+        self._append(f'revoke {int(user_id)} {time.time():.3f}')
+
+    def invalidate(self, user_id):
+        """Drop user_id's cached row and profile in every worker after an update"""
+        self._append(f'invalidate {int(user_id)}')
+
+    def is_revoked(self, user_id, issued_at):
+        """issued_at from token_issued_at(); revocations are logged to the millisecond, so a
+        login right after one (even within the same second) is not caught by it"""
+        self._sync()
+        revoked_at = self._revoked.get(user_id)
+        return revoked_at is not None and (issued_at is None or issued_at <= revoked_at)
+
+    def verified(self, token):
+        """Cached /verify response for token, or None if it has to be checked again"""
+        self._sync()
+        entry = self._verified.get(token)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[2]
+
+    def remember_verified(self, token, user_id, result, token_exp):
+        ttl = current_app.config.get('AUTH_VERIFY_CACHE_TTL', 30)
+        now = time.time()
+        with self._lock:
+            if len(self._verified) >= self.max_entries:
+                self._verified = {k: v for k, v in self._verified.items() if v[0] >= now}
+            # Never outlive the token itself
+            self._verified[token] = (min(now + ttl, token_exp), user_id, result)
+
+    def _load(self, user_id):
+        # A short-lived session of our own, so the cached copy comes back detached
+        with Session(db.engine) as load_session:
+            return load_session.query(User).options(
+                joinedload(User.student), joinedload(User.teacher)
+            ).filter(User.id == user_id).first()
+
+    def get_user(self, user_id):
+        """Return user_id's User attached to the request session, or None"""
+        self._sync()
+        now = time.monotonic()
+        entry = self._users.get(user_id)
+        if entry is None or entry[0] < now:
+            user = self._load(user_id)
+            if user is None:
+                return None
+            with self._lock:
+                if len(self._users) >= self.max_entries:
+                    self._users = {k: v for k, v in self._users.items() if v[0] >= now}
+                self._users[user_id] = (now + current_app.config.get('AUTH_USER_CACHE_TTL', self.ttl), user)
+            entry = (None, user)
+        # load=False copies the cached state (profile included) into this session without a query
+        return db.session.merge(entry[1], load=False)
+
+
+# Shared cache for this worker process
+auth_cache = AuthCache()
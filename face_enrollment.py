@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from models import db, Student, FaceEnrollmentJob
+from face_index import face_index, save_embeddings
+from auth_cache import auth_cache
+from face_worker import face_pool, detect_and_encode, detection_options, FacePoolBusy, FaceTaskTimeout
+
+
+class EnrollmentQueue:
+    """Processes face enrollment jobs on background threads of this worker process.
+
+    Job state lives in the face_enrollment_job table, so any worker can answer a
+    status request. The dlib work itself still goes through the shared face pool.
+    """
+
+    INTERRUPTED = 'Interrupted by a server restart'
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self.workers = 2
+        self.max_attempts = 5
+
+    def configure(self, workers=2):
+        self.workers = max(1, int(workers))
+
+    def submit(self, app, job_id):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self.configure(workers=app.config.get('FACE_ENROLLMENT_WORKERS', 2))
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='face-enroll')
+        self._executor.submit(self._run, app, job_id)
+
+    def recover(self, app):
+        """Requeue jobs left queued or running by a worker process that has exited.
+
+        Only the process that accepted a job runs it, so a row still unfinished
+        after FACE_ENROLLMENT_STALE_SECONDS has lost its thread. Each job gets one
+        more run; one interrupted a second time is marked failed. Returns the
+        requeued job ids.
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=app.config.get('FACE_ENROLLMENT_STALE_SECONDS', 600))
+        stale = FaceEnrollmentJob.query.filter(
+            FaceEnrollmentJob.status.in_(('queued', 'running')),
+            FaceEnrollmentJob.created_at < cutoff
+        ).all()
+        requeued = []
+        for job in stale:
+            errors = json.loads(job.errors or '[]')
+            retry = not any(error.get('error') == self.INTERRUPTED for error in errors)
+            errors.append({'image': None, 'error': self.INTERRUPTED})
+            if retry:
+                # created_at restarts the staleness clock for the new run
+                values = {'status': 'queued', 'processed_images': 0, 'created_at': now}
+            else:
+                values = {'status': 'failed', 'finished_at': now}
+            # Every worker recovers at startup; only the one whose update lands owns the job
+            claimed = db.session.execute(
+                update(FaceEnrollmentJob)
+                .where(FaceEnrollmentJob.id == job.id, FaceEnrollmentJob.status == job.status,
+                       FaceEnrollmentJob.created_at == job.created_at)
+                .values(errors=json.dumps(errors), **values)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if claimed and retry:
+                requeued.append(job.id)
+        for job_id in requeued:
+            self.submit(app, job_id)
+        return requeued
+
+    def _run(self, app, job_id):
+        with app.app_context():
+            try:
+                self.process(job_id, app.root_path, detection_options(app.config))
+            except Exception as e:
+                db.session.rollback()
+                job = FaceEnrollmentJob.query.get(job_id)
+                if job:
+                    errors = json.loads(job.errors or '[]')
+                    errors.append({'image': None, 'error': str(e)})
+                    job.errors = json.dumps(errors)
+                    job.status = 'failed'
+                    job.finished_at = datetime.utcnow()
+                    db.session.commit()
+            finally:
+                db.session.remove()
+
+    def _encode(self, path, options):
+        # Background jobs can wait for the pool instead of bouncing with a 503
+        for attempt in range(self.max_attempts):
+            try:
+                return face_pool.run(detect_and_encode, [path], False, options)['faces'][0]
+            except FacePoolBusy as e:
+                time.sleep(e.retry_after)
+        raise FacePoolBusy(face_pool.retry_after)
+
+    def process(self, job_id, root_path, options):
+        job = FaceEnrollmentJob.query.get(job_id)
+        job.status = 'running'
+        db.session.commit()
+
+        image_paths = json.loads(job.image_paths)
+        encodings = []
+        # Keep the note left by recover() when this is a rerun
+        errors = json.loads(job.errors or '[]')
+        for idx, rel_path in enumerate(image_paths, start=1):
+            try:
+                faces = self._encode(os.path.join(root_path, rel_path), options)
+                if faces:
+                    encodings.append((idx, faces[0][1]))
+                else:
+                    errors.append({'image': idx, 'error': f'No face found in image {idx}'})
+            except FaceTaskTimeout:
+                errors.append({'image': idx, 'error': f'Timed out processing image {idx}'})
+            except FacePoolBusy:
+                errors.append({'image': idx, 'error': f'Face recognition busy for image {idx}'})
+            job.processed_images = idx
+            job.errors = json.dumps(errors) if errors else None
+            db.session.commit()
+
+        if not encodings:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return
+
+        # Keep every per-image encoding; matching takes the nearest of them
+        save_embeddings(job.student_id, encodings)
+        student = Student.query.get(job.student_id)
+        student.face_images = job.image_paths
+        job.status = 'completed'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        face_index.replace(student.id, encodings, student.standard, student.division)
+        # The student's cached profile still lists the old images
+        auth_cache.invalidate(student.user_id)
+
+
+# Shared enrollment queue for this worker process, configured from app.config on first use
+enrollment_queue = EnrollmentQueue()
@@ -0,0 +1,208 @@
+import threading
+import time
+import numpy as np
+from sqlalchemy import func
+from models import db, Student, FaceEmbedding
+from roster_cache import roster_cache
+
+EMBEDDING_MODEL = 'dlib_resnet_v1'
+EMBEDDING_VERSION = 1
+EMBEDDING_DIM = 128
+
+
+def to_blob(encoding):
+    """Serialize one encoding to the fixed 128 x float32 (little-endian) blob format"""
+    return np.asarray(encoding, dtype='<f4').reshape(EMBEDDING_DIM).tobytes()
+
+
+def from_blobs(blobs, dim=EMBEDDING_DIM):
+    """Decode a sequence of embedding blobs into one contiguous (N, dim) float32 matrix"""
+    if not blobs:
+        return np.empty((0, dim), dtype=np.float32)
+    return np.frombuffer(b''.join(blobs), dtype='<f4').reshape(-1, dim)
+
+
+def save_embeddings(student_id, encodings):
+    """Replace a student's embedding rows with one row per enrollment image (the caller commits).
+
+    encodings is a list of (image_index, encoding) pairs.
+    """
+    FaceEmbedding.query.filter_by(student_id=student_id).delete()
+    for image_index, encoding in encodings:
+        db.session.add(FaceEmbedding(
+            student_id=student_id,
+            image_index=image_index,
+            embedding=to_blob(encoding),
+            model=EMBEDDING_MODEL,
+            version=EMBEDDING_VERSION
+        ))
+
+
+class FaceIndex:
+    """Process-wide matrix of enrolled face encodings for vectorized matching.
+
+    Each student contributes one row per enrollment image (K rows), so matching
+    is nearest-of-K: the closest row overall is also its owner's minimum
+    distance, and tells which enrollment image matched.
+
+    Rows can also be narrowed to one class (standard, division) through a cached
+    sub-index, so a kiosk bound to a session only compares against that roster.
+    Moving a student does not touch their embeddings, so the class of each row
+    is re-read whenever the roster cache epoch changes.
+
+    Every worker keeps its own copy, loaded from the face_embedding table in one
+    query. At most every check_interval seconds a lookup compares the table's row
+    count and latest update with what was loaded, and rebuilds when they differ.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM, check_interval=2.0):
+        self.dim = dim
+        self.check_interval = check_interval
+        self.version = None
+        self._loaded = False
+        self._checked_at = 0.0
+        # (matrix, student_ids, image_indexes, class_keys) swapped as one tuple so lookups
+        # never see a half-applied update
+        self._data = (np.empty((0, dim), dtype=np.float32), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), [])
+        self._class_cache = {}
+        self._roster_epoch = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Number of embedding rows (not students)"""
+        return len(self._data[1])
+
+    def _read_version(self):
+        count, updated_at = db.session.query(
+            func.count(FaceEmbedding.id), func.max(FaceEmbedding.updated_at)
+        ).filter(FaceEmbedding.model == EMBEDDING_MODEL).one()
+        return f"{count}:{updated_at.isoformat() if updated_at else ''}"
+
+    def _read_roster_epoch(self):
+        return roster_cache.version()
+
+    def _rebuild(self, version):
+        rows = db.session.query(
+            FaceEmbedding.student_id, FaceEmbedding.image_index, Student.standard, Student.division,
+            FaceEmbedding.embedding
+        ).join(Student, Student.id == FaceEmbedding.student_id).filter(
+            FaceEmbedding.model == EMBEDDING_MODEL
+        ).all()
+        matrix = from_blobs([row.embedding for row in rows], self.dim)
+        student_ids = np.fromiter((row.student_id for row in rows), dtype=np.int64, count=len(rows))
+        # 0 marks a legacy averaged encoding with no source image
+        image_indexes = np.fromiter((row.image_index or 0 for row in rows), dtype=np.int64, count=len(rows))
+        self._set_data(matrix, student_ids, image_indexes, [(row.standard, row.division) for row in rows])
+        self.version = version
+        self._loaded = True
+
+    def _reload_classes(self):
+        """Re-read every indexed student's class without reloading the embeddings"""
+        matrix, student_ids, image_indexes, class_keys = self._data
+        classes = {
+            row.id: (row.standard, row.division)
+            for row in db.session.query(Student.id, Student.standard, Student.division).filter(
+                Student.id.in_(db.session.query(FaceEmbedding.student_id).filter(FaceEmbedding.model == EMBEDDING_MODEL))
+            )
+        }
+        class_keys = [classes.get(int(student_id), key) for student_id, key in zip(student_ids, class_keys)]
+        self._set_data(matrix, student_ids, image_indexes, class_keys)
+
+    def _set_data(self, matrix, student_ids, image_indexes, class_keys):
+        self._data = (matrix, student_ids, image_indexes, class_keys)
+        self._class_cache = {}
+
+    def _class_rows(self, standard, division):
+        """Return the (matrix, student_ids, image_indexes) sub-index for one class, building it on first use"""
+        key = (str(standard), str(division))
+        cache = self._class_cache
+        rows = cache.get(key)
+        if rows is None:
+            matrix, student_ids, image_indexes, class_keys = self._data
+            mask = np.fromiter(((str(s), str(d)) == key for s, d in class_keys), dtype=bool, count=len(class_keys))
+            rows = (np.ascontiguousarray(matrix[mask]), student_ids[mask], image_indexes[mask])
+            cache[key] = rows
+        return rows
+
+    def refresh(self, force=False):
+        """Rebuild the matrix if the embedding table changed since we last loaded it"""
+        now = time.monotonic()
+        if self._loaded and not force and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        version = self._read_version()
+        roster_epoch = self._read_roster_epoch()
+        if self._loaded and version == self.version and roster_epoch == self._roster_epoch:
+            return
+        with self._lock:
+            if not self._loaded or version != self.version:
+                self._rebuild(version)
+            elif roster_epoch != self._roster_epoch:
+                self._reload_classes()
+            self._roster_epoch = roster_epoch
+
+    def _rows(self, standard, division):
+        if standard is not None and division is not None:
+            return self._class_rows(standard, division)
+        return self._data[:3]
+
+    def replace(self, student_id, encodings, standard=None, division=None):
+        """Swap in a student's (image_index, encoding) rows after they have been committed"""
+        self.refresh()
+        with self._lock:
+            matrix, student_ids, image_indexes, class_keys = self._data
+            keep = student_ids != student_id
+            new_vectors = np.asarray([encoding for _, encoding in encodings], dtype=np.float32).reshape(-1, self.dim)
+            matrix = np.ascontiguousarray(np.vstack([matrix[keep], new_vectors]))
+            student_ids = np.concatenate([student_ids[keep], np.full(len(encodings), student_id, dtype=np.int64)])
+            image_indexes = np.concatenate([
+                image_indexes[keep], np.asarray([idx or 0 for idx, _ in encodings], dtype=np.int64)
+            ])
+            class_keys = [k for k, kept in zip(class_keys, keep) if kept] + [(standard, division)] * len(encodings)
+            self._set_data(matrix, student_ids, image_indexes, class_keys)
+            version = self._read_version()
+            # Adopt the table's version only if it holds exactly our rows; otherwise
+            # another worker wrote too and the next check rebuilds
+            self.version = version if version.split(':')[0] == str(len(student_ids)) else None
+
+    def match(self, encoding, tolerance=0.5, standard=None, division=None):
+        """Return (student_id, distance, image_index) of the closest enrollment within tolerance, else None.
+
+        Passing standard and division restricts candidates to that class's roster.
+        """
+        self.refresh()
+        matrix, student_ids, image_indexes = self._rows(standard, division)
+        if not len(student_ids):
+            return None
+        distances = np.linalg.norm(matrix - np.asarray(encoding, dtype=np.float32), axis=1)
+        best = int(np.argmin(distances))
+        if distances[best] > tolerance:
+            return None
+        return int(student_ids[best]), float(distances[best]), int(image_indexes[best])
+
+    def match_many(self, encodings, tolerance=0.5, standard=None, division=None):
+        """Match several encodings at once; returns one (student_id, distance, image_index) or None each"""
+        self.refresh()
+        matrix, student_ids, image_indexes = self._rows(standard, division)
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if not len(student_ids) or not len(queries):
+            return [None] * len(queries)
+        # |q - m|^2 = |q|^2 + |m|^2 - 2 q.m, computed for every pair in one matrix product
+        squared = (
+            np.einsum('ij,ij->i', queries, queries)[:, None]
+            + np.einsum('ij,ij->i', matrix, matrix)[None, :]
+            - 2.0 * queries @ matrix.T
+        )
+        distances = np.sqrt(np.clip(squared, 0.0, None))
+        best = np.argmin(distances, axis=1)
+        results = []
+        for row, col in enumerate(best):
+            distance = float(distances[row, col])
+            if distance <= tolerance:
+                results.append((int(student_ids[col]), distance, int(image_indexes[col])))
+            else:
+                results.append(None)
+        return results
+
+# Shared index for this worker process
+face_index = FaceIndex()
@@ -0,0 +1,173 @@
+import atexit
+import io
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+import numpy as np
+from flask import current_app
+
+
+class FacePoolBusy(Exception):
+    """Raised when the face pool already has its maximum number of queued tasks"""
+
+    def __init__(self, retry_after):
+        super().__init__('Face processing queue is full')
+        self.retry_after = retry_after
+
+
+class FaceTaskTimeout(Exception):
+    """Raised when a detection/encoding task does not finish within the timeout"""
+
+
+def _warm_worker():
+    # Importing face_recognition loads the dlib detector and landmark/encoding models,
+    # so every pool process pays that cost once when it starts instead of per request.
+    import face_recognition
+    face_recognition.face_locations(np.zeros((32, 32, 3), dtype=np.uint8))
+
+
+def _ping():
+    return True
+
+
+def _load_image(image):
+    from PIL import Image
+    if isinstance(image, (bytes, bytearray)):
+        image = io.BytesIO(image)
+    return Image.open(image).convert('RGB')
+
+
+def _scale_box(box, scale, height, width):
+    top, right, bottom, left = box
+    return (
+        max(0, int(round(top * scale))),
+        min(width, int(round(right * scale))),
+        min(height, int(round(bottom * scale))),
+        max(0, int(round(left * scale)))
+    )
+
+
+def detection_options(config):
+    """Build the detect_and_encode options from an app config mapping"""
+    return {
+        'detection_width': config.get('FACE_DETECTION_WIDTH', 640),
+        'model': config.get('FACE_DETECTION_MODEL', 'hog'),
+        'upsample': config.get('FACE_UPSAMPLE', 1),
+        'num_jitters': config.get('FACE_NUM_JITTERS', 1)
+    }
+
+
+def detect_and_encode(images, all_faces=False, options=None):
+    """Detect and encode faces in images (raw bytes or file paths).
+
+    Runs inside a pool process. Returns {'faces': [[(box, encoding)] per image],
+    'timings': {stage: ms}}. Faces are located on a copy downscaled to
+    options['detection_width'] and the boxes are mapped back to the full image
+    for encoding. Only the first face of each image is encoded unless all_faces
+    is set.
+    """
+    import face_recognition
+    from PIL import Image
+    options = options or {}
+    detection_width = int(options.get('detection_width') or 0)
+    model = options.get('model', 'hog')
+    upsample = int(options.get('upsample', 1))
+    num_jitters = int(options.get('num_jitters', 1))
+    timings = {'decode_ms': 0.0, 'locate_ms': 0.0, 'encode_ms': 0.0}
+    results = []
+    for image in images:
+        started = time.perf_counter()
+        img = _load_image(image)
+        img_np = np.asarray(img)
+        scale = 1.0
+        small_np = img_np
+        if detection_width and img.width > detection_width:
+            scale = img.width / detection_width
+            small = img.resize((detection_width, int(round(img.height / scale))), Image.BILINEAR)
+            small_np = np.asarray(small)
+        decoded = time.perf_counter()
+        locations = face_recognition.face_locations(small_np, number_of_times_to_upsample=upsample, model=model)
+        if not all_faces:
+            locations = locations[:1]
+        if scale != 1.0:
+            locations = [_scale_box(box, scale, img.height, img.width) for box in locations]
+        located = time.perf_counter()
+        encodings = face_recognition.face_encodings(img_np, locations, num_jitters=num_jitters)
+        encoded = time.perf_counter()
+        timings['decode_ms'] += (decoded - started) * 1000
+        timings['locate_ms'] += (located - decoded) * 1000
+        timings['encode_ms'] += (encoded - located) * 1000
+        results.append([(tuple(location), encoding) for location, encoding in zip(locations, encodings)])
+    return {'faces': results, 'timings': {stage: round(ms, 1) for stage, ms in timings.items()}}
+
+
+class FaceWorkerPool:
+    """Bounded process pool that keeps dlib work off the Flask request threads"""
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self.workers = 2
+        self.queue_limit = 8
+        self.timeout = 20
+        self.retry_after = 2
+
+    def configure(self, workers=2, queue_limit=8, timeout=20, retry_after=2):
+        self.workers = max(1, int(workers))
+        self.queue_limit = max(self.workers, int(queue_limit))
+        self.timeout = float(timeout)
+        self.retry_after = int(retry_after)
+
+    def _start(self):
+        with self._lock:
+            if self._executor is not None:
+                return
+            config = current_app.config
+            self.configure(
+                workers=config.get('FACE_POOL_WORKERS', 2),
+                queue_limit=config.get('FACE_POOL_QUEUE_LIMIT', 8),
+                timeout=config.get('FACE_TASK_TIMEOUT', 20),
+                retry_after=config.get('FACE_POOL_RETRY_AFTER', 2)
+            )
+            self._slots = threading.BoundedSemaphore(self.queue_limit)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_warm_worker
+            )
+            # Spawn every worker now so none of them warms up while a request waits
+            for _ in range(self.workers):
+                self._executor.submit(_ping)
+            atexit.register(self.shutdown)
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn in the pool and wait for it, raising FacePoolBusy or FaceTaskTimeout"""
+        if self._executor is None:
+            self._start()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise FacePoolBusy(self.retry_after)
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            slots.release()
+            raise
+        # The slot frees when the task really finishes, so timed-out work still counts as load
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise FaceTaskTimeout()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Shared pool for this worker process, configured from app.config on first use
+face_pool = FaceWorkerPool()
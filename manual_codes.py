@@ -0,0 +1,50 @@
+import secrets
+from datetime import datetime
+import pytz
+from sqlalchemy.exc import IntegrityError
+from models import db, AttendanceSession
+from session_registry import session_registry
+
+# No 0/O or 1/I/L, so codes read back from a projector are unambiguous
+ALPHABET = '23456789ABCDEFGHJKMNPQRSTUVWXYZ'
+CODE_LENGTH = 6
+
+
+def normalize(code):
+    return (code or '').strip().upper()
+
+
+def _is_closed(session, today):
+    return not session.is_active or session.date != today
+
+
+def assign_manual_code(session, attempts=10):
+    """Give session a short code that no other open session holds (the caller commits).
+
+    A code still attached to a closed or past session is recycled: that row
+    releases it in the same savepoint. Each candidate is written inside its own
+    savepoint, so losing a race with another worker to the unique index only
+    retries the code and keeps the caller's other pending changes.
+    """
+    today = datetime.now(pytz.timezone('Asia/Kolkata')).date()
+    for _ in range(attempts):
+        code = ''.join(secrets.choice(ALPHABET) for _ in range(CODE_LENGTH))
+        if session_registry.by_code(code):
+            continue
+        holder = AttendanceSession.query.filter(
+            AttendanceSession.manual_code == code,
+            AttendanceSession.id != session.id
+        ).first()
+        if holder and not _is_closed(holder, today):
+            continue
+        try:
+            with db.session.begin_nested():
+                if holder:
+                    holder.manual_code = None
+                    db.session.flush()
+                session.manual_code = code
+        except IntegrityError:
+            continue
+        return code
+    raise RuntimeError('Could not allocate a free manual code')
+
@@ -25,6 +25,13 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from models import db
 target_metadata = db.metadata
 
+# Under `flask db`, migrate the app's own database (DATABASE_URL)
+try:
+    config.set_main_option('sqlalchemy.url', str(db.engine.url).replace('%', '%%'))
+except RuntimeError:
+    # Plain `alembic` outside an app context: sqlalchemy.url comes from alembic.ini
+    pass
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -0,0 +1,144 @@
+"""initial schema
+
+Revision ID: 0a1b2c3d4e5f
+Revises:
+Create Date: 2025-09-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a1b2c3d4e5f'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created with db.create_all() before migrations existed already have these tables
+    if sa.inspect(op.get_bind()).has_table('user'):
+        return
+
+    op.create_table(
+        'user',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('email', sa.String(120), unique=True, nullable=True),
+        sa.Column('role', sa.String(20), nullable=False),
+        sa.Column('password_hash', sa.String(255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+    )
+    op.create_table(
+        'subject',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('code', sa.String(20), unique=True, nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+    )
+    op.create_table(
+        'class',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('standard', sa.String(10), nullable=False),
+        sa.Column('division', sa.String(10), nullable=False),
+        sa.Column('academic_year', sa.String(10), nullable=False),
+        sa.UniqueConstraint('standard', 'division', 'academic_year'),
+    )
+    op.create_table(
+        'student',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('roll_no', sa.String(20), nullable=False),
+        sa.Column('division', sa.String(10), nullable=False),
+        sa.Column('standard', sa.String(10), nullable=False),
+        sa.Column('phone', sa.String(15), nullable=True),
+        sa.Column('parent_phone', sa.String(15), nullable=True),
+        sa.Column('interests', sa.Text(), nullable=True),
+        sa.Column('career_goals', sa.Text(), nullable=True),
+        sa.Column('face_encoding', sa.Text(), nullable=True),
+        sa.Column('face_images', sa.Text(), nullable=True),
+        sa.UniqueConstraint('roll_no', 'division', 'standard'),
+    )
+    op.create_table(
+        'teacher',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('employee_id', sa.String(20), unique=True, nullable=False),
+        sa.Column('department', sa.String(50), nullable=True),
+        sa.Column('subjects', sa.Text(), nullable=True),
+    )
+    op.create_table(
+        'timetable',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('class_id', sa.Integer(), sa.ForeignKey('class.id'), nullable=False),
+        sa.Column('subject_id', sa.Integer(), sa.ForeignKey('subject.id'), nullable=False),
+        sa.Column('teacher_id', sa.Integer(), sa.ForeignKey('teacher.id'), nullable=False),
+        sa.Column('day_of_week', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.Time(), nullable=False),
+        sa.Column('end_time', sa.Time(), nullable=False),
+        sa.Column('room_number', sa.String(20), nullable=True),
+    )
+    op.create_table(
+        'attendance_session',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('timetable_id', sa.Integer(), sa.ForeignKey('timetable.id'), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=True),
+        sa.Column('qr_code', sa.Text(), nullable=True),
+        sa.Column('qr_token', sa.String(100), unique=True, nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('attendance_method', sa.String(20), nullable=True),
+    )
+    op.create_table(
+        'attendance',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('student_id', sa.Integer(), sa.ForeignKey('student.id'), nullable=False),
+        sa.Column('session_id', sa.Integer(), sa.ForeignKey('attendance_session.id'), nullable=False),
+        sa.Column('status', sa.String(20), nullable=True),
+        sa.Column('marked_at', sa.DateTime(), nullable=True),
+        sa.Column('marked_by', sa.String(20), nullable=True),
+        sa.Column('confidence_score', sa.Float(), nullable=True),
+        sa.UniqueConstraint('student_id', 'session_id'),
+    )
+    op.create_table(
+        'task',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('student_id', sa.Integer(), sa.ForeignKey('student.id'), nullable=False),
+        sa.Column('title', sa.String(200), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('task_type', sa.String(50), nullable=False),
+        sa.Column('priority', sa.String(20), nullable=True),
+        sa.Column('estimated_duration', sa.Integer(), nullable=True),
+        sa.Column('due_date', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(20), nullable=True),
+        sa.Column('ai_generated', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        'notification',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('title', sa.String(200), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('type', sa.String(50), nullable=False),
+        sa.Column('is_read', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        'permission',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('permission_name', sa.String(100), nullable=False),
+        sa.Column('granted_at', sa.DateTime(), nullable=True),
+        sa.Column('granted_by', sa.Integer(), sa.ForeignKey('user.id'), nullable=True),
+    )
+
+
+def downgrade():
+    for table in ('permission', 'notification', 'task', 'attendance', 'attendance_session',
+                  'timetable', 'teacher', 'student', 'class', 'subject', 'user'):
+        op.drop_table(table)
@@ -1,7 +1,7 @@
 """add subject column to attendance
 
 Revision ID: 20250918_add_subject_to_attendance
-Revises: 
+Revises: 0a1b2c3d4e5f
 Create Date: 2025-09-18 00:00:00.000000
 """
 from alembic import op
@@ -9,14 +9,15 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 revision = '20250918_add_subject_to_attendance'
-down_revision = None
+down_revision = '0a1b2c3d4e5f'
 branch_labels = None
 depends_on = None
 
 
 def upgrade():
-    # Add a nullable subject column to attendance
-    op.add_column('attendance', sa.Column('subject', sa.String(length=100), nullable=True))
+    # Add a nullable subject column to attendance (the shipped dev database, built with db.create_all(), has it)
+    if 'subject' not in [column['name'] for column in sa.inspect(op.get_bind()).get_columns('attendance')]:
+        op.add_column('attendance', sa.Column('subject', sa.String(length=100), nullable=True))
 
 
 def downgrade():
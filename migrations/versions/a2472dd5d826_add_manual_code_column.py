@@ -17,7 +17,12 @@ depends_on = None
 
 
 def upgrade():
-    op.add_column('attendance_session', sa.Column('manual_code', sa.String(6), unique=True, nullable=True))
+    # The shipped dev database, built with db.create_all(), already has the column
+    if 'manual_code' in [column['name'] for column in sa.inspect(op.get_bind()).get_columns('attendance_session')]:
+        return
+    # SQLite cannot ALTER in a UNIQUE constraint; f2a5b6c7d8e9 adds the unique index there
+    unique = op.get_bind().dialect.name != 'sqlite'
+    op.add_column('attendance_session', sa.Column('manual_code', sa.String(6), unique=unique, nullable=True))
 
 
 def downgrade():
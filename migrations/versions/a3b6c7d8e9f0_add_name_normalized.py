@@ -0,0 +1,38 @@
+"""add indexed user.name_normalized for student login and search
+
+Revision ID: a3b6c7d8e9f0
+Revises: f2a5b6c7d8e9
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import unicodedata
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3b6c7d8e9f0'
+down_revision = 'f2a5b6c7d8e9'
+branch_labels = None
+depends_on = None
+
+
+def _normalize_name(name):
+    # Same as models.normalize_name, copied so the migration does not depend on the models module
+    return ' '.join(unicodedata.normalize('NFKC', name or '').casefold().split())
+
+
+def upgrade():
+    op.add_column('user', sa.Column('name_normalized', sa.String(100), nullable=True))
+    op.create_index('ix_user_name_normalized', 'user', ['name_normalized'])
+
+    bind = op.get_bind()
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('name', sa.String), sa.column('name_normalized', sa.String))
+    rows = bind.execute(sa.select(user.c.id, user.c.name)).fetchall()
+    for user_id, name in rows:
+        bind.execute(user.update().where(user.c.id == user_id).values(name_normalized=_normalize_name(name)))
+
+
+def downgrade():
+    op.drop_index('ix_user_name_normalized', table_name='user')
+    op.drop_column('user', 'name_normalized')
@@ -0,0 +1,23 @@
+"""index attendance (session_id, marked_at) for delta polls
+
+Revision ID: b4c7d8e9f0a1
+Revises: a3b6c7d8e9f0
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4c7d8e9f0a1'
+down_revision = 'a3b6c7d8e9f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_attendance_session_marked', 'attendance', ['session_id', 'marked_at'])
+
+
+def downgrade():
+    op.drop_index('ix_attendance_session_marked', table_name='attendance')
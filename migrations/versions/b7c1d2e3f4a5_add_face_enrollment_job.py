@@ -0,0 +1,35 @@
+"""add face_enrollment_job table
+
+Revision ID: b7c1d2e3f4a5
+Revises: a2472dd5d826
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7c1d2e3f4a5'
+down_revision = 'a2472dd5d826'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'face_enrollment_job',
+        sa.Column('id', sa.String(32), primary_key=True),
+        sa.Column('student_id', sa.Integer(), sa.ForeignKey('student.id'), nullable=False),
+        sa.Column('status', sa.String(20), nullable=True),
+        sa.Column('image_paths', sa.Text(), nullable=False),
+        sa.Column('total_images', sa.Integer(), nullable=True),
+        sa.Column('processed_images', sa.Integer(), nullable=True),
+        sa.Column('errors', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table('face_enrollment_job')
@@ -0,0 +1,43 @@
+"""add materialized attendance counters to attendance_session
+
+Revision ID: c5d8e9f0a1b2
+Revises: b4c7d8e9f0a1
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d8e9f0a1b2'
+down_revision = 'b4c7d8e9f0a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for column in ('roster_count', 'present_count', 'late_count'):
+        op.add_column('attendance_session', sa.Column(column, sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from the attendance table, counting only active students of the session's class as
+    # session_counters._recount does; afterwards scripts/reconcile_session_counters.py can rebuild them
+    on_roster = """
+        JOIN "user" ON "user".id = student.user_id
+        JOIN timetable ON timetable.id = attendance_session.timetable_id
+        JOIN class ON class.id = timetable.class_id
+        WHERE student.standard = class.standard AND student.division = class.division AND "user".is_active
+    """
+    marks = """(SELECT COUNT(*) FROM attendance JOIN student ON student.id = attendance.student_id {on_roster}
+                  AND attendance.session_id = attendance_session.id AND attendance.status = '{status}')"""
+    op.execute(f"""
+        UPDATE attendance_session SET
+            present_count = {marks.format(on_roster=on_roster, status='present')},
+            late_count = {marks.format(on_roster=on_roster, status='late')},
+            roster_count = (SELECT COUNT(*) FROM student {on_roster})
+    """)
+
+
+def downgrade():
+    for column in ('late_count', 'present_count', 'roster_count'):
+        op.drop_column('attendance_session', column)
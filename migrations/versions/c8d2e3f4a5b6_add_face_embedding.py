@@ -0,0 +1,56 @@
+"""add face_embedding table and import existing .npy encodings
+
+Revision ID: c8d2e3f4a5b6
+Revises: b7c1d2e3f4a5
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+import numpy as np
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8d2e3f4a5b6'
+down_revision = 'b7c1d2e3f4a5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    face_embedding = op.create_table(
+        'face_embedding',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('student_id', sa.Integer(), sa.ForeignKey('student.id'), nullable=False, unique=True),
+        sa.Column('embedding', sa.LargeBinary(), nullable=False),
+        sa.Column('model', sa.String(50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+
+    # Import the per-student .npy files referenced by student.face_encoding
+    conn = op.get_bind()
+    rows = conn.execute(sa.text('SELECT id, face_encoding FROM student WHERE face_encoding IS NOT NULL')).fetchall()
+    now = datetime.utcnow()
+    imported = []
+    for student_id, path in rows:
+        try:
+            encoding = np.load(path)
+        except (OSError, ValueError) as e:
+            print(f"Skipping student {student_id}: could not load {path}: {e}")
+            continue
+        imported.append({
+            'student_id': student_id,
+            'embedding': np.asarray(encoding, dtype='<f4').reshape(128).tobytes(),
+            'model': 'dlib_resnet_v1',
+            'version': 1,
+            'updated_at': now,
+        })
+    if imported:
+        op.bulk_insert(face_embedding, imported)
+    print(f"Imported {len(imported)} of {len(rows)} face encodings")
+
+
+def downgrade():
+    op.drop_table('face_embedding')
@@ -0,0 +1,52 @@
+"""keep one face_embedding row per enrollment image
+
+Revision ID: d9e3f4a5b6c7
+Revises: c8d2e3f4a5b6
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9e3f4a5b6c7'
+down_revision = 'c8d2e3f4a5b6'
+branch_labels = None
+depends_on = None
+
+
+def _face_embedding_table():
+    # Table definition without the unnamed UNIQUE(student_id), used to rebuild the table on SQLite
+    return sa.Table(
+        'face_embedding', sa.MetaData(),
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('student_id', sa.Integer(), sa.ForeignKey('student.id'), nullable=False),
+        sa.Column('embedding', sa.LargeBinary(), nullable=False),
+        sa.Column('model', sa.String(50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+
+
+def upgrade():
+    image_index = sa.Column('image_index', sa.Integer(), nullable=True)
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('face_embedding', copy_from=_face_embedding_table(), recreate='always') as batch_op:
+            batch_op.add_column(image_index)
+    else:
+        op.drop_constraint('face_embedding_student_id_key', 'face_embedding', type_='unique')
+        op.add_column('face_embedding', image_index)
+    op.create_index('ix_face_embedding_student_id', 'face_embedding', ['student_id'])
+
+
+def downgrade():
+    op.drop_index('ix_face_embedding_student_id', table_name='face_embedding')
+    # Keep one row per student so the unique constraint can be restored
+    op.execute(
+        'DELETE FROM face_embedding WHERE id NOT IN '
+        '(SELECT MIN(id) FROM face_embedding GROUP BY student_id)'
+    )
+    with op.batch_alter_table('face_embedding') as batch_op:
+        batch_op.drop_column('image_index')
+        batch_op.create_unique_constraint('face_embedding_student_id_key', ['student_id'])
@@ -0,0 +1,24 @@
+"""add qr_subject to attendance_session
+
+Revision ID: e1f4a5b6c7d8
+Revises: d9e3f4a5b6c7
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f4a5b6c7d8'
+down_revision = 'd9e3f4a5b6c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('attendance_session', sa.Column('qr_subject', sa.String(100), nullable=True))
+
+
+def downgrade():
+    op.drop_column('attendance_session', 'qr_subject')
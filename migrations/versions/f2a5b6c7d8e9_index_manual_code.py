@@ -0,0 +1,39 @@
+"""unique index on attendance_session.manual_code
+
+Revision ID: f2a5b6c7d8e9
+Revises: e1f4a5b6c7d8
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a5b6c7d8e9'
+down_revision = 'e1f4a5b6c7d8'
+branch_labels = None
+depends_on = None
+
+
+def _has_manual_code_index():
+    inspector = sa.inspect(op.get_bind())
+    indexed = [ix['column_names'] for ix in inspector.get_indexes('attendance_session') if ix.get('unique')]
+    indexed += [uc['column_names'] for uc in inspector.get_unique_constraints('attendance_session')]
+    return ['manual_code'] in indexed
+
+
+def upgrade():
+    # add_column could not carry UNIQUE on SQLite, which left manual entry lookups scanning the table
+    if not _has_manual_code_index():
+        op.create_index(
+            'idx_manual_code', 'attendance_session', ['manual_code'], unique=True,
+            sqlite_where=sa.text('manual_code IS NOT NULL'),
+            postgresql_where=sa.text('manual_code IS NOT NULL')
+        )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'idx_manual_code' in [ix['name'] for ix in inspector.get_indexes('attendance_session')]:
+        op.drop_index('idx_manual_code', table_name='attendance_session')
@@ -1,18 +1,34 @@
 from extensions import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import unicodedata
+from sqlalchemy.orm import validates
+from werkzeug.security import check_password_hash
+
+
+def normalize_name(name):
+    """Case-folded, whitespace-collapsed form of a person's name used for lookups"""
+    return ' '.join(unicodedata.normalize('NFKC', name or '').casefold().split())
+
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
+    name_normalized = db.Column(db.String(100), nullable=True, index=True)  # normalize_name(name), kept in sync below
     email = db.Column(db.String(120), unique=True, nullable=True)
     role = db.Column(db.String(20), nullable=False)  # student, teacher, admin
     password_hash = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
 
+    @validates('name')
+    def _sync_name_normalized(self, key, name):
+        self.name_normalized = normalize_name(name)
+        return name
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        from password_hashing import hash_password
+        # Parameters come from PASSWORD_HASH_METHOD
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -27,11 +43,12 @@ class Student(db.Model):
     parent_phone = db.Column(db.String(15), nullable=True)
     interests = db.Column(db.Text, nullable=True)  # JSON string
     career_goals = db.Column(db.Text, nullable=True)
-    face_encoding = db.Column(db.Text, nullable=True)  # For face recognition
+    face_encoding = db.Column(db.Text, nullable=True)  # Legacy .npy path; embeddings now live in FaceEmbedding
     face_images = db.Column(db.Text, nullable=True)  # JSON list of up to 5 base64 images
     
     user = db.relationship('User', backref=db.backref('student', uselist=False))
-    
+
+    # Also the index student login resolves the candidate through before checking the name
     __table_args__ = (db.UniqueConstraint('roll_no', 'division', 'standard'),)
 
 class Teacher(db.Model):
@@ -43,6 +60,30 @@ class Teacher(db.Model):
     
     user = db.relationship('User', backref=db.backref('teacher', uselist=False))
 
+class FaceEmbedding(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False, index=True)
+    image_index = db.Column(db.Integer, nullable=True)  # 1-based enrollment image; NULL for a legacy averaged encoding
+    embedding = db.Column(db.LargeBinary, nullable=False)  # 128 little-endian float32 values
+    model = db.Column(db.String(50), nullable=False, default='dlib_resnet_v1')
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    student = db.relationship('Student', backref='face_embeddings')
+
+class FaceEnrollmentJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)  # uuid hex
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed, failed
+    image_paths = db.Column(db.Text, nullable=False)  # JSON list of saved image paths
+    total_images = db.Column(db.Integer, default=0)
+    processed_images = db.Column(db.Integer, default=0)
+    errors = db.Column(db.Text, nullable=True)  # JSON list of per-image failures
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    student = db.relationship('Student', backref='face_enrollment_jobs')
+
 class Subject(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -77,14 +118,24 @@ class AttendanceSession(db.Model):
     date = db.Column(db.Date, nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=True)
-    qr_code = db.Column(db.Text, nullable=True)  # Base64 encoded QR code
+    qr_code = db.Column(db.Text, nullable=True)  # Legacy data URL; images are now served from /api/attendance/qr/<token>
     qr_token = db.Column(db.String(100), unique=True, nullable=True)
     manual_code = db.Column(db.String(6), unique=True, nullable=True)  # Short manual entry code
+    qr_subject = db.Column(db.String(100), nullable=True)  # Subject recorded for scans of the rotating QR
     is_active = db.Column(db.Boolean, default=True)
     attendance_method = db.Column(db.String(20), default='manual')  # manual, qr, bluetooth, face
+    # Materialized counts kept by session_counters in the same transaction as each mark
+    roster_count = db.Column(db.Integer, nullable=False, default=0)
+    present_count = db.Column(db.Integer, nullable=False, default=0)
+    late_count = db.Column(db.Integer, nullable=False, default=0)
     
     timetable = db.relationship('Timetable', backref='attendance_sessions')
 
+    @property
+    def absent_count(self):
+        # Unmarked students count as absent, as in the session student list
+        return max((self.roster_count or 0) - (self.present_count or 0) - (self.late_count or 0), 0)
+
 class Attendance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
@@ -98,7 +149,11 @@ class Attendance(db.Model):
     student = db.relationship('Student', backref='attendance_records')
     session = db.relationship('AttendanceSession', backref='attendance_records')
     
-    __table_args__ = (db.UniqueConstraint('student_id', 'session_id'),)
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'session_id'),
+        # Delta polls: a session's rows marked or changed since a cursor
+        db.Index('ix_attendance_session_marked', 'session_id', 'marked_at'),
+    )
 
 class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,149 @@
+import atexit
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'scrypt'
+
+
+class LoginPoolBusy(Exception):
+    """Raised when the login pool already has its maximum number of queued password checks"""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many logins in progress')
+        self.retry_after = retry_after
+
+
+def hash_method():
+    """werkzeug method string from PASSWORD_HASH_METHOD, e.g. 'scrypt:16384:8:1' or 'pbkdf2:sha256:600000'"""
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+    return DEFAULT_METHOD
+
+
+def hash_password(password, method=None):
+    return generate_password_hash(password, method=method or hash_method())
+
+
+_prefixes = {}
+
+
+def _timed_check(password_hash, password):
+    started = time.perf_counter()
+    ok = check_password_hash(password_hash, password)
+    return ok, (time.perf_counter() - started) * 1000
+
+
+def needs_rehash(password_hash, method=None):
+    """True if password_hash was made with different parameters than the configured method"""
+    method = method or hash_method()
+    prefix = _prefixes.get(method)
+    if prefix is None:
+        # werkzeug fills in default parameters, so compare against what it actually writes
+        prefix = _prefixes[method] = generate_password_hash('', method=method).split('$', 1)[0]
+    return password_hash.split('$', 1)[0] != prefix
+
+
+class LoginPool:
+    """Bounded thread pool for password hashing, plus timing metrics.
+
+    scrypt and pbkdf2 release the GIL, so a morning login rush would otherwise
+    put one hash per request thread on the CPU at once. Capping concurrent
+    hashes at `workers` leaves cores for every other endpoint; beyond
+    `queue_limit` waiting logins the caller gets LoginPoolBusy (503 + Retry-After).
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self.workers = 2
+        self.queue_limit = 32
+        self.timeout = 10
+        self.retry_after = 1
+        self._durations = deque(maxlen=1000)  # hash time per login, ms
+        self._waits = deque(maxlen=1000)  # time queued for a pool thread, ms
+        self.counters = {'logins': 0, 'failures': 0, 'rehashed': 0, 'busy': 0}
+
+    def configure(self, workers=2, queue_limit=32, timeout=10, retry_after=1):
+        self.workers = max(1, int(workers))
+        self.queue_limit = max(self.workers, int(queue_limit))
+        self.timeout = float(timeout)
+        self.retry_after = int(retry_after)
+
+    def _start(self):
+        with self._lock:
+            if self._executor is not None:
+                return
+            config = current_app.config
+            self.configure(
+                workers=config.get('LOGIN_POOL_WORKERS', 2),
+                queue_limit=config.get('LOGIN_POOL_QUEUE_LIMIT', 32),
+                timeout=config.get('LOGIN_TIMEOUT', 10),
+                retry_after=config.get('LOGIN_RETRY_AFTER', 1)
+            )
+            self._slots = threading.BoundedSemaphore(self.queue_limit)
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='login')
+            atexit.register(self.shutdown)
+
+    def run(self, fn, *args):
+        """Run fn in the pool and wait for it, raising LoginPoolBusy when full or too slow"""
+        if self._executor is None:
+            self._start()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            self.counters['busy'] += 1
+            raise LoginPoolBusy(self.retry_after)
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            self.counters['busy'] += 1
+            raise LoginPoolBusy(self.retry_after)
+
+    def verify(self, user, password):
+        """Check a login password; on success transparently upgrade an outdated hash (the caller commits)"""
+        if not user.password_hash:
+            return False
+        started = time.perf_counter()
+        ok, hash_ms = self.run(_timed_check, user.password_hash, password)
+        self._durations.append(hash_ms)
+        self._waits.append((time.perf_counter() - started) * 1000 - hash_ms)
+        self.counters['logins'] += 1
+        if not ok:
+            self.counters['failures'] += 1
+            return False
+        method = hash_method()
+        if needs_rehash(user.password_hash, method):
+            user.password_hash = self.run(hash_password, password, method)
+            self.counters['rehashed'] += 1
+        return True
+
+    def stats(self):
+        def pct(values, fraction):
+            ordered = sorted(values)
+            return round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)], 2)
+
+        stats = dict(self.counters)
+        stats['method'] = hash_method()
+        stats['workers'] = self.workers
+        if self._durations:
+            stats['hash_ms_p50'] = pct(self._durations, 0.5)
+            stats['hash_ms_p95'] = pct(self._durations, 0.95)
+            stats['hash_ms_max'] = round(max(self._durations), 2)
+            stats['queue_ms_p95'] = pct(self._waits, 0.95)
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Shared login pool for this worker process, configured from app.config on first use
+login_pool = LoginPool()
@@ -0,0 +1,91 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+import qrcode
+
+
+def _matrix(data, border=4):
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def render_png(data, box_size=4):
+    """1-bit PNG of the QR code, a few hundred bytes for an attendance token"""
+    from PIL import Image
+    matrix = _matrix(data)
+    size = len(matrix)
+    img = Image.new('1', (size, size), 1)
+    img.putdata([0 if dark else 1 for row in matrix for dark in row])
+    if box_size > 1:
+        img = img.resize((size * box_size, size * box_size), Image.NEAREST)
+    buf = io.BytesIO()
+    img.save(buf, format='PNG', optimize=True)
+    return buf.getvalue()
+
+
+def render_svg(data):
+    """SVG of the QR code drawn as one stroked path of horizontal runs, one unit per module"""
+    matrix = _matrix(data)
+    size = len(matrix)
+    parts = []
+    for y, row in enumerate(matrix):
+        x = 0
+        pen = None
+        while x < size:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < size and row[x]:
+                x += 1
+            move = f'M{start} {y}.5' if pen is None else f'm{start - pen} 0'
+            parts.append(f'{move}h{x - start}')
+            pen = x
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<path fill="#fff" d="M0 0h{size}v{size}H0z"/>'
+        f'<path stroke="#000" d="{"".join(parts)}"/></svg>'
+    ).encode()
+
+
+class QRImageCache:
+    """Rendered QR images keyed by (token, format), most recently used kept.
+
+    Tokens rotate every few minutes and a dashboard fetches each one a handful of
+    times, so a small per-worker LRU is enough; the route pre-renders the new
+    token when it is issued.
+    """
+
+    FORMATS = {
+        'png': ('image/png', render_png),
+        'svg': ('image/svg+xml', render_svg),
+    }
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token, fmt='png'):
+        """Return (body, mimetype, etag) for token, rendering it on a miss"""
+        key = (token, fmt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        mimetype, render = self.FORMATS[fmt]
+        body = render(token)
+        entry = (body, mimetype, hashlib.sha1(body).hexdigest()[:16])
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+# Shared image cache for this worker process
+qr_images = QRImageCache()
@@ -0,0 +1,62 @@
+import hashlib
+import hmac
+import time
+from flask import current_app
+
+# Rotating tokens look like "r1.<session_id>.<step>.<mac>", which never parses as a JWT
+PREFIX = 'r1'
+
+
+def session_secret(session_id, jti):
+    """Per-session rotation secret, derived from the app key and the session's current jti.
+
+    Issuing a new QR for the session (new jti) therefore invalidates every
+    token derived from the old one without storing anything extra.
+    """
+    key = current_app.config['SECRET_KEY'].encode()
+    return hmac.new(key, f'qr-rotation:{session_id}:{jti}'.encode(), hashlib.sha256).digest()
+
+
+def step_seconds():
+    return int(current_app.config.get('QR_TOKEN_STEP', 30))
+
+
+def current_step(now=None):
+    return int((time.time() if now is None else now) // step_seconds())
+
+
+def seconds_left(step, now=None):
+    """Seconds until the given step ends"""
+    return max(int((step + 1) * step_seconds() - (time.time() if now is None else now)), 0)
+
+
+def _mac(secret, session_id, step):
+    digest = hmac.new(secret, f'{session_id}:{step}'.encode(), hashlib.sha256).hexdigest()
+    return digest[:20]
+
+
+def token_for(secret, session_id, step):
+    return f'{PREFIX}.{session_id}.{step}.{_mac(secret, session_id, step)}'
+
+
+def parse(token):
+    """Return (session_id, step, mac) for a rotating token, else None"""
+    parts = token.split('.') if token else []
+    if len(parts) != 4 or parts[0] != PREFIX:
+        return None
+    try:
+        return int(parts[1]), int(parts[2]), parts[3]
+    except ValueError:
+        return None
+
+
+def verify(secret, token, now=None):
+    """True if token is valid for the current step, give or take QR_TOKEN_WINDOW steps"""
+    parsed = parse(token)
+    if not parsed:
+        return False
+    session_id, step, mac = parsed
+    window = int(current_app.config.get('QR_TOKEN_WINDOW', 1))
+    if abs(current_step(now) - step) > window:
+        return False
+    return hmac.compare_digest(mac, _mac(secret, session_id, step))
@@ -0,0 +1,95 @@
+import hashlib
+import threading
+import time
+from collections import deque
+import numpy as np
+from flask import current_app
+
+
+def frame_hash(image_bytes):
+    """Digest of an uploaded frame's exact bytes, so only a resent frame (retry, double tap) hits the frame tier"""
+    return hashlib.blake2b(image_bytes, digest_size=16).digest()
+
+
+class RecognitionCache:
+    """Short-TTL reuse of recent face matches for repeated kiosk frames.
+
+    Tier 1 reuses a match when the new frame is byte-for-byte a recent frame for
+    the same scope (session); a perceptual hash would also match a different
+    student standing in front of the same background. Tier 2
+    reuses it when the new face encoding is within embedding_distance of a recent
+    encoding. Repeat marks are left to session_registry.claim().
+    """
+
+    def __init__(self, ttl=None, embedding_distance=0.15, max_entries=256):
+        # ttl None: configured from app.config on first use
+        self.ttl = ttl
+        self.embedding_distance = embedding_distance
+        self.max_entries = max_entries
+        self._entries = {}  # scope -> deque of (expires_at, frame digest, encoding, match)
+        self._lock = threading.Lock()
+        self.counters = {'frame_hits': 0, 'embedding_hits': 0, 'misses': 0}
+
+    def configure(self, ttl=10, embedding_distance=0.15):
+        self.ttl = float(ttl)
+        self.embedding_distance = float(embedding_distance)
+
+    def _ensure_configured(self):
+        if self.ttl is None:
+            config = current_app.config
+            self.configure(config.get('FACE_CACHE_TTL', 10), config.get('FACE_CACHE_EMBEDDING_DISTANCE', 0.15))
+
+    def _live_entries(self, scope, now):
+        entries = self._entries.get(scope)
+        if not entries:
+            return ()
+        while entries and entries[0][0] < now:
+            entries.popleft()
+        return entries
+
+    def lookup_frame(self, scope, digest):
+        """Return the cached match for a recent frame with exactly these bytes, else None"""
+        if digest is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            for _, cached_digest, _, match in reversed(self._live_entries(scope, now)):
+                if cached_digest == digest:
+                    self.counters['frame_hits'] += 1
+                    return match
+        return None
+
+    def lookup_embedding(self, scope, encoding):
+        """Return the cached match for a recent face whose encoding is very close, else None"""
+        self._ensure_configured()
+        now = time.monotonic()
+        encoding = np.asarray(encoding, dtype=np.float32)
+        with self._lock:
+            for _, _, cached_encoding, match in reversed(self._live_entries(scope, now)):
+                if np.linalg.norm(cached_encoding - encoding) <= self.embedding_distance:
+                    self.counters['embedding_hits'] += 1
+                    return match
+            self.counters['misses'] += 1
+        return None
+
+    def store(self, scope, digest, encoding, match):
+        self._ensure_configured()
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries.setdefault(scope, deque(maxlen=self.max_entries))
+            entries.append((now + self.ttl, digest, np.asarray(encoding, dtype=np.float32), match))
+            # Drop scopes whose entries have all expired
+            for key in [k for k, v in self._entries.items() if not v or v[-1][0] < now]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['cached_frames'] = sum(len(v) for v in self._entries.values())
+        lookups = stats['frame_hits'] + stats['embedding_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['frame_hits'] + stats['embedding_hits']) / lookups, 3) if lookups else 0
+        return stats
+
+
+# Shared cache for this worker process, configured from app.config on first use
+recognition_cache = RecognitionCache()
@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+import uuid
+from flask import current_app
+from models import db, Student, User
+
+
+class RosterCache:
+    """Per-worker cache of each class's active students, keyed by (standard, division).
+
+    A roster is a tuple of {'id', 'roll_no', 'name', 'user_id'} dicts ordered
+    by roll number; callers must treat it as read-only. Anything that adds,
+    removes, renames, (de)activates or moves a student calls invalidate(),
+    which rewrites an epoch file in the instance folder (as session_registry
+    does) so every worker drops its rosters on its next lookup. Entries also
+    expire after ROSTER_CACHE_TTL seconds as a backstop.
+    """
+
+    EPOCH_FILE = 'roster_cache.epoch'
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self._rosters = {}  # (standard, division) -> (expires_at, roster)
+        self._epoch = None
+        self._epoch_stat = None
+        self._lock = threading.Lock()
+
+    def _epoch_path(self):
+        return os.path.join(current_app.instance_path, self.EPOCH_FILE)
+
+    def _check_epoch(self):
+        path = self._epoch_path()
+        try:
+            stat = os.stat(path)
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stat_key = None
+        if stat_key == self._epoch_stat:
+            return
+        try:
+            with open(path) as f:
+                epoch = f.read().strip()
+        except FileNotFoundError:
+            epoch = None
+        with self._lock:
+            if epoch != self._epoch:
+                self._rosters = {}
+                self._epoch = epoch
+            self._epoch_stat = stat_key
+
+    def invalidate(self):
+        """Drop every cached roster in every worker (call after the change is committed)"""
+        path = self._epoch_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._rosters = {}
+        self._check_epoch()
+
+    def version(self):
+        """Changes whenever any worker invalidates the rosters (None before the first invalidation)"""
+        self._check_epoch()
+        return self._epoch
+
+    def _load(self, standard, division):
+        rows = db.session.query(Student.id, Student.roll_no, User.name, User.id).join(User).filter(
+            Student.standard == standard,
+            Student.division == division,
+            User.is_active == True
+        ).order_by(Student.roll_no).all()
+        return tuple({'id': sid, 'roll_no': roll_no, 'name': name, 'user_id': user_id}
+                     for sid, roll_no, name, user_id in rows)
+
+    def get(self, standard, division):
+        self._check_epoch()
+        key = (standard, division)
+        now = time.monotonic()
+        entry = self._rosters.get(key)
+        if entry is not None and entry[0] >= now:
+            return entry[1]
+        epoch = self._epoch
+        roster = self._load(standard, division)
+        with self._lock:
+            # Don't store a roster read while another worker was invalidating
+            if epoch == self._epoch:
+                self._rosters[key] = (now + current_app.config.get('ROSTER_CACHE_TTL', self.ttl), roster)
+        return roster
+
+    def size(self, standard, division):
+        return len(self.get(standard, division))
+
+
+# Shared roster cache for this worker process
+roster_cache = RosterCache()
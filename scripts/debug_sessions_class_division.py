@@ -2,6 +2,7 @@
 # Script to reassign related records from duplicate class (ID 4) to correct class (ID 1) and delete duplicate
 from app import app
 from models import db, Class, Timetable, AttendanceSession, Student
+import session_counters
 
 DUPLICATE_CLASS_ID = 4  # '10th'-'A'
 CORRECT_CLASS_ID = 1    # '10'-'A'
@@ -20,6 +21,9 @@ with app.app_context():
         print(f"Updating Student ID {s.id}: standard '10th' -> '10'")
         s.standard = '10'
     db.session.commit()
+    if students:
+        # Rosters, session counters and class-scoped face matching in running workers follow the move
+        session_counters.roster_changed()
 
     # Delete duplicate class
     duplicate = Class.query.get(DUPLICATE_CLASS_ID)
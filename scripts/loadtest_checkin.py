@@ -0,0 +1,294 @@
+"""Load test for the classroom check-in burst.
+
+Seeds CLASSES x STUDENTS into a throwaway database, opens one session per class
+through /api/teacher/create_session, issues its QR with generate_qr, then fires
+every student's mark-qr (QR frame or manual code) concurrently, plus one
+/api/teacher/attendance/manual save per class. Reports p50/p95/p99 latency,
+throughput and error rates (lock contention separately), checks that every
+acknowledged mark reached the attendance table, and compares against a stored
+baseline.
+
+The teacher's save races with half the class's scans, so some scans are
+rightly told "Attendance already marked"; those are counted as an expected
+outcome. The error rate only counts server errors (5xx) and lock errors.
+
+In-process (Flask test client, default):
+
+    python scripts/loadtest_checkin.py --classes 10 --students 60 --concurrency 32
+
+Against gunicorn, seeding the same database the server uses:
+
+    DATABASE_URL=sqlite:////tmp/checkin.db gunicorn -w 4 --threads 8 app:app &
+    python scripts/loadtest_checkin.py --database sqlite:////tmp/checkin.db --url http://127.0.0.1:8000
+
+Use --save-baseline to record the run; later runs of the same scenario fail
+(exit code 1) when p95 latency grows beyond --tolerance x baseline or the error
+rate rises more than --error-tolerance above it.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'loadtest_baselines.json')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--classes', type=int, default=5)
+    parser.add_argument('--students', type=int, default=40, help='students per class')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--manual-share', type=float, default=0.3,
+                        help='fraction of students who type the manual code instead of scanning')
+    parser.add_argument('--database', help='SQLAlchemy URL to seed (default: a temporary SQLite file)')
+    parser.add_argument('--url', help='base URL of a running server; default drives the app in-process')
+    parser.add_argument('--baseline-file', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='allowed p95 growth over the baseline')
+    parser.add_argument('--error-tolerance', type=float, default=0.005,
+                        help='allowed absolute error rate increase over the baseline')
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class Client:
+    """Same call shape for the in-process test client and a real HTTP server"""
+
+    def __init__(self, app, base_url=None):
+        self.app = app
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self._local = threading.local()
+
+    def post(self, path, token, body):
+        headers = {'Authorization': f'Bearer {token}'}
+        if not self.base_url:
+            client = getattr(self._local, 'client', None)
+            if client is None:
+                client = self._local.client = self.app.test_client()
+            resp = client.post(path, json=body, headers=headers)
+            return resp.status_code, resp.get_data(as_text=True)
+        request = urllib.request.Request(
+            self.base_url + path, data=json.dumps(body).encode(), method='POST',
+            headers=dict(headers, **{'Content-Type': 'application/json'})
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=60) as resp:
+                return resp.status, resp.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode()
+
+
+def seed(app, classes, students):
+    """Create one teacher, subject and class per class index, and the students; returns per-class info"""
+    from models import db, User, Teacher, Student, Subject
+    from auth import generate_token
+
+    seeded = []
+    with app.app_context():
+        db.create_all()
+        for c in range(classes):
+            standard, division = str(100 + c), 'L'
+            teacher_user = User(name=f'Load Teacher {c}', email=f'load-teacher-{c}@example.com', role='teacher')
+            db.session.add(teacher_user)
+            db.session.flush()
+            db.session.add(Teacher(user_id=teacher_user.id, employee_id=f'LOAD{c}'))
+            db.session.add(Subject(name=f'Load Subject {c}', code=f'LOAD{c}'))
+            student_users = [User(name=f'Load Student {c}-{s}', role='student') for s in range(students)]
+            db.session.add_all(student_users)
+            db.session.flush()
+            roster = [Student(user_id=u.id, roll_no=str(s + 1), standard=standard, division=division)
+                      for s, u in enumerate(student_users)]
+            db.session.add_all(roster)
+            db.session.commit()
+            seeded.append({
+                'standard': standard,
+                'division': division,
+                'subject_name': f'Load Subject {c}',
+                'subject_code': f'LOAD{c}',
+                'teacher_token': generate_token(teacher_user.id),
+                'students': [(student.id, generate_token(u.id)) for student, u in zip(roster, student_users)]
+            })
+    return seeded
+
+
+def open_sessions(client, seeded):
+    for info in seeded:
+        status, body = client.post('/api/teacher/create_session', info['teacher_token'], {
+            'class_standard': info['standard'],
+            'class_division': info['division'],
+            'subject_name': info['subject_name'],
+            'subject_code': info['subject_code'],
+            'room': 'L1',
+            'duration': 1
+        })
+        if status != 200:
+            raise SystemExit(f'create_session failed ({status}): {body}')
+        info['session_id'] = json.loads(body)['session_id']
+        status, body = client.post(
+            f"/api/teacher/session/{info['session_id']}/generate_qr", info['teacher_token'], {'subject': info['subject_name']}
+        )
+        if status != 200:
+            raise SystemExit(f'generate_qr failed ({status}): {body}')
+        qr = json.loads(body)
+        info['qr_token'] = qr['qr_token']
+        info['manual_code'] = qr['jwt']
+
+
+def build_requests(seeded, manual_share, seed=0):
+    """Shuffle the classes together (deterministically) so the burst hits every session at once"""
+    requests = []
+    every = max(int(round(1 / manual_share)), 1) if manual_share > 0 else 0
+    for info in seeded:
+        for i, (student_id, token) in enumerate(info['students']):
+            if every and i % every == 0:
+                requests.append(('manual_code', '/api/attendance/mark-qr', token, {'manual_code': info['manual_code']}))
+            else:
+                requests.append(('qr', '/api/attendance/mark-qr', token, {'token': info['qr_token']}))
+        # The teacher also saves the roster while students are scanning
+        requests.append(('teacher_manual', '/api/teacher/attendance/manual', info['teacher_token'], {
+            'session_id': info['session_id'],
+            'attendance': [{'student_id': sid, 'status': 'present'} for sid, _ in info['students'][::2]]
+        }))
+    random.Random(seed).shuffle(requests)
+    return requests
+
+
+def fire(client, requests, concurrency):
+    results = []
+    lock = threading.Lock()
+
+    def one(req):
+        kind, path, token, body = req
+        started = time.perf_counter()
+        status, text = client.post(path, token, body)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with lock:
+            results.append((kind, status, elapsed_ms, text))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, requests))
+    return results, time.perf_counter() - started
+
+
+def _already_marked(result):
+    return result[1] == 400 and 'already marked' in result[3].lower()
+
+
+def _is_error(result):
+    return result[1] >= 500 or 'locked' in result[3].lower()
+
+
+def summarize(results, wall_seconds):
+    latencies = [r[2] for r in results]
+    errors = [r for r in results if _is_error(r)]
+    locked = [r for r in errors if 'locked' in r[3].lower()]
+    summary = {
+        'requests': len(results),
+        'throughput_rps': round(len(results) / wall_seconds, 1) if wall_seconds else 0,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'error_rate': round(len(errors) / len(results), 4) if results else 0,
+        'lock_errors': len(locked),
+        'already_marked': sum(1 for r in results if _already_marked(r)),
+        # Other 4xx answers: not load related, but worth a look when non-zero
+        'rejected': sum(1 for r in results if 400 <= r[1] < 500 and not _is_error(r) and not _already_marked(r)),
+        'by_kind': {}
+    }
+    for kind in sorted({r[0] for r in results}):
+        rows = [r for r in results if r[0] == kind]
+        summary['by_kind'][kind] = {
+            'requests': len(rows),
+            'p95_ms': round(percentile([r[2] for r in rows], 95), 2),
+            'errors': sum(1 for r in rows if _is_error(r))
+        }
+    return summary
+
+
+def verify_rows(app, seeded, remote):
+    """Every student was either acknowledged or told 'already marked', so each must have a row"""
+    from models import Attendance
+    from attendance_writer import attendance_writer
+    with app.app_context():
+        if remote:
+            # The server's write-behind queue flushes on its own interval
+            time.sleep(max(app.config.get('ATTENDANCE_FLUSH_MS', 50) / 1000.0 * 4, 0.5))
+        else:
+            attendance_writer.drain()
+        expected = sum(len(info['students']) for info in seeded)
+        stored = Attendance.query.filter(Attendance.session_id.in_([info['session_id'] for info in seeded])).count()
+    return expected, stored
+
+
+def compare(summary, baseline, tolerance, error_tolerance):
+    problems = []
+    if summary['p95_ms'] > baseline['p95_ms'] * tolerance:
+        problems.append(f"p95 {summary['p95_ms']}ms > {tolerance} x baseline {baseline['p95_ms']}ms")
+    if summary['error_rate'] > baseline['error_rate'] + error_tolerance:
+        problems.append(f"error rate {summary['error_rate']} > baseline {baseline['error_rate']} + {error_tolerance}")
+    return problems
+
+
+def main():
+    args = parse_args()
+    database = args.database or 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='checkin-'), 'load.db')
+    # app.py reads DATABASE_URL at import time
+    os.environ['DATABASE_URL'] = database
+    from app import app
+    app.config['TESTING'] = True
+
+    scenario = f"{'http' if args.url else 'inprocess'}:{database.split(':')[0]}:c{args.classes}:s{args.students}:k{args.concurrency}"
+    print(f"Scenario {scenario}")
+    seeded = seed(app, args.classes, args.students)
+    client = Client(app, args.url)
+    open_sessions(client, seeded)
+    requests = build_requests(seeded, args.manual_share)
+    results, wall_seconds = fire(client, requests, args.concurrency)
+    summary = summarize(results, wall_seconds)
+    expected, stored = verify_rows(app, seeded, remote=bool(args.url))
+    summary['rows_expected'] = expected
+    summary['rows_stored'] = stored
+    print(json.dumps(summary, indent=2))
+
+    failed = stored != expected
+    if failed:
+        print(f"FAIL: {expected - stored} acknowledged marks missing from the attendance table")
+
+    baselines = {}
+    if os.path.exists(args.baseline_file):
+        with open(args.baseline_file) as f:
+            baselines = json.load(f)
+    if args.save_baseline:
+        baselines[scenario] = {k: summary[k] for k in ('p50_ms', 'p95_ms', 'p99_ms', 'error_rate', 'throughput_rps')}
+        with open(args.baseline_file, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Saved baseline for {scenario}")
+    elif scenario in baselines:
+        problems = compare(summary, baselines[scenario], args.tolerance, args.error_tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        failed = failed or bool(problems)
+    else:
+        print('No baseline for this scenario yet (run with --save-baseline)')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
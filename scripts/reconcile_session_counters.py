@@ -0,0 +1,40 @@
+"""Rebuild the materialized attendance counters on attendance_session.
+
+Marking paths keep roster_count, present_count and late_count current in the
+same transaction as each mark. Run this after editing attendance rows by hand,
+restoring a backup, or moving students between classes outside the app:
+
+    python scripts/reconcile_session_counters.py                 # today's sessions
+    python scripts/reconcile_session_counters.py --date 2026-10-18
+    python scripts/reconcile_session_counters.py --all
+    python scripts/reconcile_session_counters.py --session 42 --session 43
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--date', help='YYYY-MM-DD (default: today in IST)')
+    parser.add_argument('--all', action='store_true', help='every session ever recorded')
+    parser.add_argument('--session', type=int, action='append', help='a session id; may be repeated')
+    args = parser.parse_args()
+
+    import pytz
+    from app import app
+    import session_counters
+
+    day = None
+    if not args.all and not args.session:
+        day = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else datetime.now(pytz.timezone('Asia/Kolkata')).date()
+    with app.app_context():
+        fixed = session_counters.reconcile(session_ids=args.session, day=day)
+    print(f"Corrected counters on {len(fixed)} session(s){': ' + ', '.join(map(str, fixed)) if fixed else ''}")
+
+
+if __name__ == '__main__':
+    main()
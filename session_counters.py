@@ -0,0 +1,123 @@
+from datetime import datetime
+import pytz
+from flask import current_app
+from sqlalchemy import func, select, update
+from models import db, AttendanceSession, Attendance, Timetable, Class, Student, User
+from roster_cache import roster_cache
+
+COUNTED = ('present', 'late')
+
+
+def record(changes):
+    """Apply attendance status changes to their sessions' counters, inside the caller's transaction.
+
+    changes is an iterable of (session_id, student_id, old_status, new_status),
+    old_status None for a new row. Only students on the session's class roster
+    are counted (not a student of another class who scanned the QR, nor one
+    deactivated since), so absent_count = roster - present - late stays the
+    student list's numbers. Each session gets one UPDATE of relative
+    increments, so concurrent workers never overwrite each other's counts and
+    a rolled back transaction takes its counter changes with it.
+    """
+    changes = [change for change in changes if change[2] != change[3]]
+    if not changes:
+        return
+    rosters = _roster_ids({session_id for session_id, _, _, _ in changes})
+    deltas = {}
+    for session_id, student_id, old, new in changes:
+        if student_id not in rosters.get(session_id, ()):
+            continue
+        delta = deltas.setdefault(session_id, {'present': 0, 'late': 0})
+        if old in COUNTED:
+            delta[old] -= 1
+        if new in COUNTED:
+            delta[new] += 1
+    for session_id, delta in deltas.items():
+        if not any(delta.values()):
+            continue
+        db.session.query(AttendanceSession).filter(AttendanceSession.id == session_id).update({
+            AttendanceSession.present_count: AttendanceSession.present_count + delta['present'],
+            AttendanceSession.late_count: AttendanceSession.late_count + delta['late']
+        }, synchronize_session=False)
+
+
+def _roster_ids(session_ids):
+    """session_id -> ids of the active students of its class, from the roster cache"""
+    return {session_id: {student['id'] for student in roster_cache.get(standard, division)}
+            for session_id, standard, division in _session_classes().filter(AttendanceSession.id.in_(session_ids))}
+
+
+def init_roster(session, class_ref=None):
+    """Set a new session's roster_count from its class (the caller commits)"""
+    class_ref = class_ref or session.timetable.class_ref
+    session.roster_count = roster_cache.size(class_ref.standard, class_ref.division)
+
+
+def roster_changed():
+    """After a student is added, removed, (de)activated or moved: drop the cached rosters and
+    recount today's sessions; commits.
+
+    Called once the student change is committed. A failure here is logged and
+    rolled back rather than raised: the change itself stands, and
+    scripts/reconcile_session_counters.py repairs the counters.
+    """
+    roster_cache.invalidate()
+    today = datetime.now(pytz.timezone('Asia/Kolkata')).date()
+    try:
+        _recount(AttendanceSession.date == today)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error('Could not recount session counters after a roster change: %s', e)
+
+
+def _session_classes():
+    return db.session.query(AttendanceSession.id, Class.standard, Class.division).select_from(AttendanceSession) \
+        .join(Timetable, Timetable.id == AttendanceSession.timetable_id).join(Class, Class.id == Timetable.class_id)
+
+
+def _on_roster():
+    """Criteria for the active students of the enclosing attendance_session row's class (correlated)"""
+    return (
+        Timetable.id == AttendanceSession.timetable_id,
+        Class.id == Timetable.class_id,
+        Student.standard == Class.standard,
+        Student.division == Class.division,
+        User.is_active == True
+    )
+
+
+def _recount(*criteria):
+    """Rebuild roster, present and late counters of the matching sessions in one UPDATE.
+
+    Each value is a correlated subquery, so the statement reads and writes
+    atomically and cannot lose a concurrent writer's increment.
+    """
+    def marks(status):
+        return select(func.count(Attendance.id)).join(Student, Student.id == Attendance.student_id) \
+            .join(User, User.id == Student.user_id) \
+            .where(Attendance.session_id == AttendanceSession.id, Attendance.status == status, *_on_roster()) \
+            .scalar_subquery()
+
+    roster = select(func.count(Student.id)).join(User, User.id == Student.user_id).where(*_on_roster()).scalar_subquery()
+    db.session.execute(update(AttendanceSession).where(*criteria).values(
+        roster_count=roster, present_count=marks('present'), late_count=marks('late')
+    ).execution_options(synchronize_session=False))
+
+
+def reconcile(session_ids=None, day=None):
+    """Rebuild roster, present and late counters from the attendance table; returns the sessions fixed"""
+    criteria = []
+    if session_ids is not None:
+        criteria.append(AttendanceSession.id.in_(session_ids))
+    if day is not None:
+        criteria.append(AttendanceSession.date == day)
+    counters = lambda: {s.id: (s.roster_count, s.present_count, s.late_count) for s in
+                        AttendanceSession.query.filter(*criteria).all()}
+    before = counters()
+    if not before:
+        return []
+    _recount(*criteria)
+    db.session.commit()
+    after = counters()
+    return [session_id for session_id in before if before[session_id] != after.get(session_id)]
@@ -0,0 +1,31 @@
+from sqlalchemy.orm import contains_eager
+from models import db, AttendanceSession, Attendance, Timetable, Class, Teacher
+
+
+def sessions_for_day(day, teacher_id=None, standard=None, division=None):
+    """A day's sessions with timetable, class, subject and teacher name loaded by one joined query"""
+    query = db.session.query(AttendanceSession).join(AttendanceSession.timetable) \
+        .join(Timetable.class_ref).join(Timetable.subject) \
+        .join(Timetable.teacher).join(Teacher.user) \
+        .options(contains_eager(AttendanceSession.timetable).options(
+            contains_eager(Timetable.class_ref),
+            contains_eager(Timetable.subject),
+            contains_eager(Timetable.teacher).contains_eager(Teacher.user)
+        )) \
+        .filter(AttendanceSession.date == day)
+    if teacher_id is not None:
+        query = query.filter(Timetable.teacher_id == teacher_id)
+    if standard is not None:
+        query = query.filter(Class.standard == standard, Class.division == division)
+    return query.order_by(AttendanceSession.start_time).all()
+
+
+def student_marks(student_id, session_ids):
+    """session_id -> this student's Attendance row, for the sessions that have one"""
+    if not session_ids:
+        return {}
+    rows = Attendance.query.filter(
+        Attendance.student_id == student_id,
+        Attendance.session_id.in_(session_ids)
+    ).all()
+    return {row.session_id: row for row in rows}
@@ -0,0 +1,194 @@
+import os
+import threading
+import uuid
+from flask import current_app
+from models import AttendanceSession
+import qr_tokens
+
+
+class SessionTokenRegistry:
+    """In-memory registry of active attendance sessions keyed by QR jti and manual code.
+
+    Lets mark-qr validate a scan, including a rotating QR frame, without reading
+    the database. Each worker keeps its own copy and fills it from the database
+    on a miss. Whenever a worker rotates or revokes a session it rewrites a small
+    epoch file in the instance folder; the other workers see the new epoch on
+    their next lookup and drop their entries, so a rotated token is never
+    accepted from a stale cache.
+
+    The registry also remembers which students each session has already marked,
+    so repeat scans are answered without an Attendance query.
+    """
+
+    EPOCH_FILE = 'session_registry.epoch'
+
+    def __init__(self):
+        self._by_jti = {}
+        self._by_code = {}
+        self._by_session = {}
+        self._marked = {}
+        self._epoch = None
+        self._epoch_stat = None
+        self._lock = threading.Lock()
+
+    def _epoch_path(self):
+        return os.path.join(current_app.instance_path, self.EPOCH_FILE)
+
+    def _clear(self):
+        self._by_jti = {}
+        self._by_code = {}
+        self._by_session = {}
+        # Session ids can be reused after a delete on SQLite, so marked sets go too
+        self._marked = {}
+
+    def _check_epoch(self):
+        path = self._epoch_path()
+        try:
+            stat = os.stat(path)
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stat_key = None
+        if stat_key == self._epoch_stat:
+            return
+        try:
+            with open(path) as f:
+                epoch = f.read().strip()
+        except FileNotFoundError:
+            epoch = None
+        with self._lock:
+            if epoch != self._epoch:
+                self._clear()
+                self._epoch = epoch
+            self._epoch_stat = stat_key
+
+    def _bump_epoch(self):
+        path = self._epoch_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        epoch = uuid.uuid4().hex
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(epoch)
+        os.replace(tmp_path, path)
+        stat = os.stat(path)
+        self._epoch = epoch
+        self._epoch_stat = (stat.st_mtime_ns, stat.st_size)
+
+    def _drop_session(self, session_id):
+        entry = self._by_session.pop(session_id, None)
+        if entry:
+            if entry.get('jti'):
+                self._by_jti.pop(entry['jti'], None)
+            if entry.get('manual_code'):
+                self._by_code.pop(entry['manual_code'], None)
+
+    def remember(self, session):
+        """Cache an active AttendanceSession loaded from the database"""
+        timetable = session.timetable
+        entry = {
+            'session_id': session.id,
+            'jti': session.qr_token,
+            'manual_code': session.manual_code,
+            'date': session.date,
+            'is_active': bool(session.is_active),
+            # Rotating QR frames are derived from this; None until a QR is issued
+            'secret': qr_tokens.session_secret(session.id, session.qr_token) if session.qr_token else None,
+            'teacher_id': timetable.teacher_id if timetable else None,
+            'subject': session.qr_subject
+        }
+        with self._lock:
+            self._drop_session(session.id)
+            if not entry['is_active']:
+                return entry
+            self._by_session[session.id] = entry
+            if entry['jti']:
+                self._by_jti[entry['jti']] = entry
+            if entry['manual_code']:
+                self._by_code[entry['manual_code']] = entry
+        return entry
+
+    def publish(self, session):
+        """Register a session's freshly rotated token/code and invalidate other workers"""
+        self._check_epoch()
+        with self._lock:
+            self._bump_epoch()
+        return self.remember(session)
+
+    def revoke(self, session_id):
+        """Forget a closed or deleted session everywhere"""
+        self._check_epoch()
+        with self._lock:
+            self._drop_session(session_id)
+            self._marked.pop(session_id, None)
+            self._bump_epoch()
+
+    def version(self):
+        """Changes whenever any worker rotates, closes or deletes a session, or a teacher saves marks"""
+        self._check_epoch()
+        return self._epoch
+
+    def by_jti(self, jti):
+        self._check_epoch()
+        return self._by_jti.get(jti)
+
+    def by_session(self, session_id):
+        """Entry for an active session, loading it from the database on a miss"""
+        self._check_epoch()
+        entry = self._by_session.get(session_id)
+        if entry is None:
+            session = AttendanceSession.query.filter_by(id=session_id, is_active=True).first()
+            if session:
+                entry = self.remember(session)
+        return entry
+
+    def by_code(self, manual_code):
+        self._check_epoch()
+        return self._by_code.get(manual_code)
+
+    def is_marked(self, session_id, student_id):
+        marked = self._marked.get(session_id)
+        return bool(marked) and student_id in marked
+
+    def mark(self, session_id, student_ids):
+        """Note rows a teacher stored directly, outside the write queue.
+
+        Bumps the epoch so other workers drop their marked sets and reseed them
+        from the database, and a later scan gets "already marked" instead of
+        an acknowledgement for a row the flusher would skip.
+        """
+        self._check_epoch()
+        with self._lock:
+            marked = self._marked.get(session_id)
+            # An unseeded session is left alone so claim() still seeds it in full
+            if marked is not None:
+                marked.update(student_ids)
+            self._bump_epoch()
+
+    def release(self, session_id, student_id):
+        """Undo a claim whose mark was never stored"""
+        with self._lock:
+            marked = self._marked.get(session_id)
+            if marked is not None:
+                marked.discard(student_id)
+
+    def claim(self, session_id, student_id, load_marked=None):
+        """Record a mark unless the student already has one; returns False for a repeat.
+
+        load_marked() returns the student ids already stored for the session and
+        seeds the set the first time this worker sees that session.
+        """
+        self._check_epoch()
+        seeded = None
+        if session_id not in self._marked and load_marked:
+            seeded = set(load_marked())
+        with self._lock:
+            marked = self._marked.get(session_id)
+            if marked is None:
+                marked = self._marked[session_id] = seeded or set()
+            if student_id in marked:
+                return False
+            marked.add(student_id)
+            return True
+
+
+# Shared registry for this worker process
+session_registry = SessionTokenRegistry()
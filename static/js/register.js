@@ -155,10 +155,21 @@ document.addEventListener("DOMContentLoaded", () => {
       }
       // Upload face images
       try {
-        await axios.post("/api/ai/register_face", {
+        const res = await axios.post("/api/ai/register_face", {
           student_id,
           images: faceImages
         });
+        // Enrollment runs as a background job; poll until it finishes
+        let job = res.data;
+        while (job.job_id && (job.status === "queued" || job.status === "running")) {
+          await new Promise((resolve) => setTimeout(resolve, 1000));
+          job = (await axios.get(`/api/ai/register_face/${job.job_id}`)).data;
+        }
+        if (job.status === "failed") {
+          const detail = (job.errors || []).map((e) => e.error).join(", ");
+          showMessage("register-error", `Face registration failed${detail ? ": " + detail : ""}. Try again.`, "error");
+          return;
+        }
         showMessage("register-success", "Registration complete! You can now log in.", "success");
         setTimeout(() => window.location.href = "/login", 2000);
       } catch (err) {
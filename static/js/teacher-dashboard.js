@@ -16,12 +16,13 @@ document.addEventListener("DOMContentLoaded", async () => {
   // Set current date
   document.getElementById("current-date").textContent = new Date().toLocaleDateString()
 
-  // Auto-refresh attendance every 10 seconds for near real-time updates
-  setInterval(refreshAttendance, 10000)
+  // Live attendance: one snapshot, then changes pushed over server-sent events
+  startAttendanceStream()
 })
 
 let currentQRSession = null
 let qrExpiryTimer = null
+let qrRotationTimer = null
 
 async function initializeDashboard() {
   const user = auth.user
@@ -252,15 +253,15 @@ async function generateQRCode() {
     // Call teacher QR generation endpoint (include subject)
     const response = await axios.post(`/api/teacher/session/${sessionId}/generate_qr`, { subject });
 
-    const { qr_code, jwt, expires_in } = response.data;
+    const { qr_url, jwt, expires_in, frame_url } = response.data;
 
-    // Display QR code (qr_code is a data URL from the API)
+    // Display QR code (qr_url serves a cached PNG of the token)
     const qrDisplay = document.getElementById("qr-display");
     const qrPlaceholder = document.getElementById("qr-placeholder");
     const qrInfo = document.getElementById("qr-info");
     const manualCode = document.getElementById("manual-code");
 
-    qrPlaceholder.innerHTML = `<img src="${qr_code}" alt="QR Code" class="w-48 h-48 mx-auto">`;
+    qrPlaceholder.innerHTML = `<img src="${qr_url}" alt="QR Code" class="w-48 h-48 mx-auto" style="image-rendering: pixelated">`;
     qrInfo.classList.remove("hidden");
 
     // Display and setup manual code
@@ -269,13 +270,15 @@ async function generateQRCode() {
 
     // Store current session info
     currentQRSession = {
-      qr_code,
+      qr_url,
       jwt,
+      frame_url,
       expires_at: new Date(Date.now() + expires_in * 1000),
     };
 
-    // Start expiry countdown
+    // The QR rotates every few seconds; fetch each new frame as the current one ends
     startQRExpiryCountdown(expires_in);
+    scheduleQRRotation(expires_in);
     
     showSuccess("QR Code generated successfully!");
   } catch (error) {
@@ -308,6 +311,42 @@ function setupCopyCodeButton(code) {
 }
 
 
+function scheduleQRRotation(expiresIn) {
+  if (qrRotationTimer) {
+    clearTimeout(qrRotationTimer)
+  }
+
+  qrRotationTimer = setTimeout(async () => {
+    if (!currentQRSession) return
+    try {
+      const { data } = await axios.get(currentQRSession.frame_url)
+      currentQRSession.qr_url = data.qr_url
+      currentQRSession.expires_at = new Date(Date.now() + data.expires_in * 1000)
+      const img = document.querySelector("#qr-placeholder img")
+      if (img) img.src = data.qr_url
+      startQRExpiryCountdown(data.expires_in)
+      scheduleQRRotation(data.expires_in)
+    } catch (error) {
+      // The session closed or its QR was re-issued elsewhere
+      console.error("Error refreshing QR frame:", error)
+      clearQRDisplay()
+    }
+  }, expiresIn * 1000 + 250)
+}
+
+function clearQRDisplay() {
+  clearInterval(qrExpiryTimer)
+  clearTimeout(qrRotationTimer)
+  document.getElementById("qr-expires").textContent = "Expired"
+  document.getElementById("qr-info").classList.add("hidden")
+  document.getElementById("qr-placeholder").innerHTML = `
+                <div class="text-gray-400">
+                    <i class="fas fa-qrcode text-4xl mb-2"></i>
+                    <p class="text-sm">QR Code will appear here</p>
+                </div>
+            `
+}
+
 function startQRExpiryCountdown(expiresIn) {
   const qrExpires = document.getElementById("qr-expires")
 
@@ -321,21 +360,14 @@ function startQRExpiryCountdown(expiresIn) {
     timeLeft--
 
     if (timeLeft <= 0) {
+      // scheduleQRRotation swaps in the next frame
       clearInterval(qrExpiryTimer)
-      qrExpires.textContent = "Expired"
-      document.getElementById("qr-info").classList.add("hidden")
-      document.getElementById("qr-placeholder").innerHTML = `
-                <div class="text-gray-400">
-                    <i class="fas fa-qrcode text-4xl mb-2"></i>
-                    <p class="text-sm">QR Code will appear here</p>
-                </div>
-            `
       return
     }
 
     const minutes = Math.floor(timeLeft / 60)
     const seconds = timeLeft % 60
-    qrExpires.textContent = `Expires in: ${minutes}:${seconds.toString().padStart(2, "0")}`
+    qrExpires.textContent = `Next code in: ${minutes}:${seconds.toString().padStart(2, "0")}`
   }, 1000)
 }
 
@@ -347,20 +379,71 @@ function downloadQRCode() {
 
   const link = document.createElement("a")
   link.download = `attendance-qr-${Date.now()}.png`
-  // currentQRSession.qr_code is a data URL (data:image/png;base64,...)
-  link.href = currentQRSession.qr_code
+  // Same-origin URL, so the download attribute applies
+  link.href = currentQRSession.qr_url
   link.click()
 }
 
+let liveAttendance = []
+let liveSince = null
+let attendanceStream = null
+let studentListReload = null
+
 async function refreshAttendance() {
   try {
     const response = await axios.get("/api/teacher/attendance/live")
-    displayLiveAttendance(response.data.attendance)
+    liveAttendance = response.data.attendance
+    liveSince = response.data.since
+    displayLiveAttendance(liveAttendance)
+    return response.data.cursor
+  } catch (error) {
+    console.error("Error refreshing attendance:", error)
+    return null
+  }
+}
+
+async function startAttendanceStream() {
+  const cursor = await refreshAttendance()
+  if (!window.EventSource) {
+    // No SSE support: fall back to polling for changes only
+    setInterval(pollAttendanceChanges, 10000)
+    return
+  }
+  // The login session cookie authenticates the stream; EventSource resumes from the last event id on reconnect
+  attendanceStream = new EventSource(`/api/teacher/attendance/stream${cursor ? `?cursor=${encodeURIComponent(cursor)}` : ""}`)
+  attendanceStream.addEventListener("attendance", (event) => applyAttendanceChanges(JSON.parse(event.data)))
+}
+
+async function pollAttendanceChanges() {
+  try {
+    const response = await axios.get("/api/teacher/attendance/live", { params: { since: liveSince } })
+    liveSince = response.data.since
+    // Rows come newest first; applyAttendanceChanges takes them in commit order
+    if (response.data.attendance.length) applyAttendanceChanges(response.data.attendance.slice().reverse())
   } catch (error) {
     console.error("Error refreshing attendance:", error)
   }
 }
 
+function applyAttendanceChanges(records) {
+  // Newest first, replacing any earlier row for the same student and session
+  const key = (r) => `${r.session_id}:${r.student_id}`
+  const seen = new Set()
+  liveAttendance = records
+    .slice()
+    .reverse()
+    .concat(liveAttendance)
+    .filter((r) => !seen.has(key(r)) && seen.add(key(r)))
+  displayLiveAttendance(liveAttendance)
+
+  // Reload the open student list (once per burst) if it belongs to a changed session
+  const sessionSelect = document.getElementById("manual-session-select")
+  if (sessionSelect && records.some((r) => String(r.session_id) === sessionSelect.value)) {
+    clearTimeout(studentListReload)
+    studentListReload = setTimeout(() => loadStudentList(), 1000)
+  }
+}
+
 function displayLiveAttendance(attendanceData) {
   const attendanceList = document.getElementById("attendance-list")
 
@@ -596,6 +679,8 @@ let refreshTimer = null;
 
 function startAutoRefresh(sessionId) {
   if (refreshTimer) clearInterval(refreshTimer);
+  // With the live stream open, changes to this session reload the list as they happen
+  if (attendanceStream) return;
   refreshTimer = setInterval(() => loadStudentList(), 30000); // Refresh every 30 seconds
 }
 
@@ -76,15 +76,15 @@ async function generateQRCode() {
     // Call teacher QR generation endpoint (include subject)
     const response = await axios.post(`/api/teacher/session/${sessionId}/generate_qr`, { subject });
 
-    const { qr_code, jwt, expires_in } = response.data;
+    const { qr_url, jwt, expires_in } = response.data;
 
-    // Display QR code (qr_code is a data URL from the API)
+    // Display QR code (qr_url serves a cached PNG of the token)
     const qrDisplay = document.getElementById("qr-display");
     const qrPlaceholder = document.getElementById("qr-placeholder");
     const qrInfo = document.getElementById("qr-info");
     const manualCode = document.getElementById("manual-code");
 
-    qrPlaceholder.innerHTML = `<img src="${qr_code}" alt="QR Code" class="w-48 h-48 mx-auto">`;
+    qrPlaceholder.innerHTML = `<img src="${qr_url}" alt="QR Code" class="w-48 h-48 mx-auto" style="image-rendering: pixelated">`;
     qrInfo.classList.remove("hidden");
 
     // Display and setup manual code
@@ -93,7 +93,7 @@ async function generateQRCode() {
 
     // Store current session info
     currentQRSession = {
-      qr_code,
+      qr_url,
       jwt,
       expires_at: new Date(Date.now() + expires_in * 1000),
     };
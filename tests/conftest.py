@@ -0,0 +1,29 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+from flask import Flask
+
+from extensions import db
+from session_registry import session_registry
+from roster_cache import roster_cache
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Bare app whose instance folder and SQLite database live under tmp_path.
+
+    Tests that need blueprints, extra config or seed data override this
+    fixture with one that takes app and registers them.
+    """
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + str(tmp_path / 'test.db')
+    app.config['SECRET_KEY'] = 'test-secret'
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        session_registry._clear()
+        roster_cache.invalidate()
+        yield app
+        db.session.remove()
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta, time as dtime
+import base64
+import io
+import json
+import numpy as np
+import pytest
+import pytz
+
+from extensions import db
+from models import User, Student, Teacher, Subject, Class, Timetable, AttendanceSession, Attendance, FaceEnrollmentJob
+from auth import generate_token
+from attendance_writer import AttendanceWriteQueue
+from face_index import FaceIndex, save_embeddings
+from recognition_cache import RecognitionCache
+# Imported outside any app context, as app.py's _try_register does
+import api.ai_routes as ai_routes
+
+JPEG = b'\xff\xd8\xff\xe0' + b'frame'
+
+
+@pytest.fixture
+def app(app, tmp_path, monkeypatch):
+    app.root_path = str(tmp_path)
+    app.config['ATTENDANCE_FLUSH_MS'] = 60000
+    app.register_blueprint(ai_routes.ai_bp, url_prefix='/api/ai')
+    monkeypatch.setattr(ai_routes, 'face_index', FaceIndex(check_interval=0))
+    monkeypatch.setattr(ai_routes, 'recognition_cache', RecognitionCache(ttl=10))
+    monkeypatch.setattr(ai_routes, 'attendance_writer', AttendanceWriteQueue())
+    yield app
+    ai_routes.attendance_writer.drain()
+
+
+@pytest.fixture
+def faces(monkeypatch):
+    """Stands in for the dlib pool: each frame holds the encodings queued in faces, in order"""
+    frames = []
+
+    def run(fn, images, all_faces, options):
+        found = [[((0, 10, 10, 0), np.asarray(encoding, dtype=np.float32)) for encoding in frames.pop(0)] for _ in images]
+        return {'faces': found, 'timings': {'decode_ms': 0.0}}
+
+    monkeypatch.setattr(ai_routes.face_pool, 'run', run)
+    return frames
+
+
+def _class_session(start_minutes=-1, day_offset=0):
+    now = datetime.now(pytz.timezone('Asia/Kolkata')).replace(tzinfo=None)
+    teacher_user = User(name='Teacher', email='t@example.com', role='teacher', is_active=True)
+    cls = Class(standard='10', division='A', academic_year='2026')
+    subject = Subject(name='Maths', code='M1')
+    db.session.add_all([teacher_user, cls, subject])
+    db.session.flush()
+    teacher = Teacher(user_id=teacher_user.id, employee_id='T1')
+    db.session.add(teacher)
+    db.session.flush()
+    timetable = Timetable(class_id=cls.id, subject_id=subject.id, teacher_id=teacher.id, day_of_week=0,
+                          start_time=dtime(9), end_time=dtime(10), room_number='101')
+    db.session.add(timetable)
+    db.session.flush()
+    start = now + timedelta(days=day_offset, minutes=start_minutes)
+    session = AttendanceSession(timetable_id=timetable.id, date=start.date(), start_time=start,
+                                end_time=start + timedelta(minutes=120), is_active=True)
+    db.session.add(session)
+    students = []
+    for roll in range(2):
+        user = User(name=f'Student {roll}', role='student', is_active=True)
+        db.session.add(user)
+        db.session.flush()
+        student = Student(user_id=user.id, roll_no=str(roll), division='A', standard='10')
+        db.session.add(student)
+        db.session.flush()
+        save_embeddings(student.id, [(1, np.full(128, roll, dtype=np.float32))])
+        students.append(student)
+    db.session.commit()
+    return teacher_user, session, students
+
+
+def test_register_face_accepts_multipart_and_queues_a_job(app, monkeypatch):
+    _, _, students = _class_session()
+    submitted = []
+    monkeypatch.setattr(ai_routes.enrollment_queue, 'submit', lambda app, job_id: submitted.append(job_id))
+
+    resp = app.test_client().post('/api/ai/register_face', data={
+        'student_id': str(students[0].id),
+        'images': [(io.BytesIO(JPEG), 'a.jpg'), (io.BytesIO(JPEG), 'b.jpg')]
+    }, content_type='multipart/form-data')
+    assert resp.status_code == 202
+    job = db.session.get(FaceEnrollmentJob, resp.get_json()['job_id'])
+    assert submitted == [job.id]
+    assert (job.status, job.total_images) == ('queued', 2)
+    # JPEG uploads are stored byte for byte
+    for path in json.loads(job.image_paths):
+        with open(f'{app.root_path}/{path}', 'rb') as f:
+            assert f.read() == JPEG
+
+    status = app.test_client().get(f'/api/ai/register_face/{job.id}').get_json()
+    assert status['status'] == 'queued'
+    assert app.test_client().post('/api/ai/register_face', data={'images': [(io.BytesIO(JPEG), 'a.jpg')]},
+                                  content_type='multipart/form-data').status_code == 400
+
+
+def test_recognize_face_marks_from_a_raw_body_and_answers_repeats(app, faces):
+    _, session, students = _class_session()
+    client = app.test_client()
+
+    faces.append([np.full(128, 1.0)])
+    resp = client.post(f'/api/ai/recognize_face?session_id={session.id}', data=JPEG, content_type='image/jpeg')
+    body = resp.get_json()
+    assert (body['match'], body['student_id'], body['attendance']) == (True, students[1].id, 'marked')
+
+    # The same frame again is answered from the frame cache without the pool, and is a repeat
+    body = client.post(f'/api/ai/recognize_face?session_id={session.id}', data=JPEG, content_type='image/jpeg').get_json()
+    assert (body['cache'], body['attendance']) == ('frame', 'already_marked')
+
+    # Legacy base64 JSON body
+    faces.append([np.full(128, 0.0)])
+    body = client.post('/api/ai/recognize_face', json={
+        'session_id': session.id, 'image': 'data:image/jpeg;base64,' + base64.b64encode(b'other').decode()
+    }).get_json()
+    assert (body['student_id'], body['attendance']) == (students[0].id, 'marked')
+
+    assert ai_routes.attendance_writer.flush() == 2
+    assert Attendance.query.filter_by(session_id=session.id).count() == 2
+
+
+@pytest.mark.parametrize('start_minutes, day_offset', [(-1, -1), (-180, 0), (60, 0)])
+def test_bound_session_outside_its_window_takes_no_marks(app, faces, start_minutes, day_offset):
+    _, session, _ = _class_session(start_minutes, day_offset)
+
+    resp = app.test_client().post(f'/api/ai/recognize_face?session_id={session.id}', data=JPEG, content_type='image/jpeg')
+    assert resp.status_code == 404
+    assert ai_routes.attendance_writer.pending() == 0
+
+
+def test_room_and_class_lookups_find_the_running_session(app, faces):
+    _, session, students = _class_session()
+    client = app.test_client()
+
+    faces.append([np.full(128, 0.0)])
+    body = client.post('/api/ai/recognize_face?room=101', data=JPEG, content_type='image/jpeg').get_json()
+    assert (body['session_id'], body['attendance']) == (session.id, 'marked')
+    # Unbound: the session is found from the matched student's class
+    faces.append([np.full(128, 1.0)])
+    body = client.post('/api/ai/recognize_face', data=b'\xff\xd8other', content_type='image/jpeg').get_json()
+    assert (body['student_id'], body['session_id'], body['attendance']) == (students[1].id, session.id, 'marked')
+
+
+def test_recognize_faces_marks_every_matched_face(app, faces):
+    teacher_user, session, students = _class_session()
+    headers = {'Authorization': 'Bearer ' + generate_token(teacher_user.id, teacher_user)}
+
+    faces.append([np.full(128, 0.0), np.full(128, 1.0), np.full(128, 9.0)])
+    resp = app.test_client().post('/api/ai/recognize_faces', headers=headers, data={
+        'session_id': str(session.id), 'images': [(io.BytesIO(JPEG), 'class.jpg')]
+    }, content_type='multipart/form-data')
+    body = resp.get_json()
+    assert (body['faces_detected'], body['marked'], len(body['unmatched'])) == (3, 2, 1)
+    assert sorted(r['student_id'] for r in body['results']) == [s.id for s in students]
+
+    faces.append([np.full(128, 0.0)])
+    body = app.test_client().post('/api/ai/recognize_faces', headers=headers, data={
+        'session_id': str(session.id), 'images': [(io.BytesIO(JPEG), 'class.jpg')]
+    }, content_type='multipart/form-data').get_json()
+    assert [r['attendance'] for r in body['results']] == ['already_marked']
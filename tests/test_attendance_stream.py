@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta, time as dtime
+import json
+import time
+import pytest
+import pytz
+
+from extensions import db
+from models import User, Student, Teacher, Subject, Class, Timetable, AttendanceSession
+from auth import generate_token
+from api.teacher_routes import teacher_bp
+from attendance_events import attendance_events
+from roster_cache import RosterCache
+import api.teacher_routes as teacher_routes
+import session_counters
+
+
+@pytest.fixture
+def app(app, monkeypatch):
+    app.config.update(ATTENDANCE_STREAM_POLL=0.01, ATTENDANCE_STREAM_MAX_SECONDS=0.2)
+    app.register_blueprint(teacher_bp)
+    monkeypatch.setattr(teacher_routes, 'roster_cache', RosterCache())
+    return app
+
+
+def _session_for(teacher_name, standard):
+    user = User(name=teacher_name, email=f'{teacher_name}@example.com', role='teacher', is_active=True)
+    cls = Class(standard=standard, division='A', academic_year='2026')
+    subject = Subject(name=f'Subject {standard}', code=f'S{standard}')
+    db.session.add_all([user, cls, subject])
+    db.session.flush()
+    teacher = Teacher(user_id=user.id, employee_id=teacher_name)
+    db.session.add(teacher)
+    db.session.flush()
+    timetable = Timetable(class_id=cls.id, subject_id=subject.id, teacher_id=teacher.id, day_of_week=0,
+                          start_time=dtime(9), end_time=dtime(10))
+    db.session.add(timetable)
+    db.session.flush()
+    session = AttendanceSession(timetable_id=timetable.id, date=datetime.now(pytz.timezone('Asia/Kolkata')).date(),
+                                start_time=datetime.now())
+    student_user = User(name=f'Student {standard}', role='student', is_active=True)
+    db.session.add_all([session, student_user])
+    db.session.flush()
+    student = Student(user_id=student_user.id, roll_no='1', division='A', standard=standard)
+    db.session.add(student)
+    db.session.commit()
+    return user, session.id, student.id
+
+
+def test_stream_sends_only_changes_in_the_teachers_sessions(app):
+    user, session_id, student_id = _session_for('mine', '10')
+    _, other_session_id, other_student_id = _session_for('other', '11')
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + generate_token(user.id, user)}
+    cursor = client.get('/api/teacher/attendance/live', headers=headers).get_json()['cursor']
+
+    now = datetime.utcnow()
+    attendance_events.publish([
+        {'session_id': other_session_id, 'student_id': other_student_id, 'status': 'present', 'marked_by': 'qr', 'marked_at': now},
+        {'session_id': session_id, 'student_id': student_id, 'status': 'late', 'marked_by': 'teacher', 'marked_at': now}
+    ])
+    body = client.get(f'/api/teacher/attendance/stream?cursor={cursor}', headers=headers).get_data(as_text=True)
+
+    events = [block for block in body.split('\n\n') if 'event: attendance' in block]
+    assert len(events) == 1
+    records = json.loads(events[0].split('data: ', 1)[1])
+    assert [(r['student_name'], r['status'], r['class_name']) for r in records] == [('Student 10', 'late', '10-A')]
+    # The event id is a cursor past both lines, so a reconnect does not replay them
+    event_id = events[0].split('id: ', 1)[1].split('\n', 1)[0]
+    assert attendance_events.read(event_id) == ([], event_id)
+
+    assert client.get(f'/api/teacher/attendance/stream?session_id={other_session_id}', headers=headers).status_code == 404
+
+
+def test_stream_closes_at_its_cap(app):
+    user, _, _ = _session_for('mine', '10')
+    headers = {'Authorization': 'Bearer ' + generate_token(user.id, user)}
+
+    started = time.monotonic()
+    body = app.test_client().get('/api/teacher/attendance/stream', headers=headers).get_data(as_text=True)
+    assert time.monotonic() - started < 5
+    assert body.startswith('retry: ')
+    # The closing event carries the cursor the reconnect resumes from
+    assert body.rstrip().endswith('event: closed\ndata: {}')
+    assert f'id: {attendance_events.cursor()}' in body
+
+
+def test_live_polls_return_deltas_and_304_when_unchanged(app):
+    from models import Attendance
+    user, session_id, student_id = _session_for('mine', '10')
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + generate_token(user.id, user)}
+
+    first = client.get('/api/teacher/attendance/live', headers=headers)
+    assert first.get_json()['attendance'] == []
+    etag = first.headers['ETag']
+    again = client.get('/api/teacher/attendance/live', headers=dict(headers, **{'If-None-Match': etag}))
+    assert again.status_code == 304 and again.data == b''
+
+    row = Attendance(student_id=student_id, session_id=session_id, status='present', marked_at=datetime.utcnow())
+    db.session.add(row)
+    session_counters.record([(session_id, student_id, None, 'present')])
+    db.session.commit()
+    attendance_events.publish([row])
+    since = first.get_json()['since']
+    delta = client.get(f'/api/teacher/attendance/live?since={since}', headers=dict(headers, **{'If-None-Match': etag}))
+    assert delta.status_code == 200
+    assert [r['student_id'] for r in delta.get_json()['attendance']] == [student_id]
+
+    students = client.get(f'/api/teacher/session/{session_id}/students?since={delta.get_json()["since"]}', headers=headers).get_json()
+    assert students['partial'] and students['class_info']['stats']['present'] == 1
+
+
+def test_deleting_a_session_changes_the_poll_etag(app):
+    user, session_id, _ = _session_for('mine', '10')
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + generate_token(user.id, user)}
+    etag = client.get('/api/teacher/attendance/live', headers=headers).headers['ETag']
+
+    assert client.delete(f'/api/teacher/delete_session/{session_id}', headers=headers).status_code == 200
+    assert client.get('/api/teacher/attendance/live', headers=dict(headers, **{'If-None-Match': etag})).status_code == 200
+
+
+def test_delta_polls_pick_up_rows_committed_long_after_their_marked_at(app):
+    from models import Attendance
+    user, session_id, student_id = _session_for('mine', '10')
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + generate_token(user.id, user)}
+    since = client.get('/api/teacher/attendance/live', headers=headers).get_json()['since']
+
+    # A replayed journal row keeps the marked_at of the scan, well before the cursor was issued
+    row = Attendance(student_id=student_id, session_id=session_id, status='present',
+                     marked_at=datetime.utcnow() - timedelta(hours=1))
+    db.session.add(row)
+    session_counters.record([(session_id, student_id, None, 'present')])
+    db.session.commit()
+    attendance_events.publish([row])
+
+    delta = client.get(f'/api/teacher/attendance/live?since={since}', headers=headers).get_json()
+    assert [r['student_id'] for r in delta['attendance']] == [student_id]
+    students = client.get(f'/api/teacher/session/{session_id}/students?since={since}', headers=headers).get_json()
+    assert [s['id'] for s in students['students']] == [student_id]
+    # Nothing new after the returned cursor
+    assert client.get(f'/api/teacher/attendance/live?since={delta["since"]}', headers=headers).get_json()['attendance'] == []
+    assert client.get('/api/teacher/attendance/live?since=2026-01-01T00:00:00', headers=headers).status_code == 400
@@ -0,0 +1,104 @@
+import os
+import json
+import pytest
+
+from extensions import db
+from models import Attendance
+from attendance_writer import AttendanceWriteQueue
+from session_registry import SessionTokenRegistry
+
+
+@pytest.fixture
+def app(app):
+    app.config['ATTENDANCE_FLUSH_MS'] = 60000
+    return app
+
+
+def test_repeat_marks_are_rejected_and_batched_into_one_insert(app):
+    writer = AttendanceWriteQueue()
+    db.session.add(Attendance(student_id=3, session_id=1, status='present'))
+    db.session.commit()
+
+    assert writer.enqueue(1, 1, marked_by='qr') is not None
+    assert writer.enqueue(2, 1, marked_by='qr') is not None
+    assert writer.enqueue(1, 1, marked_by='qr') is None
+    # Seeded from the table the first time the session was seen
+    assert writer.enqueue(3, 1, marked_by='qr') is None
+    assert writer.pending() == 2
+
+    assert writer.flush() == 2
+    assert Attendance.query.filter_by(session_id=1).count() == 3
+    writer.drain()
+    assert not os.path.exists(writer._journal_path)
+
+
+def test_rows_already_stored_by_another_writer_are_skipped(app):
+    writer = AttendanceWriteQueue()
+    writer.enqueue(5, 2, marked_by='face')
+    db.session.add(Attendance(student_id=5, session_id=2, status='present', marked_by='teacher'))
+    db.session.commit()
+
+    assert writer.flush() == 0
+    assert Attendance.query.filter_by(session_id=2).one().marked_by == 'teacher'
+    writer.drain()
+
+
+def test_teacher_save_in_another_worker_is_not_acknowledged(app):
+    writer = AttendanceWriteQueue()
+    assert writer.enqueue(1, 6) is not None
+    db.session.add(Attendance(student_id=2, session_id=6, status='absent', marked_by='teacher'))
+    db.session.commit()
+    SessionTokenRegistry().mark(6, [2])
+
+    assert writer.enqueue(2, 6) is None
+    # The reseed keeps marks that are queued but not stored yet
+    assert writer.enqueue(1, 6) is None
+    writer.drain()
+    assert Attendance.query.filter_by(student_id=2, session_id=6).one().status == 'absent'
+
+
+def test_failed_journal_write_releases_the_claim(app, monkeypatch):
+    writer = AttendanceWriteQueue()
+    writer.enqueue(1, 7)
+    monkeypatch.setattr(writer, '_append', lambda rows: (_ for _ in ()).throw(OSError('disk full')))
+    with pytest.raises(OSError):
+        writer.enqueue(2, 7)
+    monkeypatch.undo()
+
+    assert writer.enqueue(2, 7) is not None
+    writer.drain()
+    assert Attendance.query.filter_by(session_id=7).count() == 2
+
+
+def test_poison_row_is_dead_lettered_after_retries(app, tmp_path):
+    app.config['ATTENDANCE_FLUSH_RETRIES'] = 2
+    writer = AttendanceWriteQueue()
+    writer.enqueue(1, 8)
+    # NOT NULL violation: fails the batch on every attempt
+    writer.enqueue(None, 8)
+
+    with pytest.raises(RuntimeError):
+        writer.flush()
+    assert writer.pending() == 2
+    assert writer.flush() == 1
+    assert writer.pending() == 0
+
+    dead = [json.loads(line) for line in (tmp_path / writer.DEAD_LETTER_FILE).read_text().splitlines()]
+    assert [row['student_id'] for row in dead] == [None]
+    assert writer.enqueue(2, 8) is not None
+    writer.drain()
+    assert sorted(a.student_id for a in Attendance.query.filter_by(session_id=8)) == [1, 2]
+
+
+def test_journal_of_a_dead_worker_is_replayed(app, tmp_path):
+    orphan = tmp_path / 'attendance_queue.999999999.jsonl'
+    row = {'student_id': 7, 'session_id': 4, 'status': 'present', 'marked_by': 'qr',
+           'subject': None, 'confidence_score': None, 'marked_at': '2025-01-01T09:00:00'}
+    orphan.write_text(json.dumps(row) + '\n{"student_id": 8, "sess')
+
+    writer = AttendanceWriteQueue()
+    writer.enqueue(9, 4)
+    writer.drain()
+
+    assert not orphan.exists()
+    assert sorted(a.student_id for a in Attendance.query.filter_by(session_id=4)) == [7, 9]
@@ -0,0 +1,128 @@
+import pytest
+from flask import jsonify
+from sqlalchemy import event
+from datetime import timedelta
+import time
+
+from extensions import db
+from models import User, Student
+from auth import token_required, generate_token
+from auth_cache import AuthCache
+import auth
+
+
+@pytest.fixture
+def app(app, monkeypatch):
+    monkeypatch.setattr(auth, 'auth_cache', AuthCache())
+
+    @app.route('/me')
+    @token_required
+    def me(current_user):
+        return jsonify({'role': current_user.role, 'standard': current_user.student.standard})
+
+    user = User(name='Asha', role='student', is_active=True)
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Student(user_id=user.id, roll_no='1', division='A', standard='10'))
+    db.session.commit()
+    return app
+
+
+def _count_queries(app):
+    counter = {'n': 0}
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args, **kwargs: counter.__setitem__('n', counter['n'] + 1))
+    return counter
+
+
+def test_claims_token_is_served_from_cache_without_queries(app):
+    user = User.query.first()
+    token = generate_token(user.id, user)
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    assert client.get('/me', headers=headers).get_json() == {'role': 'student', 'standard': '10'}
+    queries = _count_queries(app)
+    assert client.get('/me', headers=headers).status_code == 200
+    assert queries['n'] == 0
+
+
+def test_revocation_rejects_issued_tokens_in_every_worker(app):
+    user = User.query.first()
+    token = generate_token(user.id, user)
+    client = app.test_client()
+    assert client.get('/me', headers={'Authorization': f'Bearer {token}'}).status_code == 200
+
+    auth.auth_cache.revoke(user.id)
+    assert client.get('/me', headers={'Authorization': f'Bearer {token}'}).status_code == 401
+
+    # Another worker sees the same log
+    other = AuthCache()
+    assert other.is_revoked(user.id, 0)
+
+
+def test_login_in_the_same_second_as_a_revocation_is_accepted(app, monkeypatch):
+    user = User.query.first()
+    clock = {'now': float(int(time.time())) + 0.3}
+    with monkeypatch.context() as m:
+        m.setattr(time, 'time', lambda: clock['now'])
+        old_token = generate_token(user.id, user)
+        clock['now'] += 0.1
+        auth.auth_cache.revoke(user.id)
+        clock['now'] += 0.1
+        new_token = generate_token(user.id, user)
+
+    client = app.test_client()
+    assert client.get('/me', headers={'Authorization': f'Bearer {old_token}'}).status_code == 401
+    assert client.get('/me', headers={'Authorization': f'Bearer {new_token}'}).status_code == 200
+
+
+def test_verify_is_cached_until_the_user_is_invalidated(app, monkeypatch):
+    from api import auth_routes
+    monkeypatch.setattr(auth_routes, 'auth_cache', auth.auth_cache)
+    app.register_blueprint(auth_routes.auth_bp)
+    client = app.test_client()
+    user = User.query.first()
+    headers = {'Authorization': 'Bearer ' + generate_token(user.id, user)}
+
+    assert client.get('/api/auth/verify', headers=headers).get_json()['valid']
+    queries = _count_queries(app)
+    resp = client.get('/api/auth/verify', headers=headers)
+    assert resp.get_json() == {'valid': True, 'user_id': user.id, 'role': 'student'}
+    assert queries['n'] == 0
+    assert 'Set-Cookie' not in resp.headers
+
+    auth.auth_cache.revoke(user.id)
+    assert client.get('/api/auth/verify', headers=headers).status_code == 401
+
+
+def test_login_session_is_rewritten_only_near_expiry(app):
+    app.config.update(SESSION_REFRESH_EACH_REQUEST=False, PERMANENT_SESSION_LIFETIME=timedelta(days=1))
+    app.before_request(auth.refresh_login_session)
+
+    @app.route('/login-as/<int:user_id>')
+    def login_as(user_id):
+        user = db.session.get(User, user_id)
+        auth.start_login_session(user, generate_token(user.id, user))
+        return ''
+
+    @app.route('/me/stream')
+    @token_required(allow_cookie=True)
+    def me_stream(current_user):
+        return ''
+
+    client = app.test_client()
+    user = User.query.first()
+    assert 'Set-Cookie' in client.get(f'/login-as/{user.id}').headers
+    # Only views that opt in accept the cookie in place of the Authorization header
+    assert client.get('/me').status_code == 401
+    assert 'Set-Cookie' not in client.get('/me/stream').headers
+
+    with client.session_transaction() as sess:
+        sess['refreshed_at'] -= 20 * 3600
+        stale = sess['refreshed_at']
+    resp = client.get('/me/stream')
+    assert resp.status_code == 200
+    assert 'Set-Cookie' in resp.headers
+    with client.session_transaction() as sess:
+        assert sess['refreshed_at'] > stale
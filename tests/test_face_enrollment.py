@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+import json
+
+from extensions import db
+from models import User, Student, FaceEnrollmentJob
+from face_enrollment import EnrollmentQueue
+
+
+def _job(job_id, status, age, errors=None):
+    user = User(name=f'Student {job_id}', role='student', is_active=True)
+    db.session.add(user)
+    db.session.flush()
+    student = Student(user_id=user.id, roll_no=job_id, division='A', standard='10')
+    db.session.add(student)
+    db.session.flush()
+    db.session.add(FaceEnrollmentJob(id=job_id, student_id=student.id, status=status, image_paths='[]',
+                                     total_images=1, processed_images=1, errors=errors,
+                                     created_at=datetime.utcnow() - timedelta(seconds=age)))
+    db.session.commit()
+
+
+def test_jobs_orphaned_by_a_restart_are_requeued_once(app):
+    app.config['FACE_ENROLLMENT_STALE_SECONDS'] = 60
+    _job('running', 'running', 120)
+    _job('queued', 'queued', 120)
+    _job('fresh', 'queued', 5)
+    _job('done', 'completed', 120)
+    _job('again', 'running', 120, errors=json.dumps([{'image': None, 'error': EnrollmentQueue.INTERRUPTED}]))
+
+    queue = EnrollmentQueue()
+    submitted = []
+    queue.submit = lambda app, job_id: submitted.append(job_id)
+    assert sorted(queue.recover(app)) == ['queued', 'running']
+    assert sorted(submitted) == ['queued', 'running']
+
+    db.session.expire_all()
+    statuses = {job.id: job.status for job in FaceEnrollmentJob.query}
+    assert statuses == {'running': 'queued', 'queued': 'queued', 'fresh': 'queued', 'done': 'completed', 'again': 'failed'}
+    assert db.session.get(FaceEnrollmentJob, 'running').processed_images == 0
+    assert db.session.get(FaceEnrollmentJob, 'again').finished_at is not None
+
+    # The requeued jobs are fresh again, so a second worker starting up leaves them alone
+    assert EnrollmentQueue().recover(app) == []
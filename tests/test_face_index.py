@@ -0,0 +1,103 @@
+import numpy as np
+
+from extensions import db
+from models import User, Student
+from face_index import FaceIndex, to_blob, from_blobs, save_embeddings
+from roster_cache import roster_cache
+
+
+def _index():
+    index = FaceIndex(dim=4)
+    # Pretend the index was already loaded and the table never changes, so no database is needed
+    index._loaded = True
+    index._read_version = lambda: f'{len(index)}:'
+    index._read_roster_epoch = lambda: None
+    index.version = index._read_version()
+    return index
+
+
+def _enroll(index, student_id, *encodings, standard=None, division=None):
+    index.replace(student_id, list(enumerate(encodings, start=1)), standard, division)
+
+
+def test_match_returns_closest_within_tolerance():
+    index = _index()
+    _enroll(index, 1, [0.0, 0.0, 0.0, 0.0])
+    _enroll(index, 2, [1.0, 0.0, 0.0, 0.0])
+
+    student_id, distance, _ = index.match([0.9, 0.0, 0.0, 0.0], tolerance=0.5)
+    assert student_id == 2
+    assert abs(distance - 0.1) < 1e-6
+    assert index.match([5.0, 5.0, 5.0, 5.0], tolerance=0.5) is None
+
+
+def test_replace_swaps_all_rows_for_student():
+    index = _index()
+    _enroll(index, 1, [0.0, 0.0, 0.0, 0.0])
+    _enroll(index, 1, [3.0, 0.0, 0.0, 0.0])
+
+    assert len(index) == 1
+    assert index.match([3.0, 0.0, 0.0, 0.0])[0] == 1
+    assert index.match([0.0, 0.0, 0.0, 0.0]) is None
+
+
+def test_class_scoped_match_ignores_other_classes():
+    index = _index()
+    _enroll(index, 1, [0.0, 0.0, 0.0, 0.0], standard='10', division='A')
+    _enroll(index, 2, [0.1, 0.0, 0.0, 0.0], standard='10', division='B')
+
+    assert index.match([0.1, 0.0, 0.0, 0.0])[0] == 2
+    assert index.match([0.1, 0.0, 0.0, 0.0], standard='10', division='A')[0] == 1
+    assert index.match([0.1, 0.0, 0.0, 0.0], standard='9', division='A') is None
+
+
+def test_match_many_matches_each_face():
+    index = _index()
+    _enroll(index, 1, [0.0, 0.0, 0.0, 0.0], standard='10', division='A')
+    _enroll(index, 2, [1.0, 0.0, 0.0, 0.0], standard='10', division='A')
+
+    results = index.match_many([[0.95, 0.0, 0.0, 0.0], [0.0, 0.05, 0.0, 0.0], [4.0, 4.0, 0.0, 0.0]],
+                               standard='10', division='A')
+    assert [r[0] if r else None for r in results] == [2, 1, None]
+    assert abs(results[0][1] - 0.05) < 1e-4
+
+
+def test_nearest_of_k_reports_matched_image():
+    index = _index()
+    _enroll(index, 1, [0.0, 0.0, 0.0, 0.0], [2.0, 0.0, 0.0, 0.0], [0.0, 2.0, 0.0, 0.0])
+    _enroll(index, 2, [1.0, 1.0, 1.0, 1.0])
+
+    # The mean of student 1's images is far away, but the second image is close
+    assert index.match([1.9, 0.0, 0.0, 0.0], tolerance=0.5)[0::2] == (1, 2)
+    assert index.match_many([[0.0, 1.9, 0.0, 0.0]])[0][0::2] == (1, 3)
+    assert len(index) == 4
+
+
+def test_moving_a_student_updates_class_scoped_matches(app):
+    students = []
+    for division in ('A', 'B'):
+        user = User(name=f'Student {division}', role='student', is_active=True)
+        db.session.add(user)
+        db.session.flush()
+        students.append(Student(user_id=user.id, roll_no=division, division=division, standard='10'))
+    db.session.add_all(students)
+    db.session.flush()
+    for offset, student in enumerate(students):
+        save_embeddings(student.id, [(1, np.full(128, offset, dtype=np.float32))])
+    db.session.commit()
+    index = FaceIndex(check_interval=0)
+    moved_face = np.zeros(128, dtype=np.float32)
+    assert index.match(moved_face, standard='10', division='A')[0] == students[0].id
+
+    students[0].division = 'B'
+    db.session.commit()
+    roster_cache.invalidate()
+    assert index.match(moved_face, standard='10', division='A') is None
+    assert index.match(moved_face, standard='10', division='B')[0] == students[0].id
+
+
+def test_blob_round_trip():
+    vectors = np.random.rand(3, 128).astype(np.float32)
+    matrix = from_blobs([to_blob(v) for v in vectors])
+    assert matrix.shape == (3, 128)
+    assert np.array_equal(matrix, vectors)
@@ -0,0 +1,43 @@
+import itertools
+from datetime import datetime, timedelta
+import pytz
+
+from extensions import db
+from models import AttendanceSession
+import manual_codes
+
+TODAY = datetime.now(pytz.timezone('Asia/Kolkata')).date()
+
+
+def _session(code=None, is_active=True, day=None):
+    session = AttendanceSession(timetable_id=1, date=day or TODAY, start_time=datetime.now(),
+                                is_active=is_active, manual_code=code)
+    db.session.add(session)
+    db.session.commit()
+    return session
+
+
+def test_open_codes_are_skipped_and_closed_ones_recycled(app, monkeypatch):
+    open_session = _session('AAAAAA')
+    closed_session = _session('BBBBBB', is_active=False)
+    past_session = _session('CCCCCC', day=TODAY - timedelta(days=2))
+    new_session = _session()
+    new_session.qr_subject = 'Maths'
+
+    letters = itertools.chain('A' * 6, 'B' * 6, 'C' * 6)
+    monkeypatch.setattr(manual_codes.secrets, 'choice', lambda alphabet: next(letters))
+
+    assert manual_codes.assign_manual_code(new_session) == 'BBBBBB'
+    db.session.commit()
+    assert closed_session.manual_code is None
+    assert open_session.manual_code == 'AAAAAA'
+    assert past_session.manual_code == 'CCCCCC'
+    # Pending changes made before allocation survive the savepoint
+    assert AttendanceSession.query.get(new_session.id).qr_subject == 'Maths'
+
+
+def test_codes_use_the_unambiguous_alphabet(app):
+    code = manual_codes.assign_manual_code(_session())
+    assert len(code) == manual_codes.CODE_LENGTH
+    assert set(code) <= set(manual_codes.ALPHABET)
+    assert manual_codes.normalize(f' {code.lower()} ') == code
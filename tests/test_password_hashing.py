@@ -0,0 +1,53 @@
+import threading
+import time
+import pytest
+from flask import Flask
+
+from models import User
+from password_hashing import LoginPool, LoginPoolBusy, needs_rehash
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    with app.app_context():
+        yield app
+
+
+def test_login_upgrades_hash_when_parameters_change(app):
+    user = User(name='Asha', role='student')
+    user.set_password('secret')
+    assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+    pool = LoginPool()
+
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    assert needs_rehash(user.password_hash)
+    assert not pool.verify(user, 'wrong')
+    assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+    assert pool.verify(user, 'secret')
+    assert user.password_hash.startswith('pbkdf2:sha256:2000$')
+    assert pool.verify(user, 'secret')
+
+    stats = pool.stats()
+    assert (stats['logins'], stats['failures'], stats['rehashed']) == (3, 1, 1)
+    assert 'hash_ms_p95' in stats
+    pool.shutdown()
+
+
+def test_full_pool_rejects_instead_of_queueing(app):
+    app.config.update(LOGIN_POOL_WORKERS=1, LOGIN_POOL_QUEUE_LIMIT=1)
+    pool = LoginPool()
+    release = threading.Event()
+    blocker = threading.Thread(target=pool.run, args=(release.wait,))
+    pool._start()
+    blocker.start()
+    while pool._slots._value:
+        time.sleep(0.01)
+
+    with pytest.raises(LoginPoolBusy):
+        pool.run(lambda: None)
+    release.set()
+    blocker.join()
+    assert pool.run(lambda: 42) == 42
+    pool.shutdown()
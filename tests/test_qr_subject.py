@@ -2,55 +2,53 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import pytest
+import time
 from datetime import datetime, date
 
-from app import app, db
+from extensions import db
 from models import User, Teacher, Timetable, Class, Subject, AttendanceSession
 from auth import generate_token
+from api.teacher_routes import teacher_bp
+from api.attendance_routes import attendance_bp
+from session_registry import session_registry
+import qr_tokens
 import jwt as pyjwt
 
 
 @pytest.fixture
-def client():
-    # Use the existing application DB (do not re-init the SQLAlchemy instance)
+def client(app):
     app.config['TESTING'] = True
-    app.config['SECRET_KEY'] = 'test-secret'
+    app.register_blueprint(teacher_bp)
+    app.register_blueprint(attendance_bp)
 
-    with app.app_context():
-        db.create_all()
-
-        # Create minimal data: class, subject, teacher, timetable and attendance session
-        cls = Class(standard='10', division='A', academic_year='2025')
-        db.session.add(cls)
-        subj = Subject(name='Maths', code='MATH')
-        db.session.add(subj)
-        db.session.commit()
-
-        user = User(name='Teacher One', role='teacher', email='t1@example.com')
-        user.set_password('password')
-        db.session.add(user)
-        db.session.flush()
-        teacher = Teacher(user_id=user.id, employee_id='T100')
-        db.session.add(teacher)
-        db.session.commit()
+    # Create minimal data: class, subject, teacher, timetable and attendance session
+    cls = Class(standard='10', division='A', academic_year='2025')
+    db.session.add(cls)
+    subj = Subject(name='Maths', code='MATH')
+    db.session.add(subj)
+    db.session.commit()
 
-        tt = Timetable(class_id=cls.id, subject_id=subj.id, teacher_id=teacher.id, day_of_week=0, start_time=datetime.now().time(), end_time=datetime.now().time())
-        db.session.add(tt)
-        db.session.commit()
+    user = User(name='Teacher One', role='teacher', email='t1@example.com')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    teacher = Teacher(user_id=user.id, employee_id='T100')
+    db.session.add(teacher)
+    db.session.commit()
 
-        # Create an attendance session so teacher endpoint can find it
-        session = AttendanceSession(timetable_id=tt.id, date=date.today(), start_time=datetime.now(), attendance_method='qr')
-        db.session.add(session)
-        db.session.commit()
+    tt = Timetable(class_id=cls.id, subject_id=subj.id, teacher_id=teacher.id, day_of_week=0, start_time=datetime.now().time(), end_time=datetime.now().time())
+    db.session.add(tt)
+    db.session.commit()
 
-        client = app.test_client()
-        yield client
+    # Create an attendance session so teacher endpoint can find it
+    session = AttendanceSession(timetable_id=tt.id, date=date.today(), start_time=datetime.now(), attendance_method='qr')
+    db.session.add(session)
+    db.session.commit()
 
-        db.session.remove()
-        db.drop_all()
+    return app.test_client()
 
 
-def test_generate_qr_includes_subject(client):
+def test_generate_qr_includes_subject(app, client):
     # Call the underlying view function directly inside a request context so we don't
     # rely on blueprint registration during tests.
     from api.teacher_routes import generate_session_qr
@@ -81,9 +79,59 @@ def test_generate_qr_includes_subject(client):
                 data = resp
 
         assert isinstance(data, dict)
-        assert 'qr_code' in data
+        assert data['qr_url'].startswith('/api/attendance/qr/')
         assert 'jwt' in data
 
-        decoded = pyjwt.decode(data['jwt'], app.config['SECRET_KEY'], algorithms=['HS256'])
-        assert decoded.get('subject') == 'Science'
-        assert decoded.get('session_id') == session.id
+        # The rotating frame validates against the session's secret and carries its subject
+        entry = session_registry.by_session(session.id)
+        assert qr_tokens.parse(data['qr_token'])[0] == session.id
+        assert qr_tokens.verify(entry['secret'], data['qr_token'])
+        assert entry['subject'] == 'Science'
+        assert AttendanceSession.query.get(session.id).qr_subject == 'Science'
+
+
+def test_qr_image_endpoint_serves_cached_png(app, client):
+    token = pyjwt.encode({'session_id': 1, 'jti': 'abc', 'exp': int(time.time()) + 60},
+                         app.config['SECRET_KEY'], algorithm='HS256')
+
+    resp = client.get(f'/api/attendance/qr/{token}')
+    assert resp.status_code == 200
+    assert resp.mimetype == 'image/png'
+    assert resp.data.startswith(b'\x89PNG')
+
+    etag = resp.headers['ETag']
+    assert client.get(f'/api/attendance/qr/{token}', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(f'/api/attendance/qr/{token}?format=svg').mimetype == 'image/svg+xml'
+    assert client.get('/api/attendance/qr/not-a-token').status_code == 404
+
+
+def test_rotating_tokens_expire_outside_the_window(app):
+    with app.app_context():
+        secret = qr_tokens.session_secret(5, 'jti-1')
+        now = 1_000_000.0
+        step = qr_tokens.current_step(now)
+        token = qr_tokens.token_for(secret, 5, step)
+
+        assert qr_tokens.verify(secret, token, now + qr_tokens.step_seconds())
+        assert not qr_tokens.verify(secret, token, now + 2 * qr_tokens.step_seconds())
+        assert not qr_tokens.verify(qr_tokens.session_secret(5, 'jti-2'), token, now)
+        assert qr_tokens.parse('a.b.c') is None
+
+
+def test_qr_stream_ends_at_its_cap(app, client):
+    app.config['QR_STREAM_MAX_SECONDS'] = 0.3
+    teacher = User.query.filter_by(role='teacher').first()
+    session = AttendanceSession.query.first()
+    session.qr_token = 'jti-stream'
+    db.session.commit()
+    session_registry.publish(session)
+
+    started = time.monotonic()
+    resp = client.get(f'/api/teacher/session/{session.id}/qr_stream',
+                      headers={'Authorization': f'Bearer {generate_token(teacher.id, teacher)}'})
+    body = resp.get_data(as_text=True)
+    assert time.monotonic() - started < 5
+    assert body.startswith('retry: ')
+    # A second frame only if the QR step rolled over inside the cap
+    assert 1 <= body.count('event: frame') <= 2
+    assert 'event: closed' not in body
@@ -0,0 +1,46 @@
+import io
+import numpy as np
+from PIL import Image
+
+from recognition_cache import RecognitionCache, frame_hash
+
+
+def _jpeg(face_seed, background_seed=0):
+    """A flat-ish background with a small "face" patch in the middle, as a kiosk frame looks"""
+    pixels = np.kron(np.random.default_rng(background_seed).integers(0, 255, (8, 8, 3)), np.ones((40, 40, 1)))
+    pixels[140:180, 140:180] = np.random.default_rng(face_seed).integers(0, 255, (40, 40, 3))
+    buf = io.BytesIO()
+    Image.fromarray(pixels.astype(np.uint8)).save(buf, format='JPEG')
+    return buf.getvalue()
+
+
+def test_frame_tier_reuses_match_only_for_the_same_frame():
+    cache = RecognitionCache(ttl=10)
+    frame = _jpeg(1)
+    cache.store(7, frame_hash(frame), np.zeros(128), (42, 0.3, 1))
+
+    assert cache.lookup_frame(7, frame_hash(frame)) == (42, 0.3, 1)
+    assert cache.lookup_frame(8, frame_hash(frame)) is None
+    assert cache.stats()['frame_hits'] == 1
+
+
+def test_frame_tier_misses_another_face_over_the_same_background():
+    cache = RecognitionCache(ttl=10)
+    cache.store(7, frame_hash(_jpeg(1)), np.zeros(128), (42, 0.3, 1))
+
+    # Both frames are almost all background, so only the face tells them apart
+    assert cache.lookup_frame(7, frame_hash(_jpeg(2))) is None
+
+
+def test_embedding_tier_and_expiry():
+    cache = RecognitionCache(ttl=10, embedding_distance=0.15)
+    cache.store(None, None, np.zeros(128), (5, 0.2, 2))
+
+    assert cache.lookup_embedding(None, np.full(128, 0.01)) == (5, 0.2, 2)
+    assert cache.lookup_embedding(None, np.full(128, 0.5)) is None
+
+    cache.ttl = -1
+    cache.store(None, None, np.ones(128), (6, 0.2, 1))
+    assert cache.lookup_embedding(None, np.ones(128)) is None
+    assert cache.stats()['misses'] == 2
+
@@ -0,0 +1,33 @@
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+from models import User, Student
+from roster_cache import RosterCache
+
+
+@pytest.fixture
+def app(app):
+    for roll, name in (('2', 'Bina'), ('1', 'Asha')):
+        user = User(name=name, role='student', is_active=True)
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Student(user_id=user.id, roll_no=roll, division='A', standard='10'))
+    db.session.commit()
+    return app
+
+
+def test_roster_is_cached_until_any_worker_invalidates(app):
+    cache, other_worker = RosterCache(), RosterCache()
+    assert [s['name'] for s in cache.get('10', 'A')] == ['Asha', 'Bina']
+    assert other_worker.size('10', 'A') == 2
+
+    counter = {'n': 0}
+    event.listen(db.engine, 'before_cursor_execute', lambda *a, **k: counter.__setitem__('n', counter['n'] + 1))
+    assert cache.size('10', 'A') == 2
+    assert counter['n'] == 0
+
+    User.query.filter_by(name='Bina').first().is_active = False
+    db.session.commit()
+    other_worker.invalidate()
+    assert [s['name'] for s in cache.get('10', 'A')] == ['Asha']
@@ -0,0 +1,75 @@
+from datetime import datetime, time as dtime
+import pytz
+
+from extensions import db
+from models import User, Student, Teacher, Subject, Class, Timetable, AttendanceSession, Attendance
+import session_counters
+
+
+def _class_session(size):
+    """Today's session (IST, as roster_changed uses) for a class of size active students"""
+    teacher_user = User(name='Teacher', role='teacher', is_active=True)
+    cls = Class(standard='10', division='A', academic_year='2026')
+    subject = Subject(name='Maths', code='M1')
+    db.session.add_all([teacher_user, cls, subject])
+    db.session.flush()
+    teacher = Teacher(user_id=teacher_user.id, employee_id='T1')
+    db.session.add(teacher)
+    db.session.flush()
+    timetable = Timetable(class_id=cls.id, subject_id=subject.id, teacher_id=teacher.id, day_of_week=0,
+                          start_time=dtime(9), end_time=dtime(10))
+    db.session.add(timetable)
+    students = []
+    for roll in range(size):
+        user = User(name=f'Student {roll}', role='student', is_active=True)
+        db.session.add(user)
+        db.session.flush()
+        students.append(Student(user_id=user.id, roll_no=str(roll), division='A', standard='10'))
+    db.session.add_all(students)
+    db.session.flush()
+    today = datetime.now(pytz.timezone('Asia/Kolkata')).date()
+    session = AttendanceSession(timetable_id=timetable.id, date=today, start_time=datetime.now())
+    session_counters.init_roster(session, cls)
+    db.session.add(session)
+    db.session.commit()
+    return session, students
+
+
+def test_counters_follow_marks_and_reconcile_repairs_drift(app):
+    session, students = _class_session(3)
+    assert (session.roster_count, session.present_count, session.absent_count) == (3, 0, 3)
+
+    for student in students[:2]:
+        db.session.add(Attendance(student_id=student.id, session_id=session.id, status='present'))
+    session_counters.record([(session.id, student.id, None, 'present') for student in students[:2]])
+    db.session.commit()
+    session_counters.record([(session.id, students[0].id, 'present', 'late')])
+    db.session.rollback()  # a rolled back mark leaves the counters alone
+    assert (session.present_count, session.late_count, session.absent_count) == (2, 0, 1)
+
+    Attendance.query.filter_by(student_id=students[0].id).first().status = 'late'
+    session.present_count = 7  # drift from an edit outside the marking paths
+    db.session.commit()
+    assert session_counters.reconcile() == [session.id]
+    assert (session.present_count, session.late_count, session.absent_count) == (1, 1, 1)
+    assert session_counters.reconcile() == []
+
+
+def test_marks_of_students_off_the_roster_are_not_counted(app):
+    session, students = _class_session(3)
+    for student in students[:2]:
+        db.session.add(Attendance(student_id=student.id, session_id=session.id, status='present'))
+    session_counters.record([(session.id, student.id, None, 'present') for student in students[:2]])
+    db.session.commit()
+
+    # Deactivating a student who already has a mark takes them out of every counter
+    students[0].user.is_active = False
+    db.session.commit()
+    session_counters.roster_changed()
+    assert (session.roster_count, session.present_count, session.absent_count) == (2, 1, 1)
+
+    # A scan from someone who is not on the roster changes nothing
+    session_counters.record([(session.id, students[0].id, 'present', 'late'), (session.id, 999, None, 'present')])
+    db.session.commit()
+    assert (session.present_count, session.late_count) == (1, 0)
+    assert session_counters.reconcile() == []
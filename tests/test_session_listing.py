@@ -0,0 +1,75 @@
+from datetime import datetime, time as dtime
+import pytest
+import pytz
+from sqlalchemy import event
+
+from extensions import db
+from models import User, Student, Teacher, Subject, Class, Timetable, AttendanceSession, Attendance
+from auth import generate_token
+from api.teacher_routes import teacher_bp
+import session_counters
+
+
+@pytest.fixture
+def app(app):
+    app.register_blueprint(teacher_bp)
+    return app
+
+
+def _add_sessions(teacher, count, offset):
+    today = datetime.now(pytz.timezone('Asia/Kolkata')).date()
+    for i in range(offset, offset + count):
+        cls = Class(standard=str(i), division='A', academic_year='2026')
+        subject = Subject(name=f'Subject {i}', code=f'S{i}')
+        db.session.add_all([cls, subject])
+        db.session.flush()
+        timetable = Timetable(class_id=cls.id, subject_id=subject.id, teacher_id=teacher.id, day_of_week=0,
+                              start_time=dtime(9), end_time=dtime(10))
+        db.session.add(timetable)
+        db.session.flush()
+        session = AttendanceSession(timetable_id=timetable.id, date=today, start_time=datetime.now())
+        db.session.add(session)
+        for r in range(3):
+            user = User(name=f'Student {i}-{r}', role='student', is_active=True)
+            db.session.add(user)
+            db.session.flush()
+            student = Student(user_id=user.id, roll_no=str(r), division='A', standard=str(i))
+            db.session.add(student)
+            db.session.flush()
+            if r:
+                db.session.add(Attendance(student_id=student.id, session_id=session.id))
+    db.session.commit()
+    session_counters.reconcile()
+
+
+def _queries_for_listing(app, client, headers):
+    client.get('/api/teacher/sessions/today', headers=headers)  # warm the user cache
+    counter = {'n': 0}
+
+    def count(*args, **kwargs):
+        counter['n'] += 1
+    event.listen(db.engine, 'before_cursor_execute', count)
+    resp = client.get('/api/teacher/sessions/today', headers=headers)
+    event.remove(db.engine, 'before_cursor_execute', count)
+    return resp.get_json()['sessions'], counter['n']
+
+
+def test_today_sessions_query_count_does_not_grow_with_sessions(app):
+    user = User(name='Teacher', email='t@example.com', role='teacher', is_active=True)
+    db.session.add(user)
+    db.session.flush()
+    teacher = Teacher(user_id=user.id, employee_id='T1')
+    db.session.add(teacher)
+    db.session.commit()
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + generate_token(user.id, user)}
+
+    _add_sessions(teacher, 2, 0)
+    sessions, few = _queries_for_listing(app, client, headers)
+    assert len(sessions) == 2
+    assert {(s['attendance_count'], s['total_students']) for s in sessions} == {(2, 3)}
+
+    _add_sessions(teacher, 6, 2)
+    sessions, many = _queries_for_listing(app, client, headers)
+    assert len(sessions) == 8
+    assert many == few <= 2
@@ -0,0 +1,100 @@
+from datetime import datetime, time as dtime
+
+from extensions import db
+from models import User, Teacher, Subject, Class, Timetable, AttendanceSession
+from session_registry import SessionTokenRegistry
+
+
+def _session(jti='jti-1', code='ABC123'):
+    teacher_user = User(name='Teacher', role='teacher', is_active=True)
+    cls = Class(standard='10', division='A', academic_year='2026')
+    subject = Subject(name='Maths', code='M1')
+    db.session.add_all([teacher_user, cls, subject])
+    db.session.flush()
+    teacher = Teacher(user_id=teacher_user.id, employee_id='T1')
+    db.session.add(teacher)
+    db.session.flush()
+    timetable = Timetable(class_id=cls.id, subject_id=subject.id, teacher_id=teacher.id, day_of_week=0,
+                          start_time=dtime(9), end_time=dtime(10))
+    db.session.add(timetable)
+    db.session.flush()
+    session = AttendanceSession(timetable_id=timetable.id, date=datetime.now().date(), start_time=datetime.now(),
+                                qr_token=jti, manual_code=code, is_active=True)
+    db.session.add(session)
+    db.session.commit()
+    return session
+
+
+def test_claim_seeds_once_and_release_allows_a_retry(app):
+    registry = SessionTokenRegistry()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return [7]
+
+    assert not registry.claim(1, 7, load)
+    assert registry.claim(1, 8, load)
+    assert not registry.claim(1, 8, load)
+    assert len(loads) == 1
+
+    registry.release(1, 8)
+    assert registry.claim(1, 8, load)
+    # A teacher's direct save joins the seeded set
+    registry.mark(1, [9])
+    assert registry.is_marked(1, 9)
+
+
+def test_publish_and_revoke_reach_other_workers(app):
+    session = _session()
+    worker, other = SessionTokenRegistry(), SessionTokenRegistry()
+    worker.publish(session)
+    assert worker.by_jti('jti-1')['session_id'] == session.id
+    # The other worker fills its copy from the database on a miss
+    assert other.by_session(session.id)['manual_code'] == 'ABC123'
+    assert other.by_jti('jti-1') is not None
+    assert other.claim(session.id, 5, lambda: [])
+
+    session.is_active = False
+    db.session.commit()
+    worker.revoke(session.id)
+    version = worker.version()
+    assert other.version() == version
+    assert other.by_jti('jti-1') is None
+    assert other.by_code('ABC123') is None
+    assert other.by_session(session.id) is None
+    assert not other.is_marked(session.id, 5)
+
+
+def test_reused_session_id_starts_with_no_marks(app):
+    session = _session()
+    worker, other = SessionTokenRegistry(), SessionTokenRegistry()
+    assert other.claim(session.id, 5, lambda: [])
+    session_id, timetable_id = session.id, session.timetable_id
+
+    # SQLite hands a deleted session's id to the next session
+    db.session.delete(session)
+    db.session.commit()
+    worker.revoke(session_id)
+    replacement = AttendanceSession(id=session_id, timetable_id=timetable_id, date=datetime.now().date(),
+                                    start_time=datetime.now(), qr_token='jti-2', is_active=True)
+    db.session.add(replacement)
+    db.session.commit()
+    worker.publish(replacement)
+
+    assert other.claim(session_id, 5, lambda: [])
+    assert other.by_session(session_id)['jti'] == 'jti-2'
+
+
+def test_another_workers_epoch_bump_drops_entries_and_reseeds_marks(app):
+    session = _session()
+    worker, other = SessionTokenRegistry(), SessionTokenRegistry()
+    assert other.by_session(session.id) is not None
+    assert other.claim(session.id, 3, lambda: [])
+
+    worker.mark(session.id, [4])
+    # The next lookup in the other worker sees the new epoch and reseeds from the database
+    assert not other.claim(session.id, 4, lambda: [3, 4])
+    assert session.id not in other._by_session
+    assert not other.claim(session.id, 3, lambda: [3, 4])
+    assert other.claim(session.id, 5, lambda: [3, 4])
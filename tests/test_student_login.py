@@ -0,0 +1,32 @@
+import pytest
+
+from extensions import db
+from models import User, Student
+from api.auth_routes import auth_bp
+
+
+@pytest.fixture
+def client(app):
+    app.register_blueprint(auth_bp)
+    user = User(name='Asha  Mehta', role='student', is_active=True)
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Student(user_id=user.id, roll_no='7', division='A', standard='10'))
+    db.session.commit()
+    return app.test_client()
+
+
+def _login(client, name, password='secret'):
+    return client.post('/api/auth/login', json={
+        'login_type': 'student', 'name': name, 'roll_no': '7', 'division': 'A', 'standard': '10', 'password': password
+    })
+
+
+def test_student_login_matches_whole_words_of_the_name(client):
+    assert _login(client, 'asha mehta').status_code == 200
+    assert _login(client, '  ASHA ').status_code == 200
+    assert _login(client, 'Mehta').status_code == 200
+    # Substrings that are not whole words no longer match
+    assert _login(client, 'sha').status_code == 401
+    assert _login(client, 'Asha', password='wrong').status_code == 401